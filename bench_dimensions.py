@@ -0,0 +1,133 @@
+# bench_dimensions.py
+"""
+埋め込みの次元を減らしたときの、索引サイズ・検索時間・recall@k を比べる（pokemon_151）。
+
+使い方:
+    python bench_dimensions.py                         # ローカル埋め込み（API キー不要）
+    python bench_dimensions.py --backend openrouter    # text-embedding-3-small（埋め込みはキャッシュする）
+    python bench_dimensions.py --dims 64 256 --modes pca
+    python bench_dimensions.py --queries my_queries.jsonl
+
+- native: その次元の埋め込みをモデルに直接出させる（ローカルはバケツ数）
+- pca   : 最大次元の埋め込みで PCA を当てはめて射影する（dimension_reduction.PCAProjection）。
+          主成分の数は文書の件数を超えられないので、それより大きい次元は「実次元」で切り詰める
+- 正解は2通り: 最大次元での厳密な上位 k 件との重なり（recall@k）と、クエリの正解ポケモンが
+  上位 k 件に入るか（hit@k）
+- 検索時間は埋め込み済みのクエリで測る（API の往復は含めない。pca は射影の時間を含む）。
+  索引サイズは float32 の行列（pca の射影 KB は主成分の行列で、件数によらず一定）
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from bench_hybrid import Query, load_queries, make_queries
+from dimension_reduction import PCAProjection
+from embedding_backends import build_embeddings
+from pokemon_chroma_store_151 import CSV_PATH, iter_docs
+
+DEFAULT_DIMS = (64, 128, 256, 512, 1536)
+FULL_DIMENSIONS = 1536  # text-embedding-3-small の次元。ローカルも同じ次元を最大にする
+
+
+def embed(backend: str, texts: Sequence[str], dimensions: int) -> np.ndarray:
+    """texts を dimensions 次元で埋め込む（最大次元のときはモデルの既定のまま呼ぶ）"""
+    if backend == "local":
+        emb = build_embeddings("local", dimensions=dimensions)
+        return emb.embed_array(texts)
+    emb = build_embeddings(
+        "openrouter", cached=True, dimensions=None if dimensions == FULL_DIMENSIONS else dimensions
+    )
+    matrix = np.asarray(emb.embed_documents(list(texts)), dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def evaluate(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    targets: List[int],
+    k: int,
+    projection: Optional[PCAProjection] = None,
+) -> Dict[str, float]:
+    times, overlap, hits = [], 0, 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        if projection is not None:
+            query = projection.transform(query[None, :])[0]
+        found = top_k(matrix, query, k)
+        times.append((time.perf_counter() - start) * 1e6)
+        overlap += len(truth[i].intersection(found.tolist()))
+        hits += targets[i] in found
+    return {
+        "recall": overlap / (k * len(queries)),
+        "hit": hits / len(queries),
+        "p50_us": statistics.median(times),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="埋め込みの次元ごとの索引サイズ・検索時間・recall の比較")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--backend", choices=("local", "openrouter"), default="local")
+    parser.add_argument("--dims", type=int, nargs="+", default=list(DEFAULT_DIMS))
+    parser.add_argument("--modes", nargs="+", choices=("native", "pca"), default=["native", "pca"])
+    parser.add_argument("--queries", default=None, help="評価用クエリの JSONL（query と id / doc_id）")
+    parser.add_argument("-k", type=int, default=5, help="recall@k の k")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    ids, texts, _ = zip(*iter_docs(args.csv))
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+
+    queries: List[Query] = []
+    if args.queries:
+        queries = load_queries(args.queries)
+    else:
+        for qs in make_queries(args.csv).values():
+            queries.extend(qs)
+    query_texts = [q for q, _ in queries]
+    targets = [position[doc_id] for _, doc_id in queries]
+
+    # 最大次元で厳密に検索した結果を基準にする
+    full_docs = embed(args.backend, texts, FULL_DIMENSIONS)
+    full_queries = embed(args.backend, query_texts, FULL_DIMENSIONS)
+    truth = [set(top_k(full_docs, q, args.k).tolist()) for q in full_queries]
+
+    print(f"{len(ids)} 件 / クエリ {len(queries)} 件 / バックエンド {args.backend}")
+    print(
+        f"\n{'方式':<7} {'次元':>5} {'実次元':>6} {'索引 KB':>9} {'射影 KB':>9} {'p50 µs':>8} "
+        f"{'recall@' + str(args.k):>9} {'hit@' + str(args.k):>7}"
+    )
+    for mode in args.modes:
+        for dims in args.dims:
+            projection = None
+            if dims == FULL_DIMENSIONS:
+                docs, query_vectors = full_docs, full_queries
+            elif mode == "native":
+                docs = embed(args.backend, texts, dims)
+                query_vectors = embed(args.backend, query_texts, dims)
+            else:
+                projection = PCAProjection.fit(full_docs, dims)
+                docs, query_vectors = projection.transform(full_docs), full_queries
+
+            extra = projection.nbytes if projection is not None else 0
+            r = evaluate(docs, query_vectors, truth, targets, args.k, projection)
+            print(
+                f"{mode:<7} {dims:>5} {docs.shape[1]:>6} {docs.nbytes / 1024:>9.1f} {extra / 1024:>9.1f} "
+                f"{r['p50_us']:>8.1f} {r['recall']:>9.3f} {r['hit']:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
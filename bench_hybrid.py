@@ -0,0 +1,139 @@
+# bench_hybrid.py
+"""
+pokemon_151 の検索を vector / lexical / hybrid / route で比べる（recall@k と1クエリあたりの時間）。
+
+使い方:
+    python bench_hybrid.py                                  # 代替埋め込み（API キー不要）
+    python bench_hybrid.py --latency 0.15                   # 埋め込み1回 150ms の遅延を疑似再現
+    python bench_hybrid.py --backend openrouter             # 永続化済み Chroma + OpenRouter
+    python bench_hybrid.py --queries my_queries.jsonl       # {"query": "...", "id": 25} の行で評価
+
+クエリは CSV から自動で作る（正解はそのポケモン）:
+    名前(カナ) / 名前(ひらがな) / 名前(英語) / 説明文の連続した2語
+代替埋め込みは意味を持たないので、言い換えクエリの比較には --backend openrouter と --queries を使う。
+"""
+import argparse
+import csv
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from bm25_index import BM25Index
+from hybrid_search import MODES, HybridRetriever
+from metadata_index import MetadataIndex
+from pokemon_chroma_store_151 import CSV_PATH, iter_docs
+
+_KATA_TO_HIRA = {code + 0x60: code for code in range(0x3041, 0x3097)}
+
+Query = Tuple[str, str]  # (クエリ, 正解のドキュメントID)
+
+
+def make_queries(csv_path: str, seed: int = 0) -> Dict[str, List[Query]]:
+    rng = random.Random(seed)
+    sets: Dict[str, List[Query]] = {
+        "名前(カナ)": [],
+        "名前(ひらがな)": [],
+        "名前(英語)": [],
+        "説明文2語": [],
+    }
+    for doc_id, _, meta in iter_docs(csv_path):
+        sets["名前(カナ)"].append((meta["name_jp"], doc_id))
+        sets["名前(ひらがな)"].append((meta["name_jp"].translate(_KATA_TO_HIRA), doc_id))
+        sets["名前(英語)"].append((meta["name_en"], doc_id))
+    # 説明文は CSV の description 列（iter_docs の本文は名前・タイプ付きなので使わない）
+    with open(csv_path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            words = row["description"].split()
+            if len(words) >= 2:
+                start = rng.randrange(len(words) - 1)
+                phrase = " ".join(words[start : start + 2])
+                sets["説明文2語"].append((phrase, f"pokemon-{int(row['id'])}"))
+    return sets
+
+
+def load_queries(path: str) -> List[Query]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(r["query"], r.get("doc_id") or f"pokemon-{int(r['id'])}") for r in rows]
+
+
+def build_store(args: argparse.Namespace):
+    if args.backend == "openrouter":
+        from langchain_chroma import Chroma
+
+        import openrouter_clients
+        from pokemon_chroma_store_151 import COLLECTION_NAME, PERSIST_DIR
+
+        # 時間を正しく測るため、埋め込みキャッシュは通さない
+        emb = openrouter_clients.embeddings()
+        return Chroma(
+            persist_directory=PERSIST_DIR,
+            collection_name=COLLECTION_NAME,
+            embedding_function=emb,
+        )
+
+    from numpy_store import NumpyVectorStore
+    from stand_in_backends import StandInEmbeddings
+
+    ids, texts, metadatas = zip(*iter_docs(args.csv))
+    store = NumpyVectorStore.from_texts(
+        list(texts), StandInEmbeddings(), metadatas=list(metadatas), ids=list(ids)
+    )
+    store.embeddings.latency = args.latency  # 取り込みは待たず、検索時だけ遅延させる
+    return store
+
+
+def evaluate(retriever: HybridRetriever, queries: List[Query], mode: str, k: int) -> Dict[str, float]:
+    times, hits, embedded = [], 0, 0
+    for query, target in queries:
+        docs, info = retriever.search(query, k=k, mode=mode)
+        times.append(info.elapsed * 1000)
+        hits += any(doc.id == target for doc in docs)
+        embedded += info.embedded
+    times.sort()
+    return {
+        "recall": hits / len(queries),
+        "p50_ms": statistics.median(times),
+        "p95_ms": times[max(0, int(len(times) * 0.95) - 1)],
+        "embedded": embedded / len(queries),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="BM25 / ベクトル / ハイブリッド検索の比較")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--backend", choices=("stand-in", "openrouter"), default="stand-in")
+    parser.add_argument("--latency", type=float, default=0.05, help="代替埋め込みの疑似遅延（秒）")
+    parser.add_argument("--queries", default=None, help="評価用クエリの JSONL（query と id / doc_id）")
+    parser.add_argument("-k", type=int, default=5, help="recall@k の k")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    db = build_store(args)
+
+    start = time.perf_counter()
+    retriever = HybridRetriever(
+        db, BM25Index.from_store(db), MetadataIndex.from_store(db, ("type1", "type2"))
+    )
+    print(f"索引作成: {len(retriever.bm25)} 件 / {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    query_sets = {"指定クエリ": load_queries(args.queries)} if args.queries else make_queries(args.csv)
+    print(
+        f"\n{'クエリ':<10} {'モード':<8} {'recall@' + str(args.k):>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'埋め込み率':>8}"
+    )
+    for label, queries in query_sets.items():
+        for mode in MODES:
+            r = evaluate(retriever, queries, mode, args.k)
+            print(
+                f"{label:<10} {mode:<8} {r['recall']:>9.3f} {r['p50_ms']:>9.2f} "
+                f"{r['p95_ms']:>9.2f} {r['embedded']:>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_name_search.py
+"""
+pokemon_search.py の名前検索（完全一致 / 部分一致 / あいまい検索）の1クエリあたりの時間を測る。
+
+使い方:
+    python bench_name_search.py            # 5000 件
+    python bench_name_search.py 50000      # 件数を指定
+"""
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from pokemon_search import PokemonIndex
+
+KATAKANA = [chr(c) for c in range(0x30A1, 0x30F7)]
+
+
+def make_entries(n: int, seed: int = 0) -> List[Dict]:
+    """3〜6文字のカタカナ名を n 件作る"""
+    rng = random.Random(seed)
+    return [
+        {"id": i, "name_jp": "".join(rng.choice(KATAKANA) for _ in range(rng.randint(3, 6)))}
+        for i in range(1, n + 1)
+    ]
+
+
+def make_typo(name: str, rng: random.Random) -> str:
+    """1文字だけ別のカタカナに置き換える"""
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(KATAKANA) + name[i + 1 :]
+
+
+def measure(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return {
+        "p50_us": statistics.median(times),
+        "p95_us": times[int(len(times) * 0.95) - 1],
+        "max_us": times[-1],
+    }
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(1)
+    entries = make_entries(n)
+
+    start = time.perf_counter()
+    index = PokemonIndex(entries)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"索引作成: {n} 件 / {build_ms:.1f} ms")
+
+    names = [e["name_jp"] for e in rng.sample(entries, 1000)]
+    cases = {
+        "完全一致": (index.search_by_name, names),
+        "部分一致": (index.search_by_name, [name[1:3] for name in names]),
+        "あいまい": (index.fuzzy_search, [make_typo(name, rng) for name in names]),
+    }
+    for label, (fn, queries) in cases.items():
+        r = measure(fn, queries)
+        print(
+            f"{label}: p50 {r['p50_us']:.1f} µs / p95 {r['p95_us']:.1f} µs / "
+            f"max {r['max_us']:.1f} µs"
+        )
+
+
+if __name__ == "__main__":
+    main()
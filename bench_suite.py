@@ -0,0 +1,356 @@
+# bench_suite.py
+"""
+取り込み・検索・RAG プロンプトの処理時間を、API を呼ばずに測るベンチマーク。
+
+使い方:
+    python bench_suite.py                                   # 1000 件、全フロー
+    python bench_suite.py --docs 1000 10000 100000          # 件数ごとに測る
+    python bench_suite.py --embed-latency 0.05 --chat-latency 0.5
+    python bench_suite.py --flows name prompt --docs 1000000
+    python bench_suite.py --compare bench_results/前回.json  # 前回の結果と比べる
+
+フロー:
+    ingest : 合成 CSV → Chroma（pokemon_chroma_store_151 と同じ iter_docs → run_pipeline）
+    search : type1 / type2 で絞り込んだ意味検索（semantic_search_with_filters と同じ呼び出し）
+    name   : pokemon_search の名前検索（完全一致 / 部分一致 / あいまい）
+    prompt : graph_rag のナイーブ / GraphRAG プロンプト作成（+ 代替チャットモデルの応答）
+
+埋め込みとチャットは stand_in_backends の決定的な代替バックエンドを使い、
+--embed-latency / --chat-latency 秒の遅延で API の呼び出しを真似る。
+結果は JSON で保存する（既定は bench_results/）。
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pokemon_chroma_store_151 import CSV_PATH, iter_docs
+from stand_in_backends import StandInChatModel, StandInEmbeddings
+
+FLOWS = ("ingest", "search", "name", "prompt")
+RESULTS_DIR = "bench_results"
+TYPES = [
+    "normal", "fire", "water", "grass", "electric", "ice", "fighting", "poison", "ground",
+    "flying", "psychic", "bug", "rock", "ghost", "dragon", "fairy", "steel",
+]
+
+
+# --------------------------
+# 1. 合成データ
+# --------------------------
+def description_words(csv_path: str = CSV_PATH) -> List[str]:
+    """本物の図鑑説明文の単語（分かち書きのひらがな）を語彙として使う"""
+    with open(csv_path, encoding="utf-8") as f:
+        return [w for row in csv.DictReader(f) for w in row["description"].split()]
+
+
+def make_corpus(n: int, vocab: List[str], seed: int = 0) -> List[Dict[str, str]]:
+    """pokemon_151_with_image.csv と同じ列の行を n 件作る"""
+    from bench_name_search import make_entries
+
+    rng = random.Random(seed)
+    rows = []
+    for entry in make_entries(n, seed=seed):
+        type1 = rng.choice(TYPES)
+        type2 = rng.choice(TYPES + [""] * len(TYPES))
+        rows.append(
+            {
+                "id": str(entry["id"]),
+                "name_jp": entry["name_jp"],
+                "name_en": f"mon{entry['id']}",
+                "type1": type1,
+                "type2": "" if type2 == type1 else type2,
+                "description": " ".join(rng.choices(vocab, k=rng.randint(8, 16))) + "。",
+                "image_url": f"https://example.com/{entry['id']}.png",
+            }
+        )
+    return rows
+
+
+def write_csv(rows: List[Dict[str, str]], path: str) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# --------------------------
+# 2. 計測
+# --------------------------
+def summarize(
+    latencies: Sequence[float], elapsed: float, items: Optional[int] = None
+) -> Dict[str, float]:
+    """1回あたりの時間（秒）の列から p50 / p95 / p99 とスループットを出す"""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    count = items if items is not None else len(ms)
+    return {
+        "count": count,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(count / max(elapsed, 1e-9), 2),
+        "mean_ms": round(float(ms.mean()) if len(ms) else 0.0, 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def run_timed(fn: Callable[[Any], Any], inputs: Sequence[Any]) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for x in inputs:
+        t = time.perf_counter()
+        fn(x)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+class TimedEmbeddings(StandInEmbeddings):
+    """埋め込み1回（= 1バッチ）ごとの時間を記録する代替埋め込み"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        t = time.perf_counter()
+        vectors = super().embed_documents(texts)
+        self.latencies.append(time.perf_counter() - t)
+        return vectors
+
+
+# --------------------------
+# 3. 各フロー
+# --------------------------
+def bench_ingest(csv_path: str, workdir: str, args: argparse.Namespace):
+    """CSV → Chroma の取り込み。件数/秒と、埋め込みバッチ1回あたりの時間"""
+    from langchain_chroma import Chroma
+
+    from ingest_pipeline import Progress, run_pipeline
+
+    emb = TimedEmbeddings(dimensions=args.dimensions, latency=args.embed_latency)
+    db = Chroma(
+        persist_directory=os.path.join(workdir, "chroma"),
+        collection_name="bench_pokemon",
+        embedding_function=emb,
+    )
+    started = time.perf_counter()
+    run_pipeline(
+        iter_docs(csv_path),
+        db,
+        emb,
+        batch_size=args.batch_size,
+        max_in_flight=args.workers,
+        progress=Progress(interval=float("inf")),
+    )
+    elapsed = time.perf_counter() - started
+    result = summarize(emb.latencies, elapsed, items=emb.texts_embedded)
+    result["batches"] = len(emb.latencies)
+    return db, result
+
+
+def bench_search(db, rows: List[Dict[str, str]], args: argparse.Namespace) -> Dict[str, Any]:
+    """type で絞り込んだ意味検索（半分は絞り込みなし）"""
+    rng = random.Random(2)
+    queries = []
+    for _ in range(args.queries):
+        row = rng.choice(rows)
+        words = row["description"].rstrip("。").split()
+        start = rng.randrange(max(1, len(words) - 2))
+        where = {"type1": row["type1"]} if rng.random() < 0.5 else None
+        queries.append((" ".join(words[start : start + 3]), where))
+
+    db.embeddings.latency = args.embed_latency
+    return run_timed(lambda q: db.similarity_search(q[0], k=5, filter=q[1]), queries)
+
+
+def bench_name(rows: List[Dict[str, str]], args: argparse.Namespace) -> Dict[str, Any]:
+    from bench_name_search import make_typo
+    from pokemon_search import PokemonIndex
+
+    entries = [{"id": int(r["id"]), "name_jp": r["name_jp"]} for r in rows]
+    started = time.perf_counter()
+    index = PokemonIndex(entries)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(3)
+    names = [rng.choice(entries)["name_jp"] for _ in range(args.queries)]
+    return {
+        "index_build_s": round(build_s, 4),
+        "exact": run_timed(index.search_by_name, names),
+        "partial": run_timed(index.search_by_name, [name[1:3] for name in names]),
+        "fuzzy": run_timed(index.fuzzy_search, [make_typo(name, rng) for name in names]),
+    }
+
+
+def bench_prompt(rows: List[Dict[str, str]], args: argparse.Namespace) -> Dict[str, Any]:
+    """コーパスと同じ規模のグラフで graph_rag のプロンプトを作り、代替チャットモデルに渡す"""
+    import networkx as nx
+
+    import graph_rag
+    from bench_graph import make_graph
+    from graph_csr import CompiledGraph
+
+    docs = {f"doc_{i}": row["description"] for i, row in enumerate(rows)}
+    G = make_graph(len(rows), degree=4, num_docs=len(rows))
+    # いくつかのノードを質問のキーワードを含む名前にして、GraphRAG の起点にする
+    rng = random.Random(4)
+    renames = {
+        f"node_{rng.randrange(len(rows))}": f"{keyword}#{i}"
+        for i, keyword in enumerate(graph_rag.KEYWORDS)
+    }
+    G = nx.relabel_nodes(G, renames)
+
+    started = time.perf_counter()
+    compiled = CompiledGraph.from_networkx(G)
+    compile_s = time.perf_counter() - started
+
+    # graph_rag はモジュールの documents / 読み込み済みグラフを使うので、測る間だけ差し替える
+    saved = (graph_rag.documents, graph_rag._loaded)
+    graph_rag.documents = docs
+    graph_rag._loaded = (compiled, docs)
+    try:
+        chat = StandInChatModel(latency=args.chat_latency)
+        repeat = range(max(1, args.queries // 10))
+
+        naive_tokens = graph_rag.default_counter().count(graph_rag.build_naive_rag_prompt())
+        graph_prompt, packed = graph_rag.build_graph_rag_prompt_with_stats(args.token_budget)
+        return {
+            "graph_compile_s": round(compile_s, 4),
+            "naive_build": run_timed(lambda _: graph_rag.build_naive_rag_prompt(), repeat),
+            "graph_build": run_timed(
+                lambda _: graph_rag.build_graph_rag_prompt(args.token_budget), repeat
+            ),
+            "naive_rag": run_timed(lambda _: chat.invoke(graph_rag.build_naive_rag_prompt()), repeat),
+            "graph_rag": run_timed(
+                lambda _: chat.invoke(graph_rag.build_graph_rag_prompt(args.token_budget)), repeat
+            ),
+            "naive_prompt_tokens": naive_tokens,
+            "graph_prompt_tokens": graph_rag.default_counter().count(graph_prompt),
+            "graph_context_docs": len(packed.items),
+            "graph_context_dropped": len(packed.dropped) + len(packed.duplicates),
+        }
+    finally:
+        graph_rag.documents, graph_rag._loaded = saved
+
+
+def run_size(n: int, vocab: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    rows = make_corpus(n, vocab)
+    results: Dict[str, Any] = {}
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        if "ingest" in args.flows or "search" in args.flows:
+            csv_path = os.path.join(workdir, "corpus.csv")
+            write_csv(rows, csv_path)
+            db, ingest = bench_ingest(csv_path, workdir, args)
+            if "ingest" in args.flows:
+                results["ingest"] = ingest
+            if "search" in args.flows:
+                results["search"] = bench_search(db, rows, args)
+        if "name" in args.flows:
+            results["name"] = bench_name(rows, args)
+        if "prompt" in args.flows:
+            results["prompt"] = bench_prompt(rows, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# --------------------------
+# 4. 表示・保存・比較
+# --------------------------
+def iter_metrics(results: Dict[str, Any], prefix: str = ""):
+    """入れ子の結果から p50_ms を持つ計測だけを (名前, 計測) で取り出す"""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "p50_ms" in value:
+                yield prefix + key, value
+            else:
+                yield from iter_metrics(value, f"{prefix}{key}.")
+
+
+def print_results(results: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+    before = dict(iter_metrics(previous)) if previous else {}
+    for name, m in iter_metrics(results):
+        line = (
+            f"  {name:<28} {m['throughput_per_s']:>11.1f}/秒  p50 {m['p50_ms']:>9.3f} ms  "
+            f"p95 {m['p95_ms']:>9.3f} ms  p99 {m['p99_ms']:>9.3f} ms"
+        )
+        if name in before and before[name]["p50_ms"] > 0:
+            line += f"  （前回比 p50 ×{m['p50_ms'] / before[name]['p50_ms']:.2f}）"
+        print(line)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="取り込み・検索・RAG のオフラインベンチマーク")
+    parser.add_argument(
+        "--docs", type=int, nargs="+", default=[1000], help="コーパスの件数（複数可、1000〜1000000）"
+    )
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=list(FLOWS))
+    parser.add_argument("--queries", type=int, default=200, help="フローごとのクエリ数")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="埋め込み1回の疑似遅延（秒）")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="チャット1回の疑似遅延（秒）")
+    parser.add_argument("--dimensions", type=int, default=64, help="代替埋め込みの次元数")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="同時に投げる埋め込みバッチ数")
+    parser.add_argument("--token-budget", type=int, default=2000, help="GraphRAG の参考情報の上限")
+    parser.add_argument(
+        "--output", default=None, help=f"結果の JSON（既定は {RESULTS_DIR}/ に日時付き）"
+    )
+    parser.add_argument("--compare", default=None, help="比べる前回の結果 JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None) -> None:
+    args = parse_args(argv)
+    vocab = description_words()
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "runs": {},
+    }
+    for n in args.docs:
+        print(f"\n=== {n} 件 ===")
+        results = run_size(n, vocab, args)
+        report["runs"][str(n)] = results
+        print_results(results, (previous or {}).get("runs", {}).get(str(n)))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
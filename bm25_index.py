@@ -0,0 +1,171 @@
+# bm25_index.py
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+from pokemon_search import hira_to_kata
+
+# 単語の区切り（空白・句読点・記号）。図鑑の説明文はひらがなの分かち書きなので、
+# まず単語に分けてから、単語の中だけで文字 n-gram を作る
+_SEPARATORS = re.compile(r"[^\w]+")
+
+
+def fold_text(text: str) -> str:
+    """全角/半角・ひらがな/カタカナ・大文字/小文字の違いをそろえる"""
+    return hira_to_kata(unicodedata.normalize("NFKC", text)).lower()
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = (2,)) -> List[str]:
+    """
+    文字 n-gram に分ける。
+
+    - 単語（空白・句読点の区切り）をまたぐ n-gram は作らない
+    - n より短い単語は、その単語全体を1トークンにする（「ー」「の」など1文字語も拾う）
+    """
+    tokens: List[str] = []
+    for word in _SEPARATORS.split(fold_text(text)):
+        if not word:
+            continue
+        for n in sizes:
+            if len(word) < n:
+                if n == min(sizes):
+                    tokens.append(word)
+                continue
+            tokens.extend(word[i : i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+@dataclass
+class LexicalHit:
+    doc_id: str
+    score: float
+    coverage: float  # クエリの n-gram のうち、この文書に含まれていた割合
+
+
+class BM25Index:
+    """
+    文書本文（名前・説明）に対する BM25 の転置インデックス。
+
+    - ベクトルストアと同じ ID で持つので、ベクトル検索の結果とそのまま混ぜられる
+    - 本文とメタデータも持っておき、字句検索だけで答えるときは DB を引かずに返す
+    - add は同じ ID なら置き換え（upsert）、remove で削除
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, ngram_sizes: Sequence[int] = (2,)) -> None:
+        self.k1 = k1
+        self.b = b
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.postings: Dict[str, Dict[str, int]] = {}  # n-gram → ID → 出現回数
+        self.lengths: Dict[str, int] = {}
+        self.texts: Dict[str, str] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def tokenize(self, text: str) -> List[str]:
+        return char_ngrams(text, self.ngram_sizes)
+
+    # --------------------------
+    # 追加・削除
+    # --------------------------
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+
+        counts = Counter(self.tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.lengths[doc_id] = length
+        self._total_length += length
+        self.texts[doc_id] = text
+        self.metadatas[doc_id] = metadata or {}
+
+    def add_many(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> None:
+        metadatas = metadatas or [{} for _ in ids]
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            self.add(doc_id, text, metadata)
+
+    def remove(self, doc_id: str) -> None:
+        text = self.texts.pop(doc_id, None)
+        if text is None:
+            return
+        for term in set(self.tokenize(text)):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self._total_length -= self.lengths.pop(doc_id)
+        self.metadatas.pop(doc_id, None)
+
+    def remove_many(self, ids: Sequence[str]) -> None:
+        for doc_id in ids:
+            self.remove(doc_id)
+
+    @classmethod
+    def from_store(cls, db, page_size: int = 1000, **kwargs: Any) -> "BM25Index":
+        """Chroma / NumpyVectorStore からページ単位で本文を読んで索引を作る（埋め込みは呼ばない）"""
+        index = cls(**kwargs)
+        offset = 0
+        while True:
+            result = db.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = result.get("ids", [])
+            if not ids:
+                break
+            index.add_many(ids, result.get("documents", []), result.get("metadatas", []))
+            offset += len(ids)
+        return index
+
+    # --------------------------
+    # 検索
+    # --------------------------
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.lengths)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(
+        self, query: str, k: int = 10, allowed: Optional[Set[str]] = None
+    ) -> List[LexicalHit]:
+        """
+        BM25 の上位 k 件を返す。
+        allowed（MetadataIndex.match の結果など）を渡すと、その ID の中だけで順位を付ける。
+        """
+        terms = Counter(self.tokenize(query))
+        if not terms or not self.lengths:
+            return []
+
+        avg_length = self._total_length / len(self.lengths)
+        scores: Dict[str, float] = {}
+        matched: Dict[str, int] = {}
+        for term, qtf in terms.items():
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + qtf * idf * tf * (self.k1 + 1) / norm
+                matched[doc_id] = matched.get(doc_id, 0) + qtf
+
+        total = sum(terms.values())
+        ranked: List[Tuple[str, float]] = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:k]
+        return [LexicalHit(doc_id, score, matched[doc_id] / total) for doc_id, score in ranked]
+
+    def document(self, doc_id: str) -> Document:
+        return Document(id=doc_id, page_content=self.texts[doc_id], metadata=self.metadatas[doc_id])
@@ -1,22 +1,16 @@
 # chroma_query.py
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-
-api_key = os.getenv("OPENROUTER_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENROUTER_API_KEY が設定されていません")
+import openrouter_clients
+from embedding_cache import CachedEmbeddings, QueryEmbeddingLRU
 
 PERSIST_DIR = "chroma_db_example"
 
 # Embedding モデル（検索時も同じモデルを使う必要あり）
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",
+# 同じ質問を繰り返したときは、メモリ上の LRU から埋め込みを返す
+emb = QueryEmbeddingLRU(
+    CachedEmbeddings(openrouter_clients.embeddings("text-embedding-3-small")),
+    max_size=256,
 )
 
 # 既に保存済みの Chroma DB を開く
@@ -32,6 +26,7 @@ while True:
     query = input("\n質問を入力してください（空Enterで終了）> ").strip()
     if not query:
         print("終了します。")
+        print(emb.format_stats())
         break
 
     docs = db.similarity_search(query, k=3)
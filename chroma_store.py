@@ -1,14 +1,10 @@
 # chroma_store.py
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from dotenv import load_dotenv
-import os
+import hashlib
 
-load_dotenv()
-
-api_key = os.getenv("OPENROUTER_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENROUTER_API_KEY が設定されていません")
+import openrouter_clients
+from chroma_sync import format_sync_stats, sync_collection
+from embedding_cache import CachedEmbeddings
 
 # 保存用のディレクトリ
 PERSIST_DIR = "chroma_db_example"
@@ -24,18 +20,21 @@ texts = [
 ]
 
 # Embedding モデル：OpenRouter 経由の OpenAI Embedding
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",
-)
+emb = CachedEmbeddings(openrouter_clients.embeddings("text-embedding-3-small"))
 
-# Chroma に保存（初回のみ）
-db = Chroma.from_texts(
-    texts=texts,
-    embedding=emb,
+# Chroma を開いて同期（何度実行しても重複しない）
+db = Chroma(
     collection_name="demo_collection",
+    embedding_function=emb,
     persist_directory=PERSIST_DIR,
 )
 
-print("Chroma DB に保存完了！")
+# サンプル文には番号が無いので、文の内容から固定IDを作る
+docs = [
+    (f"demo-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}", text, {})
+    for text in texts
+]
+stats = sync_collection(db, docs)
+
+print(f"Chroma DB に保存完了！（{format_sync_stats(stats)}）")
+print(emb.format_stats())
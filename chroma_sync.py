@@ -0,0 +1,124 @@
+# chroma_sync.py
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+# (ドキュメントID, ベクトル化するテキスト, メタデータ)
+SyncDoc = Tuple[str, str, Dict[str, Any]]
+
+HASH_KEY = "content_hash"
+
+
+def content_hash(text: str, metadata: Dict[str, Any]) -> str:
+    """テキストとメタデータから内容ハッシュを作る（変更検知用）"""
+    payload = json.dumps(
+        {"text": text, "metadata": metadata}, ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def existing_hashes(db) -> Dict[str, str]:
+    """コレクション内の ID → 内容ハッシュ（ベクトル本体は読まない）"""
+    result = db.get(include=["metadatas"])
+    return {
+        doc_id: (meta or {}).get(HASH_KEY, "")
+        for doc_id, meta in zip(result.get("ids", []), result.get("metadatas", []))
+    }
+
+
+def sync_collection(
+    db, docs: Iterable[SyncDoc], delete_missing: bool = True, index=None
+) -> Dict[str, int]:
+    """
+    CSV などから作ったドキュメント一覧とコレクションを同期する。
+
+    - ID が固定なので、何度実行しても重複しない（upsert）
+    - 内容ハッシュが同じ行は埋め込みも書き込みもしない
+    - delete_missing=True なら、入力に無くなった ID を削除する
+    - index（MetadataIndex）を渡すと、書き込んだ内容に合わせて索引も更新する
+    """
+    current = existing_hashes(db)
+
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    seen = set()
+    unchanged = 0
+
+    for doc_id, text, metadata in docs:
+        seen.add(doc_id)
+        digest = content_hash(text, metadata)
+        if current.get(doc_id) == digest:
+            unchanged += 1
+            continue
+        ids.append(doc_id)
+        texts.append(text)
+        metadatas.append({**metadata, HASH_KEY: digest})
+
+    if ids:
+        # ids を渡すと Chroma 側は upsert になる（埋め込みは変更分だけ）
+        db.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        if index is not None:
+            index.add_many(ids, metadatas)
+
+    stale = [doc_id for doc_id in current if doc_id not in seen]
+    if delete_missing and stale:
+        db.delete(ids=stale)
+        if index is not None:
+            index.remove_many(stale)
+
+    return {
+        "upserted": len(ids),
+        "unchanged": unchanged,
+        "deleted": len(stale) if delete_missing else 0,
+    }
+
+
+def collection_fingerprint(db, page_size: int = 1000) -> Dict[str, Any]:
+    """
+    コレクションの中身の指紋（件数と、ID・内容ハッシュから作るダイジェスト）。
+    ベクトルは読まず、ページごとに読んで足し合わせる（順序に依存しないので並べ替え不要）
+    """
+    count = 0
+    total = 0
+    offset = 0
+    while True:
+        result = db.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = result.get("ids", [])
+        if not ids:
+            break
+        for doc_id, meta in zip(ids, result.get("metadatas", [])):
+            row = f"{doc_id}\0{(meta or {}).get(HASH_KEY, '')}".encode("utf-8")
+            total = (total + int.from_bytes(hashlib.sha256(row).digest(), "big")) % (1 << 256)
+        count += len(ids)
+        offset += len(ids)
+    return {"count": count, "digest": f"{total:064x}"}
+
+
+def upsert_vectors(
+    db,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    vectors: List[List[float]],
+) -> None:
+    """
+    埋め込み済みのベクトルを、埋め込み直さずに Chroma へ upsert する。
+
+    langchain_chroma の Chroma には、計算済みのベクトルを渡して書き込む公開メソッドが無い
+    （add_texts は必ず embedding_function で埋め込み直す）。そこで、ここだけで
+    Chroma が包んでいる chromadb の Collection を取り出し、その公開 API の upsert を呼ぶ。
+    langchain_chroma 側の持ち方が変わったら、直すのはこの関数だけで済む。
+    """
+    collection = getattr(db, "_collection", None)
+    if collection is None:
+        raise RuntimeError(f"{type(db).__name__} には計算済みのベクトルを書き込めません")
+    collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=vectors)
+
+
+def format_sync_stats(stats: Dict[str, int]) -> str:
+    return (
+        f"追加/更新 {stats['upserted']} 件, "
+        f"変更なし {stats['unchanged']} 件, "
+        f"削除 {stats['deleted']} 件"
+    )
@@ -0,0 +1,246 @@
+# context_packer.py
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+# プロンプトに載せる参考情報のトークン上限（既定）
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# 上限いっぱいのとき、これより少ないトークンしか残っていなければ切り詰めずに捨てる
+DEFAULT_MIN_TOKENS = 32
+# render() で1件ずつ並べるときの書式と区切り
+DEFAULT_TEMPLATE = "[{doc_id}] {text}"
+DEFAULT_SEPARATOR = "\n"
+# "estimate" にすると tiktoken を使わず文字数から見積もる（既定は tiktoken、使えなければ見積もり）
+TOKEN_COUNTER_BACKEND = os.getenv("CONTEXT_TOKEN_COUNTER", "tiktoken")
+
+# 文の区切り（句点・感嘆符・疑問符・改行）。区切り文字は前の文に含める
+_SENTENCE_END = re.compile(r"(?<=[。．！？!?\n])")
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]")
+
+
+class TokenCounter:
+    """
+    手元でトークン数を数える。
+
+    - tiktoken のエンコーディングが使えればそれで正確に数える
+      （初回はエンコーディングのダウンロードが必要。以降はキャッシュされる）
+    - tiktoken が無い・オフラインでダウンロードできないなど、読み込みに失敗したら
+      「日本語は1文字 ≒ 1トークン、それ以外は4文字 ≒ 1トークン」で見積もる（理由は fallback_reason）
+    - backend="estimate"（環境変数 CONTEXT_TOKEN_COUNTER=estimate）なら tiktoken を読み込まず、
+      ダウンロードも試さない。ネットワークが遅い・使えない環境で初回の待ちを避けたいとき用
+    """
+
+    def __init__(self, encoding: str = "o200k_base", backend: Optional[str] = None) -> None:
+        self.encoding = None
+        self.name = "estimate"
+        self.fallback_reason: Optional[str] = None
+        if (backend or TOKEN_COUNTER_BACKEND) == "estimate":
+            return
+        try:
+            import tiktoken
+
+            self.encoding = tiktoken.get_encoding(encoding)
+        except Exception as e:  # 未インストール / ダウンロード失敗 / 壊れたキャッシュ
+            self.fallback_reason = f"{type(e).__name__}: {e}"
+            return
+        self.name = f"tiktoken:{encoding}"
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """先頭から max_tokens トークンに収まるところまで切る"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:max_tokens])
+        # 見積もりのときは、収まる最長の先頭部分を二分探索で探す
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo]
+
+
+_default_counter: Optional[TokenCounter] = None
+
+
+def default_counter() -> TokenCounter:
+    global _default_counter
+    if _default_counter is None:
+        _default_counter = TokenCounter()
+    return _default_counter
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _sentence_key(sentence: str) -> str:
+    """重複判定用に、空白・句読点・表記ゆれを落とした形にする"""
+    folded = unicodedata.normalize("NFKC", sentence).lower()
+    return re.sub(r"[\s。、．，！？!?,.・「」（）()]", "", folded)
+
+
+@dataclass
+class PackedItem:
+    doc_id: str
+    text: str
+    tokens: int  # 書式（[doc_id] など）と前の区切りも含めた、render() 後のトークン数
+    score: float
+    trimmed: bool = False
+
+
+@dataclass
+class PackedContext:
+    """詰め込んだ結果と、そのトークン数の内訳"""
+
+    budget: int
+    counter: str
+    template: str = DEFAULT_TEMPLATE
+    separator: str = DEFAULT_SEPARATOR
+    items: List[PackedItem] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)  # 上限に入らず捨てた doc_id
+    duplicates: List[str] = field(default_factory=list)  # 中身がすべて重複していた doc_id
+    tokens_in: int = 0  # 詰める前の合計トークン数
+
+    @property
+    def tokens_used(self) -> int:
+        return sum(item.tokens for item in self.items)
+
+    def render(self) -> str:
+        """詰めたときと同じ書式・区切りで並べる（トークン数は tokens_used に数えてある）"""
+        return self.separator.join(
+            self.template.format(doc_id=i.doc_id, text=i.text) for i in self.items
+        )
+
+    def format_stats(self) -> str:
+        trimmed = sum(item.trimmed for item in self.items)
+        return (
+            f"コンテキスト: {self.tokens_used}/{self.budget} トークン（詰める前 {self.tokens_in}） / "
+            f"採用 {len(self.items)} 件（うち切り詰め {trimmed}） / "
+            f"重複 {len(self.duplicates)} 件 / 上限で除外 {len(self.dropped)} 件 [{self.counter}]"
+        )
+
+
+def pack_context(
+    docs: Sequence[Tuple[str, str, float]],
+    budget: int = DEFAULT_TOKEN_BUDGET,
+    counter: Optional[TokenCounter] = None,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+    template: str = DEFAULT_TEMPLATE,
+    separator: str = DEFAULT_SEPARATOR,
+) -> PackedContext:
+    """
+    (doc_id, 本文, スコア) をスコアの高い順に、budget トークンに収まるだけ詰める。
+    本文だけでなく、render() で付く書式（template）と区切り（separator）も budget に数える。
+
+    - すでに採用した文と同じ文は落とす（重複・包含しているチャンクの重なりを除く）。
+      全文が重複していたドキュメントは duplicates に入れる
+    - 丸ごと入らないドキュメントは、残りが min_tokens 以上なら文の切れ目で切り詰め、
+      それも無理なら捨てる（dropped）
+    """
+    counter = counter or default_counter()
+    packed = PackedContext(budget=budget, counter=counter.name, template=template, separator=separator)
+    seen: Set[str] = set()
+    remaining = budget
+    separator_tokens = counter.count(separator)
+
+    def cost(doc_id: str, body: str) -> int:
+        """render() したときにこの1件が増やすトークン数（2件目からは区切りの分も）"""
+        tokens = counter.count(template.format(doc_id=doc_id, text=body))
+        return tokens + (separator_tokens if packed.items else 0)
+
+    ranked = sorted(docs, key=lambda d: -d[2])  # 同点なら渡された順（sorted は安定）
+    for doc_id, text, score in ranked:
+        packed.tokens_in += counter.count(text)
+
+        sentences = []
+        keys: Set[str] = set()
+        for sentence in split_sentences(text):
+            key = _sentence_key(sentence)
+            if key and key not in seen and key not in keys:
+                keys.add(key)
+                sentences.append((key, sentence))
+        if not sentences:
+            packed.duplicates.append(doc_id)
+            continue
+
+        body = "".join(s for _, s in sentences).strip()
+        tokens = cost(doc_id, body)
+        trimmed = len(sentences) < len(split_sentences(text))
+        if tokens > remaining:
+            if remaining < min_tokens:
+                packed.dropped.append(doc_id)
+                continue
+            # 書式と区切りの分を引いた残りに本文を切り詰める。つなげると数え方が変わることがあるので、
+            # 書式ごと数え直して収まるまで本文の上限を縮める
+            limit = remaining - cost(doc_id, "")
+            body = _trim_to_budget(sentences, limit, counter)
+            while body and cost(doc_id, body) > remaining:
+                limit -= 1
+                body = _trim_to_budget(sentences, limit, counter)
+            if not body:
+                packed.dropped.append(doc_id)
+                continue
+            tokens = cost(doc_id, body)
+            trimmed = True
+
+        packed.items.append(PackedItem(doc_id, body, tokens, score, trimmed))
+        seen.update(key for key, s in sentences if s.strip() in body)
+        remaining -= tokens
+
+    return packed
+
+
+def _trim_to_budget(sentences: List[Tuple[str, str]], budget: int, counter: TokenCounter) -> str:
+    """文単位で budget に収まるところまで。最初の1文も入らなければ途中で切って「…」を付ける"""
+    body = ""
+    for _, sentence in sentences:
+        candidate = body + sentence
+        if counter.count(candidate.strip()) > budget:
+            break
+        body = candidate
+    if body.strip():
+        return body.strip()
+    # 「…」の分を先に空けてから切る。つなげるとトークンの切れ目が変わることがあるので、
+    # 付けた後の数え直しで収まるまで1トークンずつ縮める
+    ellipsis = "…"
+    first = sentences[0][1].strip()
+    limit = budget - counter.count(ellipsis)
+    while limit > 0:
+        head = counter.truncate(first, limit)
+        if not head:
+            break
+        if counter.count(head + ellipsis) <= budget:
+            return head + ellipsis
+        limit -= 1
+    return ""
+
+
+def pack_documents(
+    docs: Sequence[Any],
+    budget: int = DEFAULT_TOKEN_BUDGET,
+    counter: Optional[TokenCounter] = None,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+    template: str = DEFAULT_TEMPLATE,
+    separator: str = DEFAULT_SEPARATOR,
+) -> PackedContext:
+    """検索結果の Document（上位ほど先）を、順位をスコアにして pack_context に渡す"""
+    return pack_context(
+        [(doc.id or str(i), doc.page_content, -float(i)) for i, doc in enumerate(docs)],
+        budget=budget,
+        counter=counter,
+        min_tokens=min_tokens,
+        template=template,
+        separator=separator,
+    )
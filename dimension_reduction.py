@@ -0,0 +1,227 @@
+# dimension_reduction.py
+"""
+埋め込みの次元を減らして、索引を小さく・検索を速くする。
+
+EMBEDDING_DIM_MODE:
+    full   : モデルそのままの次元（既定）
+    native : モデルに短い埋め込みを直接出させる（text-embedding-3 の dimensions。ローカルはバケツ数）
+    pca    : full の埋め込みを取り込んでから PCA を当てはめ、射影した別コレクションを作る。
+             射影（主成分の行列）はコレクションの横に <コレクション名>.pca.npz として保存し、
+             検索時はクエリの埋め込みに同じ射影をかける
+EMBEDDING_DIMENSIONS: native / pca のときの次元数（既定 256）
+どちらも呼んだ時点の値を見る（import より後の load_env() で .env から読んだ値も効く）
+
+取り込み時のモードと次元数は <コレクション名>.dims.json に記録する。検索側は環境変数で
+指定しなければ、記録された値で同じコレクション・同じ射影を開く。
+"""
+import json
+import os
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from chroma_sync import upsert_vectors
+from ingest_pipeline import IdSpool, delete_missing_ids
+
+DIMENSION_MODES = ("full", "native", "pca")
+DEFAULT_DIM_MODE = "full"
+DEFAULT_DIMENSIONS = 256
+
+# 共分散行列を作るときに一度に掛け合わせる行数
+_COV_CHUNK = 8192
+
+
+def dimension_mode(mode: Optional[str] = None) -> str:
+    mode = mode or os.getenv("EMBEDDING_DIM_MODE") or DEFAULT_DIM_MODE
+    if mode not in DIMENSION_MODES:
+        raise RuntimeError(f"EMBEDDING_DIM_MODE は {DIMENSION_MODES} のどれかを指定してください")
+    return mode
+
+
+def default_dimensions() -> int:
+    return int(os.getenv("EMBEDDING_DIMENSIONS") or DEFAULT_DIMENSIONS)
+
+
+def dimension_suffix(mode: Optional[str] = None, dimensions: Optional[int] = None) -> str:
+    """次元のモードごとにコレクション・ファイル名を分けるための接尾辞"""
+    mode = dimension_mode(mode)
+    if mode == "full":
+        return ""
+    dimensions = dimensions or default_dimensions()
+    return f"_d{dimensions}" if mode == "native" else f"_pca{dimensions}"
+
+
+def projection_path(persist_dir: str, collection_name: str) -> str:
+    return os.path.join(persist_dir, f"{collection_name}.pca.npz")
+
+
+# --------------------------
+# 取り込み時の設定の記録
+# --------------------------
+def settings_path(persist_dir: str, collection_name: str) -> str:
+    """collection_name は次元の接尾辞を付ける前の名前（バックエンドの接尾辞までは付ける）"""
+    return os.path.join(persist_dir, f"{collection_name}.dims.json")
+
+
+def load_dimension_settings(persist_dir: str, collection_name: str) -> Dict[str, Any]:
+    path = settings_path(persist_dir, collection_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_dimension_settings(persist_dir: str, collection_name: str, mode: str, dimensions: int) -> None:
+    """最後に取り込んだモードと、モードごとの次元数を記録する"""
+    settings = load_dimension_settings(persist_dir, collection_name)
+    settings["mode"] = dimension_mode(mode)
+    if mode != "full":
+        settings.setdefault("dimensions", {})[mode] = int(dimensions)
+
+    path = settings_path(persist_dir, collection_name)
+    os.makedirs(persist_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(settings, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def resolve_dimension_settings(
+    persist_dir: str,
+    collection_name: str,
+    mode: Optional[str] = None,
+    dimensions: Optional[int] = None,
+) -> Tuple[str, int]:
+    """
+    検索で使う (モード, 次元数)。
+    引数 → 環境変数 → 取り込み時の記録 → 既定（full / 256）の順に決める
+    """
+    saved = load_dimension_settings(persist_dir, collection_name)
+    mode = dimension_mode(mode or os.getenv("EMBEDDING_DIM_MODE") or saved.get("mode"))
+    if dimensions is None and os.getenv("EMBEDDING_DIMENSIONS"):
+        dimensions = int(os.environ["EMBEDDING_DIMENSIONS"])
+    if dimensions is None:
+        dimensions = saved.get("dimensions", {}).get(mode)
+    return mode, dimensions or DEFAULT_DIMENSIONS
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class PCAProjection:
+    """
+    上位の主成分へ射影する（射影後は行ごとに L2 正規化してコサイン類似度で使う）。
+
+    - 主成分は平均を引いて求めるが、射影するときは平均を引かない。
+      平均を引くと文書ごとに mean との内積の分だけスコアがずれ、元の次元での順位が崩れる
+    - 件数 > 次元数なら共分散行列（次元数 × 次元数）の固有値分解、そうでなければ SVD で求める
+    - 主成分の数は min(件数, 次元数) を超えられない。それより多く頼んだときは切り詰める
+    """
+
+    def __init__(self, components: np.ndarray, explained: np.ndarray) -> None:
+        self.components = components.astype(np.float32)  # (出力次元, 入力次元)
+        self.explained = explained  # 各主成分の分散の割合
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def source_dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.components.nbytes)
+
+    @classmethod
+    def fit(cls, vectors: Any, dimensions: int) -> "PCAProjection":
+        matrix = np.asarray(vectors, dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[0] == 0:
+            raise ValueError("PCA を当てはめるベクトルがありません")
+        matrix = _normalize_rows(matrix)
+        n, d = matrix.shape
+        mean = matrix.mean(axis=0)
+        dimensions = min(dimensions, n, d)
+
+        if n > d:
+            cov = np.zeros((d, d))
+            for start in range(0, n, _COV_CHUNK):
+                chunk = matrix[start : start + _COV_CHUNK] - mean
+                cov += chunk.T @ chunk
+            values, vecs = np.linalg.eigh(cov)
+            order = np.argsort(values)[::-1][:dimensions]
+            components = vecs[:, order].T
+            variance = np.clip(values, 0, None)
+            explained = variance[order] / max(variance.sum(), 1e-12)
+        else:
+            _, singular, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+            components = vt[:dimensions]
+            variance = singular**2
+            explained = variance[:dimensions] / max(variance.sum(), 1e-12)
+
+        return cls(components, explained)
+
+    def transform(self, vectors: Any) -> np.ndarray:
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        return _normalize_rows(matrix @ self.components.T).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, components=self.components, explained=self.explained)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAProjection":
+        if not os.path.exists(path):
+            raise RuntimeError(f"{path} がありません。先に EMBEDDING_DIM_MODE=pca で取り込んでください")
+        with np.load(path) as data:
+            return cls(data["components"], data["explained"])
+
+
+class ProjectedEmbeddings(Embeddings):
+    """下の埋め込みモデルの結果に PCAProjection をかけて返す"""
+
+    def __init__(self, underlying: Embeddings, projection: PCAProjection) -> None:
+        self.underlying = underlying
+        self.projection = projection
+        self.model = f"{getattr(underlying, 'model', type(underlying).__name__)}+pca{projection.dimensions}"
+        self.dimensions = projection.dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.transform(self.underlying.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.transform([self.underlying.embed_query(text)])[0].tolist()
+
+    def format_stats(self) -> str:
+        inner = getattr(self.underlying, "format_stats", None)
+        text = f"PCA {self.projection.source_dimensions} → {self.dimensions} 次元"
+        return f"{inner()} / {text}" if inner else text
+
+
+def sync_projected(source, target, projection: PCAProjection, batch_size: int = 512) -> Dict[str, int]:
+    """
+    source（Chroma）の全ベクトルを batch_size 件ずつ射影して target（Chroma）に書き込む（埋め込み直しはしない）。
+    PCA を当てはめ直すと全件のベクトルが変わるので、毎回すべて書き直し、source に無い ID は消す
+    """
+    written = 0
+    with closing(IdSpool()) as seen:
+        offset = 0
+        while True:
+            page = source.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            ids = list(page["ids"])
+            if not ids:
+                break
+            vectors = projection.transform(page["embeddings"])
+            upsert_vectors(target, ids, page["documents"], page["metadatas"], vectors.tolist())
+            seen.add_many(ids)
+            written += len(ids)
+            offset += len(ids)
+        deleted = delete_missing_ids(target, seen, page_size=batch_size)
+    return {"written": written, "deleted": deleted}
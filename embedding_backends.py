@@ -0,0 +1,154 @@
+# embedding_backends.py
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from bm25_index import fold_text
+
+# EMBEDDING_BACKEND: openrouter（既定）/ local
+#   local はネットワークも API キーも使わない、手元だけで完結する埋め込み
+# LOCAL_EMBEDDING_DIM: local の次元数（既定 256）
+# どちらも呼んだ時点の環境変数を見る（import より後の load_env() で .env から読んだ値も効く）
+BACKENDS = ("openrouter", "local")
+DEFAULT_BACKEND = "openrouter"
+OPENROUTER_EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_DIM = 256
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# 64bit のハッシュ計算に使う定数（多項式ハッシュの基数と splitmix64 の係数）
+_BASE = np.uint64(0x100000001B3)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """splitmix64 の仕上げ。近い値のハッシュも全ビットに散らす"""
+    h = (h ^ (h >> np.uint64(30))) * _MIX1
+    h = (h ^ (h >> np.uint64(27))) * _MIX2
+    return h ^ (h >> np.uint64(31))
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    文字 n-gram をハッシュで固定次元に落とす、ローカルの埋め込みモデル（学習なし）。
+
+    - テキストは fold_text で表記ゆれをそろえ、単語（空白・句読点の区切り）の中だけで n-gram を作る
+    - n-gram はハッシュで dimensions 個のバケツに振り分け、符号付きで数える（衝突が打ち消し合う）
+    - バッチ全体の文字をつなげた1本の配列で、n-gram のハッシュ・集計・正規化まで NumPy でまとめて行う
+    - 同じテキストからは、いつ・どのプロセスでも同じベクトルになる（キャッシュ不要なくらい速い）
+    """
+
+    def __init__(
+        self,
+        dimensions: Optional[int] = None,
+        ngram_range: Tuple[int, int] = (1, 3),
+        batch_size: int = 1024,
+    ) -> None:
+        self.dimensions = dimensions or local_embedding_dim()
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.model = f"hashed-ngram-{ngram_range[0]}-{ngram_range[1]}"
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dimensions) の float32 行列（各行は L2 正規化済み。空のテキストは 0 ベクトル）"""
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            out[start : start + self.batch_size] = self._embed_batch(texts[start : start + self.batch_size])
+        return out
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        # 単語の区切りとテキストの区切りを 0 にして、全テキストを1本のコードポイント列にする
+        parts = [_NON_WORD.sub("\0", fold_text(t)) + "\0" for t in texts]
+        codes = np.frombuffer("".join(parts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        # 各文字がどのテキストのものか
+        owner = np.repeat(np.arange(len(texts)), [len(p) for p in parts])
+
+        counts = np.zeros(len(texts) * self.dimensions, dtype=np.float64)
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            m = len(codes) - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, (n * _GOLDEN) & 0xFFFFFFFFFFFFFFFF, dtype=np.uint64)
+            valid = np.ones(m, dtype=bool)
+            for j in range(n):
+                window = codes[j : j + m]
+                h = h * _BASE + window
+                valid &= window != 0
+            h = _mix64(h[valid])
+            bucket = (h % np.uint64(self.dimensions)).astype(np.int64)
+            sign = np.where(h >> np.uint64(63), -1.0, 1.0)
+            counts += np.bincount(
+                owner[:m][valid] * self.dimensions + bucket, weights=sign, minlength=counts.size
+            )
+
+        matrix = counts.reshape(len(texts), self.dimensions).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def format_stats(self) -> str:
+        return (
+            f"ローカル埋め込み（{self.model}, {self.dimensions} 次元）: "
+            f"{self.calls} 回 / {self.texts_embedded} 件"
+        )
+
+
+def local_embedding_dim() -> int:
+    return int(os.getenv("LOCAL_EMBEDDING_DIM") or LOCAL_EMBEDDING_DIM)
+
+
+def embedding_backend(backend: Optional[str] = None) -> str:
+    backend = backend or os.getenv("EMBEDDING_BACKEND") or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise RuntimeError(f"EMBEDDING_BACKEND は {BACKENDS} のどれかを指定してください")
+    return backend
+
+
+def build_embeddings(
+    backend: Optional[str] = None, cached: bool = False, dimensions: Optional[int] = None
+) -> Embeddings:
+    """
+    設定に応じた埋め込みモデルを作る。
+    dimensions を渡すと、その次元の埋め込みを直接出させる（text-embedding-3 の dimensions /
+    ローカルはバケツ数。dimension_reduction の native モード）。
+
+    - openrouter: OpenRouter 経由の OpenAI Embedding（OPENROUTER_API_KEY が必要）。
+      クライアントは openrouter_clients から共有のものをもらう。cached=True なら CachedEmbeddings でディスクにキャッシュする
+    - local: HashedNgramEmbeddings（キーもネットワークも不要。速いのでキャッシュしない）
+    """
+    backend = embedding_backend(backend)
+    if backend == "local":
+        return HashedNgramEmbeddings(dimensions)
+
+    import openrouter_clients
+
+    params = {"dimensions": dimensions} if dimensions else {}
+    emb: Embeddings = openrouter_clients.embeddings(OPENROUTER_EMBEDDING_MODEL, **params)
+    if cached:
+        from embedding_cache import CachedEmbeddings
+
+        emb = CachedEmbeddings(emb)
+    return emb
+
+
+def collection_suffix(backend: Optional[str] = None) -> str:
+    """
+    バックエンドごとにコレクション・ファイル名を分けるための接尾辞。
+    ベクトルの次元も意味も違うので、同じコレクションに混ぜない
+    """
+    return "" if embedding_backend(backend) == "openrouter" else "_local"
@@ -0,0 +1,259 @@
+# embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite3")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+# SQLite のプレースホルダ数の上限に引っかからないよう、まとめて引く件数
+_LOOKUP_CHUNK = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    OpenAIEmbeddings などをそのまま包んで使える、ディスク永続の埋め込みキャッシュ。
+
+    - キーは (モデル名, 次元数, テキストの sha256)
+    - ベクトルは float32 のバイト列として SQLite に保存
+    - 合計サイズが max_bytes を超えたら、最後に使われたのが古い順に削除
+    - hits / misses を数えておき、stats() で確認できる
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.underlying = underlying
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.dimensions = dimensions or getattr(underlying, "dimensions", None) or 0
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self.conn.commit()
+
+    # --------------------------
+    # Embeddings インターフェース
+    # --------------------------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self._lookup(hashes)
+
+        # まだ無いテキストだけ（重複も除いて）元のモデルに投げる
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+
+        miss_count = sum(1 for h in hashes if h not in found)
+        with self.lock:
+            self.hits += len(texts) - miss_count
+            self.misses += miss_count
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self._store(new_items)
+            found.update(new_items)
+
+        return [list(found[h]) for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    # --------------------------
+    # SQLite とのやりとり
+    # --------------------------
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        now = time.time()
+
+        with self.lock:
+            for start in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[start : start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    [self.model, self.dimensions, *chunk],
+                ).fetchall()
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+
+            if found:
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, self.model, self.dimensions, h) for h in found],
+                )
+                self.conn.commit()
+
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        rows = []
+        for h, vec in items.items():
+            blob = array("f", vec).tobytes()
+            rows.append((self.model, self.dimensions, h, blob, len(blob), now))
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(model, dimensions, text_hash, vector, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+            self._evict()
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えていたら、古いものから上限の 9 割まで削る"""
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for rowid, nbytes in self.conn.execute(
+            "SELECT rowid, nbytes FROM embeddings ORDER BY last_used"
+        ):
+            if total - freed <= target:
+                break
+            victims.append((rowid,))
+            freed += nbytes
+
+        self.conn.executemany("DELETE FROM embeddings WHERE rowid = ?", victims)
+        self.conn.commit()
+
+    # --------------------------
+    # 統計
+    # --------------------------
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            (entries, total) = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (
+            f"埋め込みキャッシュ: ヒット {s['hits']} / ミス {s['misses']} "
+            f"（{s['entries']} 件, {s['bytes'] / 1024 / 1024:.1f} MB）"
+        )
+
+
+def normalize_query(text: str) -> str:
+    """全角/半角ゆれ（NFKC）と前後・連続する空白をそろえる"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """
+    検索クエリの埋め込みだけをメモリ上に持っておく LRU キャッシュ。
+
+    - クエリは normalize_query() で正規化してからキーにする（埋め込むのは入力されたテキストそのまま。
+      正規化は「同じ質問」とみなす範囲を決めるだけ）
+    - 返すのはキャッシュの中身のコピー（呼び出し側が書き換えてもキャッシュは壊れない）
+    - max_size 件を超えたら最後に使われたのが古いものから捨てる
+    - ttl（秒）を指定すると、それより古い結果は使わない
+    - embed_documents はそのまま下のモデルに渡す
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        max_size: int = 256,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.underlying = underlying
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        now = time.monotonic()
+
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None and (self.ttl is None or now - cached[0] <= self.ttl):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(cached[1])
+            self.misses += 1
+
+        vector = list(self.underlying.embed_query(text))
+
+        with self.lock:
+            self.entries[key] = (now, vector)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return list(vector)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return f"クエリ埋め込みLRU: ヒット {s['hits']} / ミス {s['misses']}（{s['entries']} 件保持）"
@@ -1,19 +1,166 @@
-import requests
+import argparse
 import csv
+import json
+import os
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HttpCache
 
 OUTPUT_CSV = "pokemon_151_with_image.csv"
+CHECKPOINT_PATH = "pokemon_151_with_image.checkpoint.jsonl"
+CACHE_DIR = ".pokeapi_cache"
+API_BASE = "https://pokeapi.co/api/v2"
+
+FIELDNAMES = [
+    "id",
+    "name_jp",
+    "name_en",
+    "type1",
+    "type2",
+    "description",
+    "image_url",
+]
+
+
+# --------------------------
+# 1. レート制限（トークンバケット）
+# --------------------------
+class TokenBucket:
+    """
+    1秒あたり rate 回、最大 burst 回までまとめて通すトークンバケット。
+    以前の固定 sleep(0.2) の代わりに、全スレッド共通で API への負荷を抑える。
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate は正の値を指定してください")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンが1つ取れるまで待つ"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# --------------------------
+# 2. HTTP クライアント（コネクションプール付きセッション）
+# --------------------------
+class PokeApiClient:
+    """
+    requests.Session を使い回し、全リクエストをトークンバケットに通すクライアント。
+    cache を渡すと ETag / Last-Modified による条件付きリクエストになり、
+    変更のないドキュメントは 304 だけで済む。
+    """
 
+    def __init__(
+        self,
+        base_url: str = API_BASE,
+        rate: float = 10.0,
+        burst: int = 5,
+        pool_size: int = 8,
+        timeout: float = 30.0,
+        cache: HttpCache | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        self.cache = cache
 
-def get_species_description(species_id: int) -> str:
-    """pokemon-species から日本語の説明文を1つ取得"""
-    url = f"https://pokeapi.co/api/v2/pokemon-species/{species_id}"
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json()
+    def get_json(self, url: str) -> dict:
+        record = self.cache.load(url) if self.cache else None
+        headers = self.cache.conditional_headers(record) if self.cache else {}
 
+        self.bucket.acquire()
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if r.status_code == 304 and record is not None:
+            self.cache.count("not_modified")
+            return record["body"]
+
+        r.raise_for_status()
+        body = r.json()
+        if self.cache:
+            self.cache.save(url, body, r.headers)
+            self.cache.count("fetched")
+        return body
+
+
+# --------------------------
+# 2.5 チェックポイント（途中から再開するため）
+# --------------------------
+class Checkpoint:
+    """
+    取得済みの行を JSON Lines で追記していくファイル。
+    途中で落ちても、次回はここに書かれた ID を飛ばして続きから取得する。
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self) -> dict[int, dict]:
+        rows: dict[int, dict] = {}
+        if not os.path.exists(self.path):
+            return rows
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で落ちた最終行は捨てる
+                    continue
+                rows[int(row["id"])] = row
+        return rows
+
+    def append(self, row: dict) -> None:
+        with self.lock:
+            with open(self.path, "a+b") as f:
+                # 前回が書き込み途中で落ちて最終行に改行が無ければ、改行してから書く
+                # （そのままだと新しい行が壊れた行にくっついて、両方読めなくなる）
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# --------------------------
+# 3. レスポンスから値を取り出す
+# --------------------------
+def extract_species_description(species: dict) -> str:
+    """pokemon-species のデータから日本語の説明文を1つ取得"""
     # 日本語の説明文を探す（ja-Hrkt → ひらがな・カタカナ、日本語優先）
-    for entry in data.get("flavor_text_entries", []):
+    for entry in species.get("flavor_text_entries", []):
         if entry["language"]["name"] in ["ja", "ja-Hrkt"]:
             text = entry["flavor_text"]
             # 改行や全角スペースを整形
@@ -23,37 +170,21 @@ def get_species_description(species_id: int) -> str:
     return ""
 
 
-def get_pokemon_data(poke_id: int) -> dict:
-    """ポケモンIDから、名前/タイプ/説明/画像URLをまとめて取得"""
-    url = f"https://pokeapi.co/api/v2/pokemon/{poke_id}"
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json()
-
-    # 英語名
-    name_en = data["name"]  # 例: "bulbasaur"
-
-    # 種族情報（日本語名など）を取得
-    species_url = data["species"]["url"]
-    species_res = requests.get(species_url)
-    species_res.raise_for_status()
-    species = species_res.json()
-
-    # 日本語名
-    name_jp = ""
+def extract_name_jp(species: dict) -> str:
+    """pokemon-species のデータから日本語名を取得"""
     for n in species.get("names", []):
         if n["language"]["name"] in ["ja", "ja-Hrkt"]:
-            name_jp = n["name"]
-            break
+            return n["name"]
+    return ""
+
 
+def build_row(poke_id: int, data: dict, species: dict) -> dict:
+    """/pokemon と /pokemon-species のレスポンスから CSV 1行分を組み立てる"""
     # タイプ（複数の場合あり）
     types = [t["type"]["name"] for t in data.get("types", [])]
     type1 = types[0] if len(types) > 0 else ""
     type2 = types[1] if len(types) > 1 else ""
 
-    # 説明文（日本語）
-    description = get_species_description(poke_id)
-
     # 画像URL（公式イラスト）
     # other → official-artwork → front_default がキレイな公式絵
     sprites = data.get("sprites", {})
@@ -63,47 +194,123 @@ def get_pokemon_data(poke_id: int) -> dict:
 
     return {
         "id": poke_id,
-        "name_jp": name_jp,
-        "name_en": name_en,
+        "name_jp": extract_name_jp(species),
+        "name_en": data["name"],  # 例: "bulbasaur"
         "type1": type1,
         "type2": type2,
-        "description": description,
+        "description": extract_species_description(species),
         "image_url": image_url,
     }
 
 
-def main() -> None:
-    all_data: list[dict] = []
-
-    for i in range(1, 152):  # 初代 1〜151
-        print(f"Fetching {i} ...")
-        try:
-            info = get_pokemon_data(i)
-            all_data.append(info)
-        except Exception as e:
-            print(f"Error on ID={i}: {e}")
-        # APIへの負荷を下げるために少し待つ
-        time.sleep(0.2)
-
-    # CSV に書き出し
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "id",
-                "name_jp",
-                "name_en",
-                "type1",
-                "type2",
-                "description",
-                "image_url",
-            ],
-        )
+def get_pokemon_data(poke_id: int, client: PokeApiClient) -> dict:
+    """ポケモンIDから、名前/タイプ/説明/画像URLをまとめて取得"""
+    data = client.get_json(f"{client.base_url}/pokemon/{poke_id}")
+
+    # 種族情報（日本語名・説明文）は1回だけ取得して使い回す
+    species = client.get_json(data["species"]["url"])
+
+    return build_row(poke_id, data, species)
+
+
+# --------------------------
+# 4. まとめて取得して CSV に書き出す
+# --------------------------
+def fetch_all(
+    ids: list[int],
+    client: PokeApiClient,
+    workers: int,
+    checkpoint: Checkpoint | None = None,
+) -> tuple[list[dict], list[int]]:
+    """
+    workers 本のスレッドで並列に取得する（workers=1 なら従来どおり直列）。
+    checkpoint に記録済みの ID は取得し直さない。
+    失敗した ID はスキップし、(ID 順に並べた結果, 失敗した ID) を返す。
+    """
+    results: dict[int, dict] = checkpoint.load() if checkpoint else {}
+    pending = [i for i in ids if i not in results]
+    if len(pending) < len(ids):
+        print(f"チェックポイントから再開: {len(ids) - len(pending)} 件は取得済み")
+
+    failed: list[int] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(get_pokemon_data, i, client): i for i in pending}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+                if checkpoint:
+                    checkpoint.append(results[i])
+                print(f"Fetched {i}")
+            except Exception as e:
+                failed.append(i)
+                print(f"Error on ID={i}: {e}")
+
+    return [results[i] for i in ids if i in results], sorted(failed)
+
+
+def write_csv(rows: list[dict], path: str = OUTPUT_CSV) -> None:
+    """一時ファイルに書いてから置き換える（書き込み途中で落ちても元の CSV は残る）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
-        writer.writerows(all_data)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="PokeAPI から初代151匹を取得して CSV に保存")
+    parser.add_argument("--workers", type=int, default=8, help="同時リクエスト数（1 で直列）")
+    parser.add_argument("--rate", type=float, default=10.0, help="1秒あたりの最大リクエスト数")
+    parser.add_argument("--burst", type=int, default=5, help="まとめて送れる最大リクエスト数")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="出力する CSV のパス")
+    parser.add_argument("--base-url", default=API_BASE, help="API のベースURL（ローカルの代替サーバー用）")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="レスポンスキャッシュの保存先")
+    parser.add_argument("--no-cache", action="store_true", help="レスポンスキャッシュを使わない")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="チェックポイントファイルのパス")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを捨てて最初から取得する")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    cache = None if args.no_cache else HttpCache(args.cache_dir)
+    client = PokeApiClient(
+        base_url=args.base_url,
+        rate=args.rate,
+        burst=args.burst,
+        pool_size=args.workers,
+        cache=cache,
+    )
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+
+    started = time.perf_counter()
+    all_data, failed = fetch_all(
+        list(range(1, 152)), client, args.workers, checkpoint  # 初代 1〜151
+    )
+
+    elapsed = time.perf_counter() - started
+    if cache:
+        print(
+            f"キャッシュ: 取得 {cache.stats['fetched']} 件 / "
+            f"未変更(304) {cache.stats['not_modified']} 件"
+        )
+
+    if failed:
+        # 欠けた CSV で上書きすると、次の取り込みで欠けたポケモンが「消えた行」として削除される。
+        # 前回の CSV とチェックポイントを残したまま終了し、次回は失敗分だけ取り直す
+        print(f"⚠️ 取得に失敗した ID: {failed}（{args.output} は更新していません。再実行すると続きから取得します）")
+        sys.exit(1)
 
-    print(f"\n🎉 完了！ → {OUTPUT_CSV} を生成しました")
+    # 全件そろったときだけ CSV を書き出す
+    write_csv(all_data, args.output)
+    checkpoint.clear()
+    print(f"\n🎉 完了！ → {args.output} を生成しました（{elapsed:.1f} 秒）")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,150 @@
+# graph_csr.py
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+def _gather_ranges(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """CSR の各行 [indptr[r], indptr[r + 1]) の添字を1本の配列につなげる"""
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(total) + offsets
+
+
+class CompiledGraph:
+    """
+    ナレッジグラフを配列だけで持つ読み取り専用の表現（10万ノード以上の大きなグラフ向け）。
+
+    - ノードは 0..n-1 の整数 ID。隣接は CSR（indptr / indices）で、
+      extract_subgraph_docs と同じく向きを無視した（predecessors ∪ successors の）隣接を持つ
+    - k ホップ展開はフロンティア全体をまとめて NumPy で広げる（ノードごとの Python ループなし）
+    - ノードごとの doc_id はビットセット（64 doc ずつの uint64 ワード）で持ち、集めるときは OR するだけ。
+      ドキュメント数が多くても膨らまないよう、0 でないワードだけを CSR 形式
+      （doc_ptr / doc_word / doc_bits）で持つ
+    """
+
+    def __init__(
+        self,
+        nodes: Sequence[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        doc_ids: Sequence[str],
+        doc_ptr: np.ndarray,
+        doc_word: np.ndarray,
+        doc_bits: np.ndarray,
+    ) -> None:
+        self.nodes = list(nodes)
+        self.node_index: Dict[str, int] = {name: i for i, name in enumerate(self.nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.doc_ids = list(doc_ids)
+        self.num_words = max(1, (len(self.doc_ids) + 63) // 64)
+        self.doc_ptr = doc_ptr  # ノード i のワードは doc_word / doc_bits の [doc_ptr[i], doc_ptr[i + 1])
+        self.doc_word = doc_word  # ワード番号（doc 番号 // 64）
+        self.doc_bits = doc_bits  # そのワードのビット（doc 番号 % 64 のビットが立つ）
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.node_index
+
+    @property
+    def num_edges(self) -> int:
+        """向きを無視した隣接の数（片方向ずつ数える）"""
+        return int(self.indptr[-1])
+
+    @classmethod
+    def from_networkx(cls, G: "nx.DiGraph", doc_ids: Optional[Iterable[str]] = None) -> "CompiledGraph":
+        nodes = list(G.nodes)
+        node_index = {name: i for i, name in enumerate(nodes)}
+        n = len(nodes)
+
+        # 両方向の辺をまとめて、(始点, 終点) の重複を除いてから CSR にする
+        edges = np.array(
+            [(node_index[u], node_index[v]) for u, v in G.edges if u != v], dtype=np.int64
+        ).reshape(-1, 2)
+        src = np.concatenate([edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], edges[:, 0]])
+        keys = np.unique(src * n + dst)
+        src, dst = keys // n, keys % n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        indices = dst.astype(np.int32 if n < 2**31 else np.int64)
+
+        node_docs = [attrs.get("docs", ()) for _, attrs in G.nodes(data=True)]
+        if doc_ids is None:
+            doc_ids = sorted({d for docs in node_docs for d in docs})
+        doc_ids = list(doc_ids)
+        doc_index = {d: i for i, d in enumerate(doc_ids)}
+
+        # (ノード, ワード番号) ごとにビットを OR して、0 でないワードだけを残す
+        pairs = np.array(
+            [(i, doc_index[d]) for i, docs in enumerate(node_docs) for d in docs], dtype=np.int64
+        ).reshape(-1, 2)
+        words = max(1, (len(doc_ids) + 63) // 64)
+        keys, inverse = np.unique(pairs[:, 0] * words + pairs[:, 1] // 64, return_inverse=True)
+        doc_bits = np.zeros(len(keys), dtype=np.uint64)
+        np.bitwise_or.at(
+            doc_bits, inverse, np.left_shift(np.uint64(1), (pairs[:, 1] % 64).astype(np.uint64))
+        )
+        doc_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // words, minlength=n), out=doc_ptr[1:])
+        doc_word = (keys % words).astype(np.int32)
+
+        return cls(nodes, indptr, indices, doc_ids, doc_ptr, doc_word, doc_bits)
+
+    # --------------------------
+    # 展開
+    # --------------------------
+    def node_ids(self, names: Iterable[str]) -> np.ndarray:
+        """ノード名を整数 ID に変換（グラフに無い名前は飛ばす）"""
+        return np.array(
+            [self.node_index[name] for name in names if name in self.node_index], dtype=np.int64
+        )
+
+    def neighbors(self, frontier: np.ndarray) -> np.ndarray:
+        """frontier の全ノードの隣接をまとめて返す（重複あり）"""
+        return self.indices[_gather_ranges(self.indptr, frontier)]
+
+    def k_hop(self, seeds: np.ndarray, hops: int = 2) -> np.ndarray:
+        """seeds から hops ホップ以内のノード（seeds 自身を含む）の整数 ID"""
+        visited = np.zeros(len(self.nodes), dtype=bool)
+        frontier = np.unique(seeds)
+        visited[frontier] = True
+        reached_all = [frontier]
+        for _ in range(hops):
+            if frontier.size == 0:
+                break
+            reached = self.neighbors(frontier)
+            frontier = np.unique(reached[~visited[reached]])
+            visited[frontier] = True
+            reached_all.append(frontier)
+        return np.concatenate(reached_all)
+
+    # --------------------------
+    # ドキュメント
+    # --------------------------
+    def docs_bitset(self, nodes: np.ndarray) -> np.ndarray:
+        """nodes に紐づく doc のビットセットを OR でまとめる（長さ num_words の uint64 配列）"""
+        positions = _gather_ranges(self.doc_ptr, nodes)
+        bitset = np.zeros(self.num_words, dtype=np.uint64)
+        np.bitwise_or.at(bitset, self.doc_word[positions], self.doc_bits[positions])
+        return bitset
+
+    def bitset_to_doc_ids(self, bitset: np.ndarray) -> List[str]:
+        bits = np.unpackbits(bitset.astype("<u8").view(np.uint8), bitorder="little")
+        return [self.doc_ids[i] for i in np.flatnonzero(bits[: len(self.doc_ids)])]
+
+    def related_doc_ids(self, start_nodes: Iterable[str], hops: int = 2) -> List[str]:
+        seeds = self.node_ids(start_nodes)
+        if seeds.size == 0:
+            return []
+        return self.bitset_to_doc_ids(self.docs_bitset(self.k_hop(seeds, hops)))
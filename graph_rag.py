@@ -1,25 +1,29 @@
 import os
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-import networkx as nx
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from context_packer import DEFAULT_TOKEN_BUDGET, PackedContext, default_counter, pack_context
+from graph_csr import CompiledGraph
+from graph_store import DEFAULT_GRAPH_PATH, KnowledgeGraphStore
+import openrouter_clients
+from runtime import first_prompt, lazy_import
+
+# networkx は重いので、実際に使うときまで import しない
+nx = lazy_import("networkx")
 
 
 # =========================================================
 # 0. 環境設定（.env 読み込み & OpenRouter モデル設定）
 # =========================================================
 
-load_dotenv()
-
 # あなたが以前使っていたスタイルに合わせて OpenRouter を設定
 # モデル名はお好みで変更OK（例: "anthropic/claude-3.5-sonnet", "openai/gpt-4o" など）
-llm = ChatOpenAI(
-    model="anthropic/claude-3.5-sonnet",
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
+MODEL_NAME = "anthropic/claude-3.5-sonnet"
+
+
+def get_llm():
+    """LLM は最初に呼ぶときに1回だけ作る（グラフ処理だけなら API キー不要）"""
+    return openrouter_clients.chat_model(MODEL_NAME)
 
 
 # =========================================================
@@ -77,9 +81,10 @@ def build_naive_rag_prompt() -> str:
 class GraphConfig:
     """ナレッジグラフ構成用の設定（サンプルでは固定）"""
     query_related_nodes: List[str]
+    hops: int = 2  # 関連ノードから何ホップ先まで辿るか
 
 
-def build_knowledge_graph() -> nx.DiGraph:
+def build_knowledge_graph() -> "nx.DiGraph":
     """サンプル用に手書きで因果グラフを構築（本番は LLM 抽出などで自動化）"""
     G = nx.DiGraph()
 
@@ -107,11 +112,44 @@ def build_knowledge_graph() -> nx.DiGraph:
     return G
 
 
-def extract_subgraph_docs(G: nx.DiGraph, config: GraphConfig) -> Dict[str, str]:
+_loaded: Optional[Tuple[CompiledGraph, Dict[str, str]]] = None
+
+
+def load_graph(path: str = DEFAULT_GRAPH_PATH) -> Tuple[CompiledGraph, Dict[str, str]]:
+    """
+    (コンパイル済みグラフ, doc_id → 本文) をプロセスで1回だけ用意する。
+    graph_store.py で保存したグラフがあればそれを読み、無ければ手書きのサンプルを使う。
     """
-    質問に関連しそうなノードから 1〜2 ホップ辿ってサブグラフを作り、
-    そこにぶら下がっている doc_id を集める。
+    global _loaded
+    if _loaded is None:
+        if os.path.exists(path):
+            store = KnowledgeGraphStore(path)
+            _loaded = (CompiledGraph.from_networkx(store.load_graph()), store.load_documents())
+        else:
+            _loaded = (CompiledGraph.from_networkx(build_knowledge_graph()), documents)
+    return _loaded
+
+
+def find_query_nodes(nodes: Iterable[str], text: str, keywords: List[str]) -> List[str]:
+    """質問文にそのまま出てくるノードと、キーワードを含むノードを起点にする"""
+    return [n for n in nodes if n in text or any(k in n for k in keywords)]
+
+
+def extract_subgraph_docs(
+    G: Union["nx.DiGraph", CompiledGraph],
+    config: GraphConfig,
+    docs: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
     """
+    質問に関連しそうなノードから config.hops ホップ（既定 2）辿ってサブグラフを作り、
+    そこにぶら下がっている doc_id を集める（本文は docs、省略時は documents から引く）。
+    G に CompiledGraph を渡すと、CSR の配列とビットセットで同じ結果を求める。
+    """
+    docs = documents if docs is None else docs
+    if isinstance(G, CompiledGraph):
+        doc_ids = G.related_doc_ids(config.query_related_nodes, config.hops)
+        return {doc_id: docs[doc_id] for doc_id in doc_ids}
+
     sub_nodes = set()
 
     for start in config.query_related_nodes:
@@ -119,14 +157,17 @@ def extract_subgraph_docs(G: nx.DiGraph, config: GraphConfig) -> Dict[str, str]:
             continue
         sub_nodes.add(start)
 
-        # 1ホップ先
-        sub_nodes.update(G.predecessors(start))
-        sub_nodes.update(G.successors(start))
-
-        # 2ホップ先（簡易）
-        for n in list(G.predecessors(start)) + list(G.successors(start)):
-            sub_nodes.update(G.predecessors(n))
-            sub_nodes.update(G.successors(n))
+        # 1ホップずつ先へ（向きは気にせず predecessors / successors の両方）
+        seen = {start}
+        frontier = {start}
+        for _ in range(config.hops):
+            reached = set()
+            for n in frontier:
+                reached.update(G.predecessors(n))
+                reached.update(G.successors(n))
+            frontier = reached - seen
+            seen.update(frontier)
+        sub_nodes.update(seen)
 
     subgraph = G.subgraph(sub_nodes)
 
@@ -135,25 +176,29 @@ def extract_subgraph_docs(G: nx.DiGraph, config: GraphConfig) -> Dict[str, str]:
         if "docs" in attrs:
             related_doc_ids.update(attrs["docs"])
 
-    return {doc_id: documents[doc_id] for doc_id in related_doc_ids}
+    return {doc_id: docs[doc_id] for doc_id in related_doc_ids}
 
 
-def build_graph_rag_prompt() -> str:
-    G = build_knowledge_graph()
+def build_graph_rag_prompt_with_stats(
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+) -> Tuple[str, PackedContext]:
+    """GraphRAG 用プロンプトと、参考情報をどれだけ詰めたか（トークン数の内訳）を返す"""
+    # グラフは毎回作らず、保存済みのもの（無ければサンプル）を1回だけ読み込んで使い回す
+    G, graph_docs = load_graph()
 
-    config = GraphConfig(
-        query_related_nodes=[
-            "夜間救急の受付",
-            "処理時間30分",
-            "処理時間5分",
-        ]
-    )
+    # サンプルのグラフでは「夜間救急の受付」「処理時間30分」「処理時間5分」が起点になる
+    config = GraphConfig(query_related_nodes=find_query_nodes(G.nodes, query, KEYWORDS))
 
-    related_docs = extract_subgraph_docs(G, config)
+    related_docs = extract_subgraph_docs(G, config, graph_docs)
 
-    context_text = "\n".join(
-        f"[{doc_id}] {text}" for doc_id, text in related_docs.items()
-    )
+    # グラフが大きくなってもプロンプトが際限なく伸びないよう、
+    # キーワードのスコアが高い順に token_budget トークンまで詰める（重複した文は落とす）
+    scored = [
+        (doc_id, text, naive_score(text, KEYWORDS))
+        for doc_id, text in sorted(related_docs.items())
+    ]
+    packed = pack_context(scored, budget=token_budget)
+    context_text = packed.render()
 
     prompt = f"""
 [GraphRAG 用プロンプト]
@@ -168,7 +213,11 @@ def build_graph_rag_prompt() -> str:
 これらの情報をもとに、
 「なぜ受付時間が短縮されたのか」を日本語でわかりやすく説明してください。
 """
-    return prompt.strip()
+    return prompt.strip(), packed
+
+
+def build_graph_rag_prompt(token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    return build_graph_rag_prompt_with_stats(token_budget)[0]
 
 
 # =========================================================
@@ -180,7 +229,7 @@ def call_llm_with_openrouter(prompt: str) -> str:
     ChatOpenAI(=OpenRouter) にそのまま文字列プロンプトを渡して呼び出す。
     ChatOpenAI は str を渡すと "human" メッセージとして扱ってくれる。
     """
-    res = llm.invoke(prompt)
+    res = get_llm().invoke(prompt)
     # ChatMessage 形式なので .content を参照
     return res.content
 
@@ -190,18 +239,23 @@ def call_llm_with_openrouter(prompt: str) -> str:
 # =========================================================
 
 def main():
+    counter = default_counter()
+
     print("=== Naive RAG ===")
     naive_prompt = build_naive_rag_prompt()
     print("----- prompt -----")
     print(naive_prompt)
+    print(f"（プロンプト {counter.count(naive_prompt)} トークン）")
+    first_prompt()  # STARTUP_REPORT=1 なら、ここまでの起動時間を表示
     print("\n----- answer -----")
     naive_answer = call_llm_with_openrouter(naive_prompt)
     print(naive_answer)
 
     print("\n\n=== GraphRAG ===")
-    graph_prompt = build_graph_rag_prompt()
+    graph_prompt, packed = build_graph_rag_prompt_with_stats()
     print("----- prompt -----")
     print(graph_prompt)
+    print(f"（プロンプト {counter.count(graph_prompt)} トークン / {packed.format_stats()}）")
     print("\n----- answer -----")
     graph_answer = call_llm_with_openrouter(graph_prompt)
     print(graph_answer)
@@ -0,0 +1,339 @@
+# graph_store.py
+"""
+ドキュメントから LLM でエンティティ・関係を抽出し、ナレッジグラフとしてディスクに保存する。
+
+使い方:
+    python graph_store.py                               # graph_rag.documents を取り込む
+    python graph_store.py --input docs.jsonl            # {"id": "...", "text": "..."} の行
+    python graph_store.py --max-concurrency 8 --batch-size 32
+
+- 抽出結果はドキュメント本文の sha256 ごとに保存し、本文が変わっていなければ LLM を呼ばない
+- グラフはノード表（node_docs）と辺表（edges）として SQLite に保存する
+- 取り込み元から消えたドキュメントは、グラフからも取り除く
+- graph_rag.py はこのファイルがあれば、毎回グラフを作らずに読み込んで使う
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import openrouter_clients
+from runtime import Lazy, lazy_import, load_env
+
+# networkx / langchain_core.prompts は重いので、グラフを読む・チェーンを作るときまで import しない
+nx = lazy_import("networkx")
+prompts = lazy_import("langchain_core.prompts")
+
+DEFAULT_GRAPH_PATH = os.getenv("GRAPH_STORE_PATH", "knowledge_graph.sqlite3")
+MODEL_NAME = "anthropic/claude-3.5-sonnet"
+
+EXTRACTION_MESSAGES = [
+    (
+        "system",
+        "あなたはナレッジグラフを作るための情報抽出器です。"
+        "与えられた文章から、重要な概念（システム、業務、数値、手段など）をエンティティとして、"
+        "それらの間の因果・所属・利用などの関係をリレーションとして抜き出してください。\n"
+        "出力は次の形の JSON だけにしてください（説明文やコードブロックは不要）:\n"
+        '{{"entities": ["エンティティ名", ...], '
+        '"relations": [{{"source": "エンティティ名", "relation": "関係ラベル（英語の snake_case）", '
+        '"target": "エンティティ名"}}, ...]}}\n'
+        "エンティティ名は文章中の表現をできるだけそのまま、短い名詞句で書いてください。",
+    ),
+    ("human", "{text}"),
+]
+EXTRACTION_PROMPT = Lazy(
+    lambda: prompts.ChatPromptTemplate.from_messages(EXTRACTION_MESSAGES), "extraction prompt"
+)
+
+Extraction = Dict[str, Any]  # {"entities": [...], "relations": [{"source", "relation", "target"}]}
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_extraction_chain(model=None):
+    """抽出用のプロンプト → モデルのチェーン（model を渡せば差し替えられる）"""
+    if model is None:
+        model = openrouter_clients.chat_model(MODEL_NAME, temperature=0)
+    return EXTRACTION_PROMPT.get() | model
+
+
+def parse_extraction(text: str) -> Extraction:
+    """
+    LLM の応答から抽出結果の JSON を取り出して形をそろえる。
+    ```json のコードブロックや前後の説明文が付いていても、最初の {...} を読む。
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match is None:
+        raise ValueError(f"JSON が見つかりません: {text[:80]}")
+    data = json.loads(match.group(0))
+
+    relations = []
+    for rel in data.get("relations", []):
+        source, target = str(rel.get("source", "")).strip(), str(rel.get("target", "")).strip()
+        if source and target:
+            relations.append(
+                {"source": source, "relation": str(rel.get("relation", "")).strip(), "target": target}
+            )
+    entities = {str(e).strip() for e in data.get("entities", []) if str(e).strip()}
+    # 関係にだけ出てくる名前もノードにする
+    entities.update(r["source"] for r in relations)
+    entities.update(r["target"] for r in relations)
+    return {"entities": sorted(entities), "relations": relations}
+
+
+def _batched(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class KnowledgeGraphStore:
+    """
+    SQLite に保存するナレッジグラフ。
+
+    - extractions : (本文の sha256, モデル名) → 抽出結果の JSON（LLM 応答のキャッシュ）
+    - documents   : doc_id → 本文と sha256（変更検出と、プロンプトに載せる本文用）
+    - node_docs   : ノード名 → そのノードが出てきた doc_id（ノード表）
+    - edges       : (source, relation, target) → その関係が書かれていた doc_id（辺表）
+    """
+
+    def __init__(self, path: str = DEFAULT_GRAPH_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (content_hash, model)
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS node_docs (
+                node TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                PRIMARY KEY (node, doc_id)
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                source TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                target TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                PRIMARY KEY (source, relation, target, doc_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_node_docs_doc ON node_docs (doc_id);
+            CREATE INDEX IF NOT EXISTS idx_edges_doc ON edges (doc_id);
+            """
+        )
+        self.conn.commit()
+
+    # --------------------------
+    # 読み出し
+    # --------------------------
+    def document_hashes(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT doc_id, content_hash FROM documents"))
+
+    def load_documents(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT doc_id, text FROM documents ORDER BY doc_id"))
+
+    def cached_extraction(self, digest: str, model: str) -> Optional[Extraction]:
+        row = self.conn.execute(
+            "SELECT result FROM extractions WHERE content_hash = ? AND model = ?", (digest, model)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_graph(self) -> "nx.DiGraph":
+        """ノード表・辺表から graph_rag と同じ形（docs / relation 属性）の DiGraph を作る"""
+        G = nx.DiGraph()
+        for node, doc_id in self.conn.execute("SELECT node, doc_id FROM node_docs ORDER BY rowid"):
+            if node in G:
+                G.nodes[node]["docs"].add(doc_id)
+            else:
+                G.add_node(node, docs={doc_id})
+        for source, relation, target in self.conn.execute(
+            "SELECT DISTINCT source, relation, target FROM edges ORDER BY rowid"
+        ):
+            G.add_edge(source, target, relation=relation)
+        return G
+
+    def count(self) -> Dict[str, int]:
+        def one(sql: str) -> int:
+            return self.conn.execute(sql).fetchone()[0]
+
+        return {
+            "documents": one("SELECT COUNT(*) FROM documents"),
+            "nodes": one("SELECT COUNT(DISTINCT node) FROM node_docs"),
+            "edges": one("SELECT COUNT(*) FROM (SELECT DISTINCT source, relation, target FROM edges)"),
+        }
+
+    # --------------------------
+    # 書き込み
+    # --------------------------
+    def _replace_document(self, doc_id: str, text: str, extraction: Extraction) -> None:
+        self._delete_document(doc_id)
+        self.conn.execute(
+            "INSERT INTO documents (doc_id, content_hash, text) VALUES (?, ?, ?)",
+            (doc_id, content_hash(text), text),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO node_docs (node, doc_id) VALUES (?, ?)",
+            [(node, doc_id) for node in extraction["entities"]],
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO edges (source, relation, target, doc_id) VALUES (?, ?, ?, ?)",
+            [(r["source"], r["relation"], r["target"], doc_id) for r in extraction["relations"]],
+        )
+
+    def _delete_document(self, doc_id: str) -> None:
+        for table in ("documents", "node_docs", "edges"):
+            self.conn.execute(f"DELETE FROM {table} WHERE doc_id = ?", (doc_id,))
+
+    def save(self, model: str, results: List[Tuple[str, str, Extraction]]) -> None:
+        """(doc_id, 本文, 抽出結果) をまとめて書き込む（抽出結果のキャッシュも保存）"""
+        now = time.time()
+        with self.lock:
+            for doc_id, text, extraction in results:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO extractions (content_hash, model, result, created) "
+                    "VALUES (?, ?, ?, ?)",
+                    (content_hash(text), model, json.dumps(extraction, ensure_ascii=False), now),
+                )
+                self._replace_document(doc_id, text, extraction)
+            self.conn.commit()
+
+    def delete(self, doc_ids: List[str]) -> None:
+        with self.lock:
+            for doc_id in doc_ids:
+                self._delete_document(doc_id)
+            self.conn.commit()
+
+
+def ingest(
+    store: KnowledgeGraphStore,
+    docs: Dict[str, str],
+    chain,
+    batch_size: int = 16,
+    max_concurrency: int = 4,
+    delete_missing: bool = True,
+) -> Dict[str, int]:
+    """
+    docs（doc_id → 本文）をグラフに取り込む。
+
+    - 本文の sha256 が前回と同じドキュメントは何もしない
+    - 同じ本文の抽出結果がキャッシュにあれば、LLM を呼ばずにそれを使う
+    - 残りは batch_size 件ずつ chain.batch で最大 max_concurrency 件同時に抽出し、
+      1バッチごとに保存する（途中で止めても、次回は残りからやり直せる）
+    """
+    model = getattr(chain.last, "model_name", "") or type(chain.last).__name__
+    known = store.document_hashes()
+    stats = {"extracted": 0, "cached": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+
+    todo: List[Tuple[str, str]] = []
+    reused: List[Tuple[str, str, Extraction]] = []
+    for doc_id, text in docs.items():
+        digest = content_hash(text)
+        if known.get(doc_id) == digest:
+            stats["unchanged"] += 1
+            continue
+        cached = store.cached_extraction(digest, model)
+        if cached is not None:
+            reused.append((doc_id, text, cached))
+        else:
+            todo.append((doc_id, text))
+
+    if reused:
+        store.save(model, reused)
+        stats["cached"] = len(reused)
+
+    for batch in _batched(todo, batch_size):
+        responses = chain.batch(
+            [{"text": text} for _, text in batch],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        results = []
+        for (doc_id, text), res in zip(batch, responses):
+            try:
+                if isinstance(res, Exception):
+                    raise res
+                results.append((doc_id, text, parse_extraction(res.content)))
+            except Exception as e:  # 1件の失敗で全体を止めない（次回やり直す）
+                stats["failed"] += 1
+                print(f"Error on {doc_id}: {e}")
+        store.save(model, results)
+        stats["extracted"] += len(results)
+
+    if delete_missing:
+        missing = [doc_id for doc_id in known if doc_id not in docs]
+        store.delete(missing)
+        stats["deleted"] = len(missing)
+    return stats
+
+
+def format_ingest_stats(stats: Dict[str, int]) -> str:
+    return (
+        f"抽出 {stats['extracted']} 件 / キャッシュ利用 {stats['cached']} 件 / "
+        f"変更なし {stats['unchanged']} 件 / 削除 {stats['deleted']} 件 / 失敗 {stats['failed']} 件"
+    )
+
+
+def load_input(path: str) -> Dict[str, str]:
+    """{"id": ..., "text": ...} の JSONL を doc_id → 本文 にする"""
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return {str(row["id"]): row["text"] for row in rows}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ドキュメントからナレッジグラフを抽出して保存")
+    parser.add_argument("--input", default=None, help="JSONL（省略時は graph_rag.documents）")
+    parser.add_argument("--graph", default=DEFAULT_GRAPH_PATH, help="保存先の SQLite ファイル")
+    parser.add_argument("--batch-size", type=int, default=16, help="1回の保存でまとめる件数")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="同時に投げる抽出リクエスト数")
+    parser.add_argument("--keep-missing", action="store_true", help="入力から消えたドキュメントを残す")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    load_env()
+    openrouter_clients.api_key()  # キーが無ければここで止める
+
+    if args.input:
+        docs = load_input(args.input)
+    else:
+        from graph_rag import documents as docs
+
+    store = KnowledgeGraphStore(args.graph)
+    start = time.perf_counter()
+    stats = ingest(
+        store,
+        docs,
+        build_extraction_chain(),
+        batch_size=args.batch_size,
+        max_concurrency=args.max_concurrency,
+        delete_missing=not args.keep_missing,
+    )
+    counts = store.count()
+    print(f"🧠 {format_ingest_stats(stats)}（{time.perf_counter() - start:.1f} 秒）")
+    print(
+        f"   グラフ: ドキュメント {counts['documents']} 件 / ノード {counts['nodes']} / "
+        f"エッジ {counts['edges']} → {args.graph}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# http_cache.py
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+
+class HttpCache:
+    """
+    URL ごとにレスポンスをディスクへ保存するキャッシュ。
+
+    - 1 URL = 1 ファイル（ファイル名は URL の sha256）
+    - ETag / Last-Modified も一緒に保存し、次回は条件付きリクエストに使う
+    - 書き込みは一時ファイル → os.replace なので、途中で落ちても壊れない
+    """
+
+    def __init__(self, cache_dir: str = ".http_cache") -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.stats = {"fetched": 0, "not_modified": 0}
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, url: str) -> dict[str, Any] | None:
+        path = self._path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, url: str, body: Any, headers: dict[str, str]) -> None:
+        record = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "body": body,
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def conditional_headers(self, record: dict[str, Any] | None) -> dict[str, str]:
+        """キャッシュ済みの検証子から If-None-Match / If-Modified-Since を作る"""
+        headers: dict[str, str] = {}
+        if not record:
+            return headers
+        if record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        if record.get("last_modified"):
+            headers["If-Modified-Since"] = record["last_modified"]
+        return headers
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
@@ -0,0 +1,124 @@
+# hybrid_search.py
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index, LexicalHit
+from metadata_index import MetadataIndex
+
+# vector  : 従来どおりベクトル検索だけ
+# lexical : BM25 だけ（埋め込みを呼ばない）
+# hybrid  : BM25 とベクトル検索の順位を RRF で混ぜる
+# route   : 字句検索で確信が持てればそのまま返し、だめなら hybrid（BM25 だけで答えることがあるので、明示したときだけ）
+MODES = ("vector", "lexical", "hybrid", "route")
+DEFAULT_MODE = "hybrid"
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    複数の順位リストを Reciprocal Rank Fusion（sum w / (k + 順位)）で1つにまとめる。
+    スコアの尺度がそろっていない BM25 とコサイン類似度でも、順位だけで混ぜられる。
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    # 同点なら先に渡した順位リストで上にあったものを優先する（sorted は安定）
+    return sorted(fused.items(), key=lambda x: -x[1])
+
+
+@dataclass
+class SearchInfo:
+    """1回の検索がどう処理されたか"""
+
+    mode: str
+    route: str  # 実際に使った経路（vector / lexical / hybrid）
+    embedded: bool  # クエリの埋め込みを呼んだか
+    elapsed: float
+
+    def format(self) -> str:
+        embedded = "埋め込みあり" if self.embedded else "埋め込みなし"
+        return f"（{self.route} / {embedded} / {self.elapsed * 1000:.1f} ミリ秒）"
+
+
+class HybridRetriever:
+    """
+    BM25（bm25_index.BM25Index）とベクトルストアを組み合わせた検索。
+
+    - filter は Chroma と同じ where 形式。BM25 側は MetadataIndex で同じ条件に絞る
+    - route モードでは、クエリの n-gram をほぼ全部含む文書が1件だけ抜けて
+      高いスコアのとき（名前や説明文そのままの検索）に、埋め込みを呼ばずに答える
+    """
+
+    def __init__(
+        self,
+        db,
+        bm25: BM25Index,
+        meta_index: Optional[MetadataIndex] = None,
+        rrf_k: int = 60,
+        candidates: int = 20,
+        min_coverage: float = 0.9,
+        min_margin: float = 1.5,
+    ) -> None:
+        self.db = db
+        self.bm25 = bm25
+        self.meta_index = meta_index
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.min_coverage = min_coverage
+        self.min_margin = min_margin
+
+    def _allowed(self, filter: Optional[Dict[str, Any]]) -> Optional[set]:
+        if not filter:
+            return None
+        if self.meta_index is None:
+            raise ValueError("filter を使うには meta_index（MetadataIndex）が必要です")
+        return self.meta_index.match(filter)
+
+    def is_confident(self, hits: List[LexicalHit]) -> bool:
+        """字句検索の1位をそのまま答えにしてよいか"""
+        if not hits or hits[0].coverage < self.min_coverage:
+            return False
+        if len(hits) == 1 or hits[1].coverage < self.min_coverage:
+            # クエリを丸ごと含む文書が1件だけ
+            return True
+        return hits[0].score >= self.min_margin * hits[1].score
+
+    def _vector(self, query: str, k: int, filter: Optional[Dict[str, Any]]) -> List[Document]:
+        return self.db.similarity_search(query, k=k, filter=filter)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        mode: str = DEFAULT_MODE,
+    ) -> Tuple[List[Document], SearchInfo]:
+        if mode not in MODES:
+            raise ValueError(f"mode は {MODES} のどれかです: {mode}")
+        started = time.perf_counter()
+
+        def done(docs: List[Document], route: str, embedded: bool):
+            return docs, SearchInfo(mode, route, embedded, time.perf_counter() - started)
+
+        if mode == "vector":
+            return done(self._vector(query, k, filter), "vector", True)
+
+        hits = self.bm25.search(query, k=max(k, self.candidates), allowed=self._allowed(filter))
+        if mode == "lexical" or (mode == "route" and self.is_confident(hits)):
+            return done([self.bm25.document(h.doc_id) for h in hits[:k]], "lexical", False)
+
+        vector_docs = self._vector(query, max(k, self.candidates), filter)
+        by_id = {doc.id: doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion(
+            [[h.doc_id for h in hits], [doc.id for doc in vector_docs]], k=self.rrf_k
+        )
+        docs = [by_id.get(doc_id) or self.bm25.document(doc_id) for doc_id, _ in fused[:k]]
+        return done(docs, "hybrid", True)
@@ -0,0 +1,200 @@
+# ingest_pipeline.py
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from chroma_sync import HASH_KEY, SyncDoc, content_hash, upsert_vectors
+
+# (ID, テキスト, メタデータ) のバッチ
+Batch = List[Tuple[str, str, Dict[str, Any]]]
+
+
+def batched(docs: Iterable[SyncDoc], size: int) -> Iterator[List[SyncDoc]]:
+    """ジェネレータから size 件ずつ取り出す（全件をメモリに載せない）"""
+    it = iter(docs)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+@dataclass
+class Progress:
+    """処理件数とスループットの表示"""
+
+    interval: float = 1.0
+    read: int = 0
+    embedded: int = 0
+    skipped: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    last_print: float = 0.0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def line(self) -> str:
+        elapsed = max(self.elapsed(), 1e-9)
+        return (
+            f"読み込み {self.read} 件 / 埋め込み {self.embedded} 件 / "
+            f"変更なし {self.skipped} 件 "
+            f"（{self.read / elapsed:.0f} 行/秒, 埋め込み {self.embedded / elapsed:.0f} 件/秒）"
+        )
+
+    def report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if force or now - self.last_print >= self.interval:
+            self.last_print = now
+            print(f"\r{self.line()}", end="" if not force else "\n", flush=True)
+
+
+def filter_changed(db, batch: List[SyncDoc]) -> Tuple[Batch, int]:
+    """バッチ内で内容ハッシュが変わった行だけを残す（ID 指定で引くので全件は読まない）"""
+    ids = [doc_id for doc_id, _, _ in batch]
+    result = db.get(ids=ids, include=["metadatas"])
+    current = {
+        doc_id: (meta or {}).get(HASH_KEY)
+        for doc_id, meta in zip(result.get("ids", []), result.get("metadatas", []))
+    }
+
+    changed: Batch = []
+    for doc_id, text, metadata in batch:
+        digest = content_hash(text, metadata)
+        if current.get(doc_id) == digest:
+            continue
+        changed.append((doc_id, text, {**metadata, HASH_KEY: digest}))
+    return changed, len(batch) - len(changed)
+
+
+def embed_batch(embeddings: Embeddings, batch: Batch) -> Tuple[Batch, List[List[float]]]:
+    return batch, embeddings.embed_documents([text for _, text, _ in batch])
+
+
+def upsert_batch(db, batch: Batch, vectors: List[List[float]]) -> None:
+    """埋め込み済みのベクトルをそのまま Chroma に upsert する"""
+    upsert_vectors(
+        db,
+        [doc_id for doc_id, _, _ in batch],
+        [text for _, text, _ in batch],
+        [metadata for _, _, metadata in batch],
+        vectors,
+    )
+
+
+class IdSpool:
+    """
+    入力に出てきた ID を、ディスク上の一時 SQLite に貯めておく（行数が増えてもメモリは増えない）。
+    sqlite3.connect("") は、閉じると消える一時ファイルのデータベースになる。
+    """
+
+    def __init__(self) -> None:
+        self.conn = sqlite3.connect("")
+        self.conn.execute("CREATE TABLE seen (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE stale (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def add_many(self, ids: Iterable[str]) -> None:
+        self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((i,) for i in ids))
+
+    def mark_stale(self, ids: List[str]) -> None:
+        """ids のうち、入力に出てこなかったものを stale に入れる"""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS page (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("DELETE FROM page")
+        self.conn.executemany("INSERT OR IGNORE INTO page VALUES (?)", ((i,) for i in ids))
+        self.conn.execute(
+            "INSERT OR IGNORE INTO stale SELECT id FROM page WHERE id NOT IN (SELECT id FROM seen)"
+        )
+
+    def iter_stale(self, size: int) -> Iterator[List[str]]:
+        cursor = self.conn.execute("SELECT id FROM stale ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def delete_missing_ids(db, seen: IdSpool, page_size: int = 1000, index=None) -> int:
+    """
+    コレクションの ID を page_size 件ずつ読み、seen に無いものを削除する。
+    全 ID を一度に読まず、消す ID もいったん seen と同じ一時 SQLite に貯めてから、
+    読み終わった後でまとめて消す（読みながら消すと offset がずれる）。
+    """
+    offset = 0
+    while True:
+        page = db.get(include=[], limit=page_size, offset=offset).get("ids", [])
+        if not page:
+            break
+        seen.mark_stale(page)
+        offset += len(page)
+
+    deleted = 0
+    for stale in seen.iter_stale(page_size):
+        db.delete(ids=stale)
+        if index is not None:
+            index.remove_many(stale)
+        deleted += len(stale)
+    return deleted
+
+
+def run_pipeline(
+    docs: Iterable[SyncDoc],
+    db,
+    embeddings: Embeddings,
+    batch_size: int = 64,
+    max_in_flight: int = 4,
+    delete_missing: bool = True,
+    progress: Progress | None = None,
+    index=None,
+) -> Dict[str, int]:
+    """
+    CSV → テキスト → バッチ → 埋め込み（並列） → Chroma へ upsert を流れ作業で行う。
+
+    - 埋め込み中のバッチは最大 max_in_flight 個まで。それ以上は読み込みを待たせる
+      （読み込み側が先走らないので、ファイルの大きさに関係なくメモリは一定。
+      削除の判定に使う「出てきた ID」も、メモリではなく一時 SQLite（IdSpool）に貯める）
+    - 内容ハッシュが変わっていない行は埋め込まない
+    - delete_missing=True なら、最後に入力に無かった ID をページ単位で探して削除する
+    - index（MetadataIndex）を渡すと、upsert / 削除に合わせて索引も更新する
+    """
+    progress = progress or Progress()
+    in_flight: Deque[Future] = deque()
+
+    def drain_one() -> None:
+        batch, vectors = in_flight.popleft().result()
+        upsert_batch(db, batch, vectors)
+        if index is not None:
+            index.add_many([doc_id for doc_id, _, _ in batch], [meta for _, _, meta in batch])
+        progress.embedded += len(batch)
+        progress.report()
+
+    with closing(IdSpool()) as seen:
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            for batch in batched(docs, batch_size):
+                progress.read += len(batch)
+                seen.add_many(doc_id for doc_id, _, _ in batch)
+
+                changed, skipped = filter_changed(db, batch)
+                progress.skipped += skipped
+                if changed:
+                    while len(in_flight) >= max_in_flight:
+                        drain_one()
+                    in_flight.append(pool.submit(embed_batch, embeddings, changed))
+                progress.report()
+
+            while in_flight:
+                drain_one()
+
+        deleted = delete_missing_ids(db, seen, index=index) if delete_missing else 0
+
+    progress.report(force=True)
+    return {"upserted": progress.embedded, "unchanged": progress.skipped, "deleted": deleted}
@@ -0,0 +1,207 @@
+# llm_cache.py
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 7 * 24 * 60 * 60  # 1週間
+
+# キャッシュキーに含める生成パラメータ（値が変われば別の応答として扱う）
+_PARAM_NAMES = ("temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty", "seed")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_enabled(argv: Optional[list] = None) -> bool:
+    """--no-cache 引数、または環境変数 LLM_CACHE=0 でキャッシュを使わない"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--no-cache", action="store_true")
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.no_cache:
+        return False
+    return os.getenv("LLM_CACHE", "1") != "0"
+
+
+def entry_fingerprint(entry: Dict[str, Any]) -> str:
+    """図鑑エントリの内容ハッシュ（pokemon_data.json が書き換わったら変わる）"""
+    return _sha256(json.dumps(entry, ensure_ascii=False, sort_keys=True))
+
+
+def entry_key(entry: Dict[str, Any], namespace: str = "pokemon") -> str:
+    """応答と図鑑エントリを結びつけるキー。namespace はデータの出どころごとに分ける"""
+    return f"{namespace}:{entry.get('id')}"
+
+
+def describe_chain(chain, inputs: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    prompt | model のチェーンから (モデル名, 展開後のプロンプト, 生成パラメータ) を取り出す。
+    プロンプトだけを手元で展開するので、LLM は呼ばない。
+    """
+    prompt, model = chain.first, chain.last
+    prompt_text = prompt.invoke(inputs).to_string()
+    model_name = getattr(model, "model_name", None) or getattr(model, "model", "") or type(model).__name__
+    params = {
+        name: getattr(model, name) for name in _PARAM_NAMES if getattr(model, name, None) is not None
+    }
+    return model_name, prompt_text, params
+
+
+class LLMResponseCache:
+    """
+    LLM の応答をディスク（SQLite）に保存するキャッシュ。
+
+    - キーは (モデル名, 展開後プロンプトの sha256, 生成パラメータ)
+    - ttl 秒より古い応答は使わない / max_entries を超えたら最後に使われたのが古い順に削除
+    - entry_key / entry_hash を一緒に保存し、図鑑エントリが変わったら古い応答を消す
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: Optional[float] = DEFAULT_TTL,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                params TEXT NOT NULL,
+                entry_key TEXT,
+                entry_hash TEXT,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_entry ON responses (entry_key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+        return _sha256(
+            json.dumps([model, _sha256(prompt), params], ensure_ascii=False, sort_keys=True)
+        )
+
+    def lookup(
+        self,
+        model: str,
+        prompt: str,
+        params: Dict[str, Any],
+        entry_hash: Optional[str] = None,
+    ) -> Optional[str]:
+        key = self.make_key(model, prompt, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created, entry_hash FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            usable = (
+                row is not None
+                and (self.ttl is None or now - row[1] <= self.ttl)
+                and (entry_hash is None or row[2] == entry_hash)
+            )
+            if not usable:
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def store(
+        self,
+        model: str,
+        prompt: str,
+        params: Dict[str, Any],
+        response: str,
+        entry_key: Optional[str] = None,
+        entry_hash: Optional[str] = None,
+    ) -> None:
+        key = self.make_key(model, prompt, params)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, prompt_hash, params, entry_key, entry_hash, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    model,
+                    _sha256(prompt),
+                    json.dumps(params, sort_keys=True),
+                    entry_key,
+                    entry_hash,
+                    response,
+                    now,
+                    now,
+                ),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def invalidate_entries(self, current: Dict[str, str], namespace: str) -> int:
+        """
+        entry_key → 現在の内容ハッシュ を受け取り、内容が変わった（または消えた）
+        エントリの応答を削除する。削除した件数を返す。
+
+        見るのは entry_key が "<namespace>:" で始まる行だけ。別のデータから作った
+        応答（current に載っていない名前空間）は消さない。
+        """
+        prefix = f"{namespace}:"
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, entry_key, entry_hash FROM responses "
+                "WHERE substr(entry_key, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+            stale = [(key,) for key, ek, eh in rows if current.get(ek) != eh]
+            if stale:
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                self.conn.commit()
+        return len(stale)
+
+    def invalidate_pokemon_data(
+        self, entries: Iterable[Dict[str, Any]], namespace: str = "pokemon"
+    ) -> int:
+        current = {entry_key(e, namespace): entry_fingerprint(e) for e in entries}
+        return self.invalidate_entries(current, namespace)
+
+    def format_stats(self) -> str:
+        return f"LLM キャッシュ: ヒット {self.hits} / ミス {self.misses}"
@@ -1,47 +1,56 @@
 # main.py
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate  # ← ここを修正
-import os
-
-# ① .env の読み込み
-load_dotenv()
-
-# ② OpenRouter 用の ChatOpenAI モデル設定
-# OpenAI互換APIなので base_url を変更するだけでOK
-model = ChatOpenAI(
-    model="anthropic/claude-3.5-sonnet",  # OpenRouter経由で利用するモデル
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",  # ←超重要
-)
+
+import openrouter_clients
+from runtime import Lazy, first_prompt, lazy_import, load_env
+from stream_output import print_response, streaming_enabled
+
+# ① langchain_core.prompts は langsmith まで読み込んで重いので、最初の質問でチェーンを作るときまで
+#    import しない（ChatOpenAI も openrouter_clients が使うときに import する）
+prompts = lazy_import("langchain_core.prompts")
+
+# ② OpenRouter経由で利用するモデル
+MODEL_NAME = "anthropic/claude-3.5-sonnet"
 
 # ③ プロンプトテンプレート定義
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "あなたは優秀な日本語アシスタントです。わかりやすく説明してください。"),
-        ("human", "{question}"),
-    ]
+prompt = Lazy(
+    lambda: prompts.ChatPromptTemplate.from_messages(
+        [
+            ("system", "あなたは優秀な日本語アシスタントです。わかりやすく説明してください。"),
+            ("human", "{question}"),
+        ]
+    ),
+    "prompt",
 )
 
+
 # ④ Prompt → Model のパイプライン（Chain）
-chain = prompt | model
+def build_chain(model=None):
+    """model を渡せばそれを使う（常駐サービスやテストで差し替える用）"""
+    if model is None:
+        # OpenRouter 用の ChatOpenAI（キー・base_url・接続プールは openrouter_clients でまとめて扱う）
+        model = openrouter_clients.chat_model(MODEL_NAME)
+    return prompt.get() | model
 
 
 def main():
+    load_env()  # STREAM_OUTPUT などの設定も .env から読めるように
+    # チェーンは最初の質問が来たときに作る（プロンプトをすぐ出すため）
+    chain = Lazy(build_chain, "chain")
+    # --no-stream を付けると、応答が全部そろってから表示する従来の動き
+    stream = streaming_enabled()
+
     print("=== OpenRouter × LangChain チャット ===")
     print("質問を入力してください（空でEnter → 終了）")
 
+    first_prompt()
     while True:
         question = input("\nあなた > ").strip()
         if not question:
             print("終了します。")
             break
 
-        # ⑤ チェーン実行
-        res = chain.invoke({"question": question})
-
-        # ChatMessage形式なので .content を参照
-        print("\nAI > " + res.content)
+        # ⑤ チェーン実行（届いたトークンから順に表示）
+        print_response(chain.get(), {"question": question}, "\nAI > ", stream=stream)
 
 
 if __name__ == "__main__":
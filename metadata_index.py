@@ -0,0 +1,141 @@
+# metadata_index.py
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+# 1ページで取り出す件数の既定値
+DEFAULT_PAGE_SIZE = 20
+
+
+class MetadataIndex:
+    """
+    メタデータの転置インデックス（キー → 値 → ID の集合）。
+
+    - ロード時に1回だけ作り、upsert / delete のたびに add / remove で追従させる
+    - Chroma と同じ形式の where（$and / $or / $eq / $in）を集合演算で解く
+    - 結果は ID だけを返すので、本体はページ単位で必要な分だけ取り出せる
+    """
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields = tuple(fields)
+        self.postings: Dict[str, Dict[Any, Set[str]]] = {f: {} for f in self.fields}
+        # ID ごとに「いま索引に入っている値」と登録順を覚えておく（更新・削除用）
+        self.values: Dict[str, Dict[str, Any]] = {}
+        self.order: Dict[str, int] = {}
+        self._next_order = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    # --------------------------
+    # 追加・削除
+    # --------------------------
+    def add(self, doc_id: str, metadata: Dict[str, Any]) -> None:
+        if doc_id in self.values:
+            # 上書きでは登録順を保つ（ストア側も位置を変えずに置き換える）
+            position = self.order[doc_id]
+            self.remove(doc_id)
+            self.order[doc_id] = position
+
+        indexed = {f: metadata[f] for f in self.fields if f in metadata}
+        for field, value in indexed.items():
+            self.postings[field].setdefault(value, set()).add(doc_id)
+
+        self.values[doc_id] = indexed
+        if doc_id not in self.order:
+            self.order[doc_id] = self._next_order
+            self._next_order += 1
+
+    def add_many(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        for doc_id, metadata in zip(ids, metadatas):
+            self.add(doc_id, metadata or {})
+
+    def remove(self, doc_id: str) -> None:
+        indexed = self.values.pop(doc_id, None)
+        if indexed is None:
+            return
+        for field, value in indexed.items():
+            ids = self.postings[field].get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[field][value]
+        self.order.pop(doc_id, None)
+
+    def remove_many(self, ids: Sequence[str]) -> None:
+        for doc_id in ids:
+            self.remove(doc_id)
+
+    @classmethod
+    def from_store(
+        cls, db, fields: Sequence[str], page_size: int = 1000
+    ) -> "MetadataIndex":
+        """Chroma / NumpyVectorStore からページ単位でメタデータを読んで索引を作る"""
+        index = cls(fields)
+        offset = 0
+        while True:
+            result = db.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = result.get("ids", [])
+            if not ids:
+                break
+            index.add_many(ids, result.get("metadatas", []))
+            offset += len(ids)
+        return index
+
+    # --------------------------
+    # 検索
+    # --------------------------
+    def match(self, where: Optional[Dict[str, Any]]) -> Set[str]:
+        """where を満たす ID の集合（where が空なら全件）"""
+        if not where:
+            return set(self.values)
+
+        result: Optional[Set[str]] = None
+
+        def intersect(ids: Set[str]) -> None:
+            nonlocal result
+            result = set(ids) if result is None else result & ids
+
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    intersect(self.match(sub))
+            elif key == "$or":
+                union: Set[str] = set()
+                for sub in cond:
+                    union |= self.match(sub)
+                intersect(union)
+            else:
+                if key not in self.postings:
+                    raise KeyError(f"{key} は索引に含まれていません（対象: {self.fields}）")
+                if isinstance(cond, dict):
+                    if "$eq" in cond:
+                        values = [cond["$eq"]]
+                    elif "$in" in cond:
+                        values = list(cond["$in"])
+                    else:
+                        raise ValueError(f"未対応の演算子です: {cond}")
+                else:
+                    values = [cond]
+                union = set()
+                for value in values:
+                    union |= self.postings[key].get(value, set())
+                intersect(union)
+
+        return result if result is not None else set()
+
+    def query(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        """where を満たす ID を登録順に並べて返す"""
+        return sorted(self.match(where), key=self.order.__getitem__)
+
+    def iter_pages(
+        self,
+        db,
+        where: Optional[Dict[str, Any]],
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """条件に合う (ID, メタデータ) を page_size 件ずつ、必要になった分だけ取り出す"""
+        ids = self.query(where)
+        for start in range(0, len(ids), page_size):
+            page_ids = ids[start : start + page_size]
+            result = db.get(ids=page_ids, include=["metadatas"])
+            by_id = dict(zip(result.get("ids", []), result.get("metadatas", [])))
+            yield [(doc_id, by_id[doc_id]) for doc_id in page_ids if doc_id in by_id]
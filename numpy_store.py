@@ -0,0 +1,423 @@
+# numpy_store.py
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+import vector_file
+from chroma_sync import collection_fingerprint
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def cosine_to_distance(similarity: float) -> float:
+    """
+    コサイン類似度 → Chroma の既定の距離（二乗ユークリッド距離）。
+    埋め込みはどのバックエンドも長さ 1 なので |a - b|^2 = 2 - 2cos になる
+    """
+    return max(0.0, 2.0 - 2.0 * float(similarity))
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    プロセス内で完結する、NumPy だけの厳密ベクトル検索ストア。
+
+    - 正規化済みベクトルを連続した float32 行列 (件数, 次元数) で持つ
+    - Top-k は「行列 × クエリベクトル」1回 + argpartition
+    - 複数クエリはまとめて行列積で計算する
+    - メタデータの等値フィルタ（type1 / type2 など）は、値ごとの bool マスクを前計算しておく
+    - similarity_search(query, k, filter) / get(where=...) は Chroma と同じ呼び方で使える
+    - *_with_score のスコアは Chroma の既定（hnsw:space=l2）と同じく、二乗ユークリッド距離
+      （正規化済みなので 2 - 2 × コサイン類似度、小さいほど近い）。
+      しきい値や並べ替えはバックエンドを切り替えてもそのまま使える
+    """
+
+    def __init__(self, embedding: Embeddings, dimensions: Optional[int] = None) -> None:
+        self._embedding = embedding
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, dimensions or 0), dtype=np.float32)
+        self._positions: Dict[str, int] = {}
+        self._masks: Optional[Dict[str, Dict[Any, np.ndarray]]] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --------------------------
+    # 追加・削除
+    # --------------------------
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        vectors: Any,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """埋め込み済みのベクトルを追加する（同じ ID があれば上書き = upsert）"""
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(len(self.ids) + i) for i in range(len(texts))]
+
+        new_rows: List[int] = []
+        for i, doc_id in enumerate(ids):
+            pos = self._positions.get(doc_id)
+            if pos is None:
+                new_rows.append(i)
+                continue
+            self.texts[pos] = texts[i]
+            self.metadatas[pos] = metadatas[i]
+            self.matrix[pos] = vectors[i]
+
+        if new_rows:
+            if self.matrix.shape[0] == 0:
+                self.matrix = np.ascontiguousarray(vectors[new_rows])
+            else:
+                self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vectors[new_rows]]))
+            for i in new_rows:
+                self._positions[ids[i]] = len(self.ids)
+                self.ids.append(ids[i])
+                self.texts.append(texts[i])
+                self.metadatas.append(metadatas[i])
+
+        self._masks = None
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = {self._positions[i] for i in ids if i in self._positions}
+        if not drop:
+            return False
+
+        keep = [pos for pos in range(len(self.ids)) if pos not in drop]
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+        self.ids = [self.ids[p] for p in keep]
+        self.texts = [self.texts[p] for p in keep]
+        self.metadatas = [self.metadatas[p] for p in keep]
+        self._positions = {doc_id: pos for pos, doc_id in enumerate(self.ids)}
+        self._masks = None
+        return True
+
+    # --------------------------
+    # メタデータフィルタ（bool マスク）
+    # --------------------------
+    def _build_masks(self) -> Dict[str, Dict[Any, np.ndarray]]:
+        """キー → 値 → その値を持つ行の bool マスク を作っておく"""
+        if self._masks is not None:
+            return self._masks
+
+        n = len(self.ids)
+        positions: Dict[str, Dict[Any, List[int]]] = {}
+        for pos, meta in enumerate(self.metadatas):
+            for key, value in meta.items():
+                positions.setdefault(key, {}).setdefault(value, []).append(pos)
+
+        masks: Dict[str, Dict[Any, np.ndarray]] = {}
+        for key, values in positions.items():
+            masks[key] = {}
+            for value, rows in values.items():
+                mask = np.zeros(n, dtype=bool)
+                mask[rows] = True
+                masks[key][value] = mask
+        self._masks = masks
+        return masks
+
+    def filter_mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Chroma 形式の where から bool マスクを作る。
+        {"type1": "fire"} / {"type1": {"$eq": "fire"}} / {"$and": [...]} / {"$or": [...]} に対応。
+        キーを複数並べた場合は AND とみなす。
+        """
+        if not where:
+            return None
+
+        masks = self._build_masks()
+        n = len(self.ids)
+
+        def eq(key: str, value: Any) -> np.ndarray:
+            mask = masks.get(key, {}).get(value)
+            return mask if mask is not None else np.zeros(n, dtype=bool)
+
+        result = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            # 空の条件（{}）は「絞り込まない」= 全行にマッチする
+            if key == "$and":
+                for sub in cond:
+                    sub_mask = self.filter_mask(sub)
+                    if sub_mask is not None:
+                        result &= sub_mask
+            elif key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for sub in cond:
+                    sub_mask = self.filter_mask(sub)
+                    if sub_mask is None:
+                        any_mask[:] = True
+                        break
+                    any_mask |= sub_mask
+                result &= any_mask
+            elif isinstance(cond, dict):
+                if "$eq" in cond:
+                    result &= eq(key, cond["$eq"])
+                elif "$in" in cond:
+                    any_mask = np.zeros(n, dtype=bool)
+                    for value in cond["$in"]:
+                        any_mask |= eq(key, value)
+                    result &= any_mask
+                else:
+                    raise ValueError(f"未対応の演算子です: {cond}")
+            else:
+                result &= eq(key, cond)
+        return result
+
+    # --------------------------
+    # 検索
+    # --------------------------
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """スコアの大きい順に k 件の位置を返す（-inf は除外）"""
+        valid = np.count_nonzero(scores > -np.inf)
+        k = min(k, valid)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """similarity_search_with_relevance_scores 用（距離 → 関連度。Chroma の l2 と同じ式）"""
+        return self._euclidean_relevance_score_fn
+
+    def _to_document(self, pos: int) -> Document:
+        return Document(
+            id=self.ids[pos], page_content=self.texts[pos], metadata=self.metadatas[pos]
+        )
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """距離（二乗ユークリッド距離、小さいほど近い）付きで、近い順に返す"""
+        if len(self.ids) == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        scores = self.matrix @ query
+        mask = self.filter_mask(filter)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+
+        return [(self._to_document(pos), cosine_to_distance(scores[pos])) for pos in self._top_k(scores, k)]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self._embedding.embed_query(query), k, filter
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def batch_similarity_search_by_vector(
+        self,
+        embeddings: Sequence[List[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """複数クエリを (件数, 次元) × (次元, クエリ数) の行列積1回で検索する"""
+        if len(self.ids) == 0:
+            return [[] for _ in embeddings]
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        scores = self.matrix @ queries.T
+
+        mask = self.filter_mask(filter)
+        if mask is not None:
+            scores[~mask, :] = -np.inf
+
+        return [
+            [(self._to_document(pos), cosine_to_distance(scores[pos, j])) for pos in self._top_k(scores[:, j], k)]
+            for j in range(queries.shape[0])
+        ]
+
+    def batch_similarity_search(
+        self,
+        queries: Sequence[str],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Document]]:
+        vectors = [self._embedding.embed_query(q) for q in queries]
+        return [
+            [doc for doc, _ in hits]
+            for hits in self.batch_similarity_search_by_vector(vectors, k, filter)
+        ]
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """Chroma の get と同じ形（ids / documents / metadatas）で返す"""
+        mask = self.filter_mask(where)
+        if ids is not None:
+            positions = [self._positions[i] for i in ids if i in self._positions]
+            if mask is not None:
+                positions = [p for p in positions if mask[p]]
+        elif mask is not None:
+            positions = np.flatnonzero(mask).tolist()
+        else:
+            positions = list(range(len(self.ids)))
+
+        start = offset or 0
+        positions = positions[start : start + limit] if limit is not None else positions[start:]
+
+        include = include if include is not None else ["documents", "metadatas"]
+        result: Dict[str, Any] = {"ids": [self.ids[p] for p in positions]}
+        result["documents"] = [self.texts[p] for p in positions] if "documents" in include else None
+        result["metadatas"] = [self.metadatas[p] for p in positions] if "metadatas" in include else None
+        if "embeddings" in include:
+            result["embeddings"] = self.matrix[positions]
+        return result
+
+    # --------------------------
+    # 作成・保存・読み込み
+    # --------------------------
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_chroma(cls, chroma, embedding: Embeddings) -> "NumpyVectorStore":
+        """既存の Chroma コレクションからベクトルごと取り出す（埋め込み直しはしない）"""
+        result = chroma.get(include=["embeddings", "documents", "metadatas"])
+        store = cls(embedding)
+        if len(result["ids"]):
+            store.add_embeddings(
+                result["documents"], result["embeddings"], result["metadatas"], result["ids"]
+            )
+        return store
+
+    def save(self, stem: str, model: str = "", extra: Optional[Dict[str, Any]] = None) -> None:
+        vector_file.save_vectors(
+            stem, self.matrix, self.texts, self.metadatas, ids=self.ids, model=model,
+            extra={"normalized": True, **(extra or {})},
+        )
+
+    @classmethod
+    def load(cls, stem: str, embedding: Embeddings) -> "NumpyVectorStore":
+        vf = vector_file.load_vectors(stem, mmap=False)
+        store = cls(embedding)
+        store.matrix = _normalize_rows(np.ascontiguousarray(vf.vectors, dtype=np.float32))
+        store.ids = vf.ids
+        store.texts = vf.texts
+        store.metadatas = vf.metadatas
+        store._positions = {doc_id: pos for pos, doc_id in enumerate(store.ids)}
+        return store
+
+
+# --------------------------
+# Chroma から書き出したスナップショット
+# --------------------------
+def chroma_files_stat(persist_dir: str) -> List[List[Any]]:
+    """Chroma の SQLite ファイル（WAL も含む）の (名前, 更新時刻, サイズ)。変わっていなければ中身も同じ"""
+    if not os.path.isdir(persist_dir):
+        return []
+    stats = []
+    for name in sorted(os.listdir(persist_dir)):
+        if name.startswith("chroma.sqlite3"):
+            st = os.stat(os.path.join(persist_dir, name))
+            stats.append([name, st.st_mtime_ns, st.st_size])
+    return stats
+
+
+def export_snapshot(
+    chroma, embedding: Embeddings, stem: str, persist_dir: str, model: str = ""
+) -> NumpyVectorStore:
+    """
+    Chroma のコレクションを stem に書き出す。
+    書き出し元の指紋（collection_fingerprint）と SQLite ファイルの状態もヘッダに残しておき、
+    snapshot_is_current で古くなっていないか確かめられるようにする
+    """
+    store = NumpyVectorStore.from_chroma(chroma, embedding)
+    store.save(stem, model=model, extra={"source_fingerprint": collection_fingerprint(chroma)})
+    vector_file.update_header(stem, {"source_stat": chroma_files_stat(persist_dir)})
+    return store
+
+
+def snapshot_is_current(stem: str, persist_dir: str, open_chroma: Callable[[], Any]) -> bool:
+    """
+    stem のスナップショットが、いまの Chroma のコレクションと同じ中身かどうか。
+
+    - SQLite ファイルが書き出したときのままなら、Chroma は開かずに「同じ」とみなす
+    - 変わっていれば Chroma を開いて指紋を比べる（別のコレクションへの書き込みなら同じまま）。
+      同じなら、次回は開かずに済むよう SQLite ファイルの状態を記録し直す
+    """
+    if not vector_file.exists(stem):
+        return False
+    header = vector_file.read_header(stem)
+    stat = chroma_files_stat(persist_dir)
+    if header.get("source_stat") == stat:
+        return True
+    if header.get("source_fingerprint") != collection_fingerprint(open_chroma()):
+        return False
+    vector_file.update_header(stem, {"source_stat": chroma_files_stat(persist_dir)})
+    return True
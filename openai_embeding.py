@@ -1,14 +1,7 @@
-import json
-import os
-from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-
-# .env 読み込み
-load_dotenv()
-
-api_key = os.getenv("OPENROUTER_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENROUTER_API_KEY が設定されていません。")
+import openrouter_clients
+from embedding_cache import CachedEmbeddings
+from quantized_vectors import format_sizes, quantize_file
+from vector_file import save_vectors
 
 # テキスト一覧（わかりやすいカテゴリ）
 texts = [
@@ -20,18 +13,17 @@ texts = [
     "バスは公共の乗り物です",
 ]
 
-# OpenRouter 経由で OpenAI Embedding を使用
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",  # ここが重要！
-)
+# OpenRouter 経由で OpenAI Embedding を使用（.env の読み込みとキーの確認もここで行われる）
+emb = CachedEmbeddings(openrouter_clients.embeddings("text-embedding-3-small"))
 
 # ベクトル生成
 vectors = emb.embed_documents(texts)
 
-# embeddings.json に保存
-with open("embeddings.json", "w", encoding="utf-8") as f:
-    json.dump({"texts": texts, "vectors": vectors}, f, ensure_ascii=False, indent=2)
+# embeddings.npy（float32 行列）+ ヘッダ + テキストに保存
+save_vectors("embeddings", vectors, texts, model="text-embedding-3-small")
+
+print("embeddings.npy を保存しました！")
 
-print("embeddings.json を保存しました！")
\ No newline at end of file
+# int8 / 符号ビットのコード（embeddings.q8.npy / embeddings.bits.npy）も作っておく
+print(f"量子化しました: {format_sizes(quantize_file('embeddings'))}")
+print(emb.format_stats())
\ No newline at end of file
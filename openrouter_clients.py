@@ -0,0 +1,182 @@
+# openrouter_clients.py
+"""
+OpenRouter 用の ChatOpenAI / OpenAIEmbeddings を1か所で作って使い回す。
+
+    from openrouter_clients import chat_model, embeddings
+    llm = chat_model("anthropic/claude-3.5-sonnet", temperature=0)
+    emb = embeddings("text-embedding-3-small")
+
+- API キーの確認と base_url はここだけで扱う
+- 同じ (種類, モデル, パラメータ) なら、同じクライアントを返す
+- すべてのクライアントが1つの keep-alive な HTTP 接続プール（httpx）を共有する。
+  非同期（ainvoke など）用のプールも1つだけ持つ
+- h2 パッケージが入っていれば HTTP/2 を使う（1本の接続に複数リクエストを多重化できる）
+
+接続プールの設定（環境変数、または configure_pool()）:
+    OPENROUTER_POOL_SIZE        同時に持つ接続の上限（既定 20）
+    OPENROUTER_KEEPALIVE        使い終わっても開いたままにしておく接続数（既定 = プールサイズ）
+    OPENROUTER_KEEPALIVE_EXPIRY 空いた接続を閉じるまでの秒数（既定 30）
+    OPENROUTER_CONNECT_TIMEOUT  接続のタイムアウト秒数（既定 5）
+    OPENROUTER_READ_TIMEOUT     応答のタイムアウト秒数（既定 60）
+    OPENROUTER_HTTP2            0 なら HTTP/2 を使わない（既定 1）
+"""
+import importlib.util
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from runtime import lazy_import, load_env
+
+httpx = lazy_import("httpx")
+langchain_openai = lazy_import("langchain_openai")
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 20
+    max_keepalive: Optional[int] = None  # None ならプールサイズと同じ
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    http2: bool = True  # h2 が入っていなければ自動で HTTP/1.1 になる
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        keepalive = os.getenv("OPENROUTER_KEEPALIVE")
+        return cls(
+            max_connections=int(os.getenv("OPENROUTER_POOL_SIZE", "20")),
+            max_keepalive=int(keepalive) if keepalive else None,
+            keepalive_expiry=float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "30")),
+            connect_timeout=float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("OPENROUTER_READ_TIMEOUT", "60")),
+            http2=os.getenv("OPENROUTER_HTTP2", "1") != "0",
+        )
+
+    @property
+    def use_http2(self) -> bool:
+        return self.http2 and http2_available()
+
+    def timeout(self):
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def limits(self):
+        keepalive = self.max_connections if self.max_keepalive is None else self.max_keepalive
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def describe(self) -> str:
+        protocol = "HTTP/2" if self.use_http2 else "HTTP/1.1"
+        return (
+            f"{protocol}, 接続 {self.max_connections}, keep-alive {self.limits().max_keepalive_connections}"
+            f"（{self.keepalive_expiry:g} 秒）, タイムアウト 接続 {self.connect_timeout:g} 秒 / "
+            f"応答 {self.read_timeout:g} 秒"
+        )
+
+
+_lock = threading.Lock()
+_config: Optional[PoolConfig] = None
+_http_client = None
+_async_http_client = None
+_clients: Dict[Tuple[str, str, str], Any] = {}
+
+
+def pool_config() -> PoolConfig:
+    global _config
+    if _config is None:
+        load_env()
+        _config = PoolConfig.from_env()
+    return _config
+
+
+def configure_pool(config: PoolConfig) -> None:
+    """
+    接続プールの設定を変える。作り済みのクライアントとプールは捨てて、
+    次に chat_model() / embeddings() を呼んだときに新しい設定で作り直す
+    """
+    global _config
+    close()
+    with _lock:
+        _config = config
+
+
+def api_key() -> str:
+    load_env()
+    key = os.getenv("OPENROUTER_API_KEY")
+    if not key:
+        raise RuntimeError("OPENROUTER_API_KEY が設定されていません")
+    return key
+
+
+def _shared_http_clients():
+    """共有の httpx クライアント（同期 / 非同期）。_lock を持った状態で呼ぶ"""
+    global _http_client, _async_http_client
+    if _http_client is None:
+        config = pool_config()
+        options = dict(timeout=config.timeout(), limits=config.limits(), http2=config.use_http2)
+        _http_client = httpx.Client(**options)
+        # 非同期クライアントは最初に使ったイベントループの上で接続を持つ
+        _async_http_client = httpx.AsyncClient(**options)
+    return _http_client, _async_http_client
+
+
+def _cache_key(kind: str, model: str, params: Dict[str, Any]) -> Tuple[str, str, str]:
+    return kind, model, json.dumps(params, sort_keys=True, default=repr)
+
+
+def _get_or_create(kind: str, model: str, params: Dict[str, Any], factory) -> Any:
+    key = _cache_key(kind, model, params)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client, async_http_client = _shared_http_clients()
+            client = factory(
+                model=model,
+                openai_api_key=api_key(),
+                base_url=OPENROUTER_BASE_URL,
+                http_client=http_client,
+                http_async_client=async_http_client,
+                request_timeout=pool_config().timeout(),
+                **params,
+            )
+            _clients[key] = client
+    return client
+
+
+def chat_model(model: str, **params: Any):
+    """OpenRouter 経由の ChatOpenAI（temperature などは params で渡す）"""
+    return _get_or_create("chat", model, params, langchain_openai.ChatOpenAI)
+
+
+def embeddings(model: str = DEFAULT_EMBEDDING_MODEL, **params: Any):
+    """OpenRouter 経由の OpenAIEmbeddings（dimensions などは params で渡す）"""
+    return _get_or_create("embeddings", model, params, langchain_openai.OpenAIEmbeddings)
+
+
+def client_count() -> int:
+    return len(_clients)
+
+
+def close() -> None:
+    """作り済みのクライアントを捨てて、共有の接続を閉じる（非同期側はガベージコレクションに任せる）"""
+    global _http_client, _async_http_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _async_http_client = None
+        _clients.clear()
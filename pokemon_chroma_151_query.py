@@ -1,33 +1,98 @@
 # pokemon_search_pokemon_151.py
 import os
-from dotenv import load_dotenv
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+import vector_file
+from bm25_index import BM25Index
+from embedding_cache import QueryEmbeddingLRU
+from hybrid_search import DEFAULT_MODE, MODES, HybridRetriever
+from metadata_index import MetadataIndex
+from numpy_store import NumpyVectorStore, export_snapshot, snapshot_is_current
+from pokemon_chroma_store_151 import resolve_query_collection
+from quantized_vectors import QuantizedVectorStore
+from runtime import Lazy, first_prompt, lazy_import, load_env
+
+# langchain_chroma は重いので、Chroma を開くときまで import しない
+langchain_chroma = lazy_import("langchain_chroma")
 
 # 1. .env 読み込み
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENROUTER_API_KEY が設定されていません")
-
-# 2. Embedding モデル
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",
-)
+load_env()
+
+# 2. Embedding モデル（EMBEDDING_BACKEND=openrouter（既定）/ local）
+#    local なら API キーなしで取り込み・検索できる（pokemon_chroma_store_151.py --embedding local で取り込む）
+# 同じ質問を繰り返したときは、メモリ上の LRU から埋め込みを返す
+# クライアントは初めて検索するときに作る（メニューをすぐ出すため）
+# EMBEDDING_DIM_MODE / EMBEDDING_DIMENSIONS を指定しなければ、取り込んだときに記録した値を使う
+# （pokemon_chroma_store_151.resolve_query_collection。query_service.py も同じ決め方）
+COLLECTION = resolve_query_collection()
+EMBEDDING_BACKEND = COLLECTION.backend
 
 # 3. 永続化された Chroma をロード
-PERSIST_DIR = "chroma_pokemon_151"
+PERSIST_DIR = COLLECTION.persist_dir
+COLLECTION_NAME = COLLECTION.name
+
+
+def build_query_embeddings() -> QueryEmbeddingLRU:
+    return QueryEmbeddingLRU(COLLECTION.build_embeddings(), max_size=256)
+
+
+emb = Lazy(build_query_embeddings, "embeddings")
+
+# VECTOR_BACKEND=numpy なら、Chroma の代わりにプロセス内の NumPy ストアで検索する
+# VECTOR_BACKEND=quantized なら、int8（QUANTIZED_MODE=binary なら符号ビット）で候補を絞り、
+#   ディスク上の float32 で付け直す（メモリに載せるのはコードだけ。減るのはメモリで、速くはならない）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+QUANTIZED_MODE = os.getenv("QUANTIZED_MODE", "int8")
+NUMPY_STEM = COLLECTION.numpy_stem
+
+
+def open_chroma():
+    return langchain_chroma.Chroma(
+        persist_directory=PERSIST_DIR,
+        collection_name=COLLECTION_NAME,
+        embedding_function=emb.get(),
+    )
 
-db = Chroma(
-    persist_directory=PERSIST_DIR,
-    collection_name="pokemon_151",
-    embedding_function=emb,
-)
 
-print("📁 Chroma ポケモン151 データベース読み込み完了")
+chroma = Lazy(open_chroma, "chroma")
+
+
+def open_store():
+    if VECTOR_BACKEND in ("numpy", "quantized"):
+        # .npy が Chroma と同じ中身なら Chroma は開かない（SQLite ファイルが変わっていなければ確認も一瞬）。
+        # 無いとき・取り込み後に古くなったときは、Chroma からベクトルごと書き出し直す（埋め込み直しはしない）
+        if not snapshot_is_current(NUMPY_STEM, PERSIST_DIR, chroma.get):
+            if vector_file.exists(NUMPY_STEM):
+                print(f"♻️ {NUMPY_STEM}.npy が Chroma より古いので書き出し直します")
+            export_snapshot(chroma.get(), emb.get(), NUMPY_STEM, PERSIST_DIR, model=emb.get().underlying.model)
+        if VECTOR_BACKEND == "quantized":
+            # 量子化コードが無い・書き出し直した .npy より古いときは、ここで作り直して保存する
+            store = QuantizedVectorStore.load(NUMPY_STEM, emb.get(), mode=QUANTIZED_MODE)
+            print(f"📁 量子化ポケモン151 データベース読み込み完了（{len(store)} 件, {QUANTIZED_MODE}）")
+        else:
+            store = NumpyVectorStore.load(NUMPY_STEM, emb.get())
+            print(f"📁 NumPy ポケモン151 データベース読み込み完了（{len(store)} 件）")
+    else:
+        store = chroma.get()
+        print("📁 Chroma ポケモン151 データベース読み込み完了")
+    return store
+
+
+db = Lazy(open_store, "vector store")
+
+# 一覧検索用のメタデータ索引（初めて使うときに1回だけ作る）
+INDEX_FIELDS = ("type1", "type2")
+meta_index = Lazy(lambda: MetadataIndex.from_store(db.get(), INDEX_FIELDS), "metadata index")
+
+# 名前・説明文の BM25 索引（初めて検索するときに1回だけ作る。埋め込みは呼ばない）
+# RETRIEVAL_MODE: hybrid（既定。BM25 とベクトル検索を RRF で混ぜる）/ vector / lexical / route
+#   route は指定したときだけ。名前や説明文そのままのクエリは埋め込みを呼ばずに BM25 だけで答える
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", DEFAULT_MODE)
+if RETRIEVAL_MODE not in MODES:
+    raise RuntimeError(f"RETRIEVAL_MODE は {MODES} のどれかを指定してください")
+retriever = Lazy(
+    lambda: HybridRetriever(db.get(), BM25Index.from_store(db.get()), meta_index.get()),
+    "retriever",
+)
 
 
 def semantic_search_with_filters() -> None:
@@ -49,25 +114,22 @@ def semantic_search_with_filters() -> None:
     type2 = input("type2 で絞り込み（空なら指定なし）> ").strip()
 
     filter_dict: dict | None = None
-    if type1 or type2:
-        filter_dict = {}
-        if type1:
-            filter_dict["type1"] = type1
-        if type2:
-            filter_dict["type2"] = type2
-
-    # filter_dict が None なら全体から意味検索、あればその条件内で意味検索
-    docs = db.similarity_search(
-        query,
-        k=5,
-        filter=filter_dict,
-    )
+    if type1 and type2:
+        # Chroma は複数キーの条件を $and でまとめる必要がある
+        filter_dict = {"$and": [{"type1": type1}, {"type2": type2}]}
+    elif type1:
+        filter_dict = {"type1": type1}
+    elif type2:
+        filter_dict = {"type2": type2}
+
+    # filter_dict が None なら全体から検索、あればその条件内で検索
+    docs, info = retriever.get().search(query, k=5, filter=filter_dict, mode=RETRIEVAL_MODE)
 
     if not docs:
         print("該当するポケモンが見つかりませんでした。")
         return
 
-    print("\n🔎 検索結果 Top5:")
+    print(f"\n🔎 検索結果 Top5: {info.format()}")
     for i, doc in enumerate(docs, start=1):
         meta = doc.metadata
         print(f"\n[{i}] #{meta['id']} {meta['name_jp']}（{meta['name_en']}）")
@@ -76,47 +138,93 @@ def semantic_search_with_filters() -> None:
         print(f"  内容: {doc.page_content[:80]}...")  # 説明長いので先頭だけ表示
 
 
-def metadata_only_search() -> None:
+def parse_conditions(text: str) -> dict | None:
+    """
+    「key=value」形式の条件を Chroma の where 形式に変換する。
+
+    - スペース区切りは AND（例: type1=fire type2=flying）
+    - | 区切りは OR（例: type1=fire | type1=water）
+    - type=fire は「type1 / type2 のどちらかが fire」
+    """
+    or_groups = []
+    for group in text.split("|"):
+        and_terms = []
+        for term in group.split():
+            key, sep, value = term.partition("=")
+            if not sep or not value:
+                raise ValueError(f"条件は key=value の形で入力してください: {term}")
+            if key == "type":
+                and_terms.append({"$or": [{"type1": value}, {"type2": value}]})
+            elif key in INDEX_FIELDS:
+                and_terms.append({key: value})
+            else:
+                raise ValueError(f"{key} は未対応です（type / type1 / type2）")
+        if and_terms:
+            or_groups.append(and_terms[0] if len(and_terms) == 1 else {"$and": and_terms})
+
+    if not or_groups:
+        return None
+    return or_groups[0] if len(or_groups) == 1 else {"$or": or_groups}
+
+
+def metadata_only_search(page_size: int = 20) -> None:
     """
     メタ情報だけでの絞り込み（おまけ）。
-    例: type1 = 'ground' のポケモン一覧を見たいだけ、など。
+    例: type1 = 'ground' のポケモン一覧、炎タイプ（type1 / type2 どちらでも）の一覧など。
+    起動時に作った索引で ID を絞り込み、表示するページの分だけ DB から取り出す。
     """
     print("\n=== メタ情報だけで検索（一覧用） ===")
     print("type1 / type2 は英語表記です（例: fire, water, ground, electric ...）")
-    key = input("どのキーで絞り込みますか？(type1 / type2) > ").strip()
-    value = input("値を入力してください > ").strip()
-
-    if key not in ("type1", "type2"):
-        print("type1 / type2 以外は未対応です。")
+    print("条件の書き方:")
+    print("  type1=ground              → type1 が ground")
+    print("  type=fire                 → type1 / type2 のどちらかが fire")
+    print("  type1=fire type2=flying   → AND（スペース区切り）")
+    print("  type1=fire | type1=water  → OR（| 区切り）")
+    text = input("条件を入力してください > ").strip()
+
+    try:
+        where = parse_conditions(text)
+    except ValueError as e:
+        print(e)
+        return
+    if where is None:
+        print("条件が空です。")
         return
 
-    result = db.get(where={key: value})
-    ids = result.get("ids", [])
-    metadatas = result.get("metadatas", [])
-
-    if not ids:
+    total = len(meta_index.get().match(where))
+    if total == 0:
         print("該当するポケモンがいませんでした。")
         return
 
-    print(f"\n🔎 {key} = {value} のポケモン: {len(ids)} 件")
-    for meta in metadatas:
-        print(
-            f"- #{meta['id']:>3} {meta['name_jp']}（{meta['name_en']}） "
-            f"[{meta['type1']}, {meta['type2']}]"
-        )
+    print(f"\n🔎 {text} のポケモン: {total} 件")
+    shown = 0
+    for page in meta_index.get().iter_pages(db.get(), where, page_size=page_size):
+        for _, meta in page:
+            print(
+                f"- #{meta['id']:>3} {meta['name_jp']}（{meta['name_en']}） "
+                f"[{meta['type1']}, {meta['type2']}]"
+            )
+        shown += len(page)
+        if shown < total:
+            more = input(f"（{shown}/{total} 件）Enter で続きを表示、q で終了 > ").strip()
+            if more.lower() == "q":
+                break
 
 
 def main() -> None:
+    first_prompt()
     while True:
         print("\n==============================")
         print("1: 意味検索 + メタ情報フィルタ")
-        print("2: メタ情報だけで一覧を出す（type1 / type2）")
+        print("2: メタ情報だけで一覧を出す（type1 / type2 の AND / OR）")
         print("Enter: 終了")
         print("==============================")
         choice = input("モードを選んでください > ").strip()
 
         if choice == "":
             print("終了します。")
+            if emb.ready:
+                print(emb.get().format_stats())
             break
         elif choice == "1":
             semantic_search_with_filters()
@@ -1,63 +1,233 @@
 # pokemon_chroma_store_151.py
+import argparse
 import csv
-import os
-from dotenv import load_dotenv
-
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma  # 新しい Chroma パッケージを使用
-
-# 1. .env 読み込み
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENROUTER_API_KEY が設定されていません")
-
-# 2. Embedding モデル（OpenRouter 経由の OpenAI Embedding）
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.embeddings import Embeddings
+
+import vector_file
+from chroma_sync import SyncDoc, format_sync_stats
+from dimension_reduction import (
+    DEFAULT_DIMENSIONS,
+    DIMENSION_MODES,
+    PCAProjection,
+    ProjectedEmbeddings,
+    default_dimensions,
+    dimension_mode,
+    dimension_suffix,
+    projection_path,
+    resolve_dimension_settings,
+    save_dimension_settings,
+    sync_projected,
 )
+from embedding_backends import BACKENDS, build_embeddings, collection_suffix, embedding_backend
+from ingest_pipeline import run_pipeline
+from numpy_store import export_snapshot
+from quantized_vectors import format_sizes, quantize_file
+from runtime import lazy_import, load_env
+
+# 新しい Chroma パッケージを使用（重いので、取り込みを始めるまで import しない。
+# iter_docs などだけを使うベンチマークやサービスは読み込まずに済む）
+langchain_chroma = lazy_import("langchain_chroma")
 
-# 3. CSV 読み込み
 CSV_PATH = "pokemon_151_with_image.csv"
-texts: list[str] = []
-metadatas: list[dict] = []
-
-with open(CSV_PATH, encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        # ベクトル化に使うテキスト（意味検索用）
-        text = (
-            f"{row['name_jp']}（{row['name_en']}）: "
-            f"タイプ={row['type1']} {row['type2']}。"
-            f"説明: {row['description']}"
+PERSIST_DIR = "chroma_pokemon_151"
+COLLECTION_NAME = "pokemon_151"
+NUMPY_STEM = "pokemon_151_vectors"
+
+
+def row_to_text(row: Dict[str, str]) -> str:
+    """ベクトル化に使うテキスト（意味検索用）"""
+    return (
+        f"{row['name_jp']}（{row['name_en']}）: "
+        f"タイプ={row['type1']} {row['type2']}。"
+        f"説明: {row['description']}"
+    )
+
+
+def row_to_metadata(row: Dict[str, str]) -> Dict[str, Any]:
+    """メタデータ（タイプ・名前・画像URLなど）"""
+    return {
+        "id": int(row["id"]),
+        "name_jp": row["name_jp"],
+        "name_en": row["name_en"],
+        "type1": row["type1"],
+        "type2": row["type2"],
+        "image_url": row["image_url"],
+    }
+
+
+def doc_id_for(row: Dict[str, str]) -> str:
+    """図鑑番号から決まる固定のドキュメントID"""
+    return f"pokemon-{int(row['id'])}"
+
+
+def iter_docs(csv_path: str = CSV_PATH) -> Iterator[SyncDoc]:
+    with open(csv_path, encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield doc_id_for(row), row_to_text(row), row_to_metadata(row)
+
+
+@dataclass
+class QueryCollection:
+    """
+    検索側が開くコレクションと、クエリの埋め込み方。
+    pokemon_chroma_151_query.py と query_service.py の両方がこれを使う
+    """
+
+    persist_dir: str
+    backend: str
+    dim_mode: str
+    dimensions: int
+    suffix: str
+
+    @property
+    def name(self) -> str:
+        return COLLECTION_NAME + self.suffix
+
+    @property
+    def numpy_stem(self) -> str:
+        return NUMPY_STEM + self.suffix
+
+    def build_embeddings(self) -> Embeddings:
+        """取り込みと同じ次元の埋め込みモデル（pca なら保存した射影もかける）"""
+        emb = build_embeddings(
+            self.backend, cached=True, dimensions=self.dimensions if self.dim_mode == "native" else None
         )
-        texts.append(text)
-
-        # メタデータ（タイプ・名前・画像URLなど）
-        metadatas.append(
-            {
-                "id": int(row["id"]),
-                "name_jp": row["name_jp"],
-                "name_en": row["name_en"],
-                "type1": row["type1"],
-                "type2": row["type2"],
-                "image_url": row["image_url"],
-            }
+        if self.dim_mode == "pca":
+            emb = ProjectedEmbeddings(emb, PCAProjection.load(projection_path(self.persist_dir, self.name)))
+        return emb
+
+
+def resolve_query_collection(backend: Optional[str] = None, persist_dir: Optional[str] = None) -> QueryCollection:
+    """
+    バックエンドは引数 → EMBEDDING_BACKEND、次元は resolve_dimension_settings
+    （環境変数で指定しなければ、取り込んだときに記録したモード・次元数）で決める。
+    load_env() の後で呼ぶ
+    """
+    backend = embedding_backend(backend)
+    persist_dir = persist_dir or PERSIST_DIR
+    mode, dims = resolve_dimension_settings(persist_dir, COLLECTION_NAME + collection_suffix(backend))
+    suffix = collection_suffix(backend) + dimension_suffix(mode, dims)
+    return QueryCollection(persist_dir, backend, mode, dims, suffix)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ポケモン CSV を Chroma に取り込む")
+    parser.add_argument("--csv", default=CSV_PATH, help="取り込む CSV のパス")
+    parser.add_argument(
+        "--embedding",
+        choices=BACKENDS,
+        default=None,
+        help="埋め込みのバックエンド（省略時は EMBEDDING_BACKEND、既定は openrouter）",
+    )
+    parser.add_argument(
+        "--dim-mode",
+        choices=DIMENSION_MODES,
+        default=None,
+        help="埋め込みの次元の減らし方（省略時は EMBEDDING_DIM_MODE、既定は full）",
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=None,
+        help=f"native / pca のときの次元数（省略時は EMBEDDING_DIMENSIONS、既定は {DEFAULT_DIMENSIONS}）",
+    )
+    parser.add_argument("--batch-size", type=int, default=64, help="1回の埋め込みリクエストに入れる行数")
+    parser.add_argument("--workers", type=int, default=4, help="同時に投げる埋め込みリクエスト数")
+    parser.add_argument(
+        "--export-numpy",
+        action="store_true",
+        help=f"同期後に NumPy ストア（{NUMPY_STEM}.npy）も書き出す",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="NumPy ストアを書き出し、int8 / 符号ビットのコードも作る（VECTOR_BACKEND=quantized 用）",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    # 1. .env 読み込み
+    load_env()
+
+    # 2. Embedding モデル（--embedding / EMBEDDING_BACKEND で切り替え。既定は OpenRouter 経由）
+    #    --dim-mode native ならモデルに短い埋め込みを直接出させる
+    backend = embedding_backend(args.embedding)
+    dim_mode = dimension_mode(args.dim_mode)
+    dims = args.dimensions or default_dimensions()
+    emb = build_embeddings(backend, cached=True, dimensions=dims if dim_mode == "native" else None)
+    suffix = collection_suffix(backend) + dimension_suffix(dim_mode, dims)
+    # pca は、まず元の次元のコレクションに取り込んでから射影する
+    source_suffix = collection_suffix(backend) + ("" if dim_mode == "pca" else dimension_suffix(dim_mode, dims))
+
+    # 3. 永続化された Chroma を開く（無ければ作られる）
+    #    バックエンド・次元ごとにコレクションを分ける（次元の違うベクトルを混ぜない）
+    db = langchain_chroma.Chroma(
+        collection_name=COLLECTION_NAME + source_suffix,
+        embedding_function=emb,
+        persist_directory=PERSIST_DIR,
+    )
+
+    # 4. CSV を少しずつ読みながら同期（変更のあった行だけ埋め込み、消えた行は削除）
+    started = time.perf_counter()
+    stats = run_pipeline(
+        iter_docs(args.csv),
+        db,
+        emb,
+        batch_size=args.batch_size,
+        max_in_flight=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"🔥 Chroma と同期しました: {format_sync_stats(stats)}（{elapsed:.2f} 秒）")
+    print(emb.format_stats())
+
+    # 5. pca: 取り込んだベクトルで PCA を当てはめ、射影をコレクションの横に保存して、
+    #    射影したベクトルを別のコレクションに書き込む（埋め込み直しはしない）
+    if dim_mode == "pca":
+        vectors = db.get(include=["embeddings"])["embeddings"]
+        if len(vectors) == 0:
+            print("⚠️ コレクションが空なので PCA を当てはめられません。CSV の中身を確認してください")
+            return
+        projection = PCAProjection.fit(vectors, dims)
+        if projection.dimensions < dims:
+            print(f"⚠️ PCA の次元は件数・元の次元を超えられないので {projection.dimensions} 次元にしました")
+        projection.save(projection_path(PERSIST_DIR, COLLECTION_NAME + suffix))
+        emb = ProjectedEmbeddings(emb, projection)
+        source, db = db, langchain_chroma.Chroma(
+            collection_name=COLLECTION_NAME + suffix,
+            embedding_function=emb,
+            persist_directory=PERSIST_DIR,
+        )
+        result = sync_projected(source, db, projection)
+        print(
+            f"📐 PCA {projection.source_dimensions} → {projection.dimensions} 次元"
+            f"（分散の {projection.explained.sum():.1%} を保持）: "
+            f"{result['written']} 件を書き込み、{result['deleted']} 件を削除"
         )
 
-print(f"CSV 読み込み完了: {len(texts)} 件")
+    # 検索側が同じコレクション・射影を開けるよう、モードと次元数を記録しておく
+    save_dimension_settings(PERSIST_DIR, COLLECTION_NAME + collection_suffix(backend), dim_mode, dims)
 
-# 4. Chroma に保存（永続化）
-PERSIST_DIR = "chroma_pokemon_151"
+    # 6. VECTOR_BACKEND=numpy 用に、同じベクトルを NumPy ストアとして書き出す
+    #    前に書き出したものがあれば、フラグが無くても書き出し直す（古いまま使われないように）
+    stem = NUMPY_STEM + suffix
+    if args.export_numpy or args.quantize or vector_file.exists(stem):
+        store = export_snapshot(db, emb, stem, PERSIST_DIR, model=emb.model)
+        print(f"💾 NumPy ストアを書き出しました: {stem}.npy（{len(store)} 件）")
+
+    # 7. VECTOR_BACKEND=quantized 用に、書き出したベクトルを量子化しておく
+    if args.quantize:
+        index = quantize_file(stem)
+        print(f"💾 量子化コードを書き出しました: {format_sizes(index)}")
 
-db = Chroma.from_texts(
-    texts=texts,
-    embedding=emb,
-    metadatas=metadatas,
-    collection_name="pokemon_151",
-    persist_directory=PERSIST_DIR,
-)
 
-print("🔥 Chroma にポケモン151匹を保存しました！")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
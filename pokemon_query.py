@@ -1,19 +1,16 @@
 # pokemon_query.py
-import os
-from dotenv import load_dotenv
-
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 
-# 1. .env 読み込み
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
+import openrouter_clients
+from embedding_cache import CachedEmbeddings, QueryEmbeddingLRU
+
+# 1. .env 読み込み・API キーの確認は openrouter_clients が行う
 
 # 2. Embedding モデル
-emb = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=api_key,
-    base_url="https://openrouter.ai/api/v1",
+# 同じ質問を繰り返したときは、メモリ上の LRU から埋め込みを返す
+emb = QueryEmbeddingLRU(
+    CachedEmbeddings(openrouter_clients.embeddings("text-embedding-3-small")),
+    max_size=256,
 )
 
 # 3. 永続化された DB を読み込む
@@ -32,6 +29,7 @@ while True:
     q = input("\n質問 > ").strip()
     if not q:
         print("終了します。")
+        print(emb.format_stats())
         break
 
     # 意味検索（k=3）
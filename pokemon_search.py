@@ -1,34 +1,32 @@
 # pokemon_search.py
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-import os
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
+
+import openrouter_clients
+from llm_cache import LLMResponseCache, cache_enabled
+from runtime import Lazy, first_prompt, lazy_import, load_env
+from stream_output import print_response, streaming_enabled
 
 
 # --------------------------
 # 1. JSON から独自図鑑データを読み込む
 # --------------------------
-def load_pokemon_data(path: str = "pokemon_data.json") -> List[Dict[str, Any]]:
+def load_pokemon_data(path: str = "pokemon_data.json") -> "PokemonIndex":
+    """JSON を読み込み、検索用の索引を1回だけ作って返す"""
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return PokemonIndex(json.load(f))
 
 
 # --------------------------
 # 2. 名前正規化系ユーティリティ
 # --------------------------
+# ひらがな: 0x3041〜0x3096 → カタカナ: +0x60
+_HIRA_TO_KATA = {code: code + 0x60 for code in range(0x3041, 0x3097)}
+
+
 def hira_to_kata(text: str) -> str:
     """ひらがなをカタカナに変換（その他の文字はそのまま）"""
-    result = []
-    for ch in text:
-        code = ord(ch)
-        # ひらがな: 0x3041〜0x3096 → カタカナ: +0x60
-        if 0x3041 <= code <= 0x3096:
-            result.append(chr(code + 0x60))
-        else:
-            result.append(ch)
-    return "".join(result)
+    return text.translate(_HIRA_TO_KATA)
 
 
 def normalize_name(name: str) -> str:
@@ -39,95 +37,260 @@ def normalize_name(name: str) -> str:
 
 
 # --------------------------
-# 3. 検索ロジック
+# 3. 検索ロジック（索引）
 # --------------------------
-def find_by_id(poke_id: int, data: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    for entry in data:
-        if entry.get("id") == poke_id:
-            return entry
-    return None
+def _ngrams(text: str, n: int) -> set:
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
 
 
-def search_by_name(
-    name_jp: str, data: List[Dict[str, Any]]
-) -> Dict[str, Any]:
+def _trigrams(text: str) -> set:
+    """前後に境界記号を付けたトライグラム（短い名前でも最低2つはできる）"""
+    return _ngrams(f"^{text}$", 3)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
     """
-    日本語名で検索する。
-    - まず「正規化して完全一致」を探す
-    - 見つからなければ「部分一致」を探して候補一覧を返す
+    レーベンシュタイン距離。max_distance を超えると分かった時点で打ち切り、
+    max_distance + 1 を返す。
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            cur[j] = min(
+                prev[j] + 1,  # 削除
+                cur[j - 1] + 1,  # 挿入
+                prev[j - 1] + (ca != cb),  # 置換
+            )
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev = cur
+    return prev[-1]
+
+
+class PokemonIndex:
     """
-    query_norm = normalize_name(name_jp)
+    図鑑データの検索用索引。読み込み時に1回だけ作る。
+
+    - 図鑑番号 → エントリ
+    - 正規化した名前 → エントリ位置のリスト（完全一致用）
+    - 1文字 / 2文字の n-gram → エントリ位置のリスト（部分一致の候補絞り込み用）
+    - トライグラム → エントリ位置のリスト（打ち間違いを許すあいまい検索用）
+
+    位置は元データの並び順なので、検索結果の順番は線形探索のときと変わらない。
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]) -> None:
+        self.entries = entries
+        self.norm_names: List[str] = []
+        self.by_id: Dict[Any, Dict[str, Any]] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        self.unigrams: Dict[str, List[int]] = {}
+        self.bigrams: Dict[str, List[int]] = {}
+        self.trigrams: Dict[str, List[int]] = {}
+
+        for pos, entry in enumerate(entries):
+            # 同じ番号が重複していたら、線形探索と同じく最初のものを優先
+            self.by_id.setdefault(entry.get("id"), entry)
+
+            norm = normalize_name(entry.get("name_jp", ""))
+            self.norm_names.append(norm)
+            self.by_name.setdefault(norm, []).append(pos)
+            for gram in _ngrams(norm, 1):
+                self.unigrams.setdefault(gram, []).append(pos)
+            for gram in _ngrams(norm, 2):
+                self.bigrams.setdefault(gram, []).append(pos)
+            for gram in _trigrams(norm):
+                self.trigrams.setdefault(gram, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.entries[i]
+
+    def find_by_id(self, poke_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(poke_id)
+
+    def substring_candidates(self, query_norm: str) -> List[int]:
+        """query_norm を含む可能性のあるエントリ位置（昇順）。最後に in で確かめる"""
+        if len(query_norm) == 1:
+            return self.unigrams.get(query_norm, [])
+
+        grams = _ngrams(query_norm, 2)
+        postings = [self.bigrams.get(g) for g in grams]
+        if any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates.intersection_update(p)
+            if not candidates:
+                return []
+        return sorted(pos for pos in candidates if query_norm in self.norm_names[pos])
+
+    def fuzzy_search(
+        self, name_jp: str, k: int = 5, max_distance: int = 2
+    ) -> List[Dict[str, Any]]:
+        """
+        打ち間違いを許すあいまい検索（例: ピカチユウ → ピカチュウ）。
+
+        1. トライグラムを共有するエントリを候補にする
+           （編集1回で壊れるトライグラムは最大3つなので、共有数が少なすぎるものは除外）
+        2. 候補だけ編集距離を計算して max_distance 以内のものを残す
+        3. 距離の近い順に上位 k 件を {"entry", "score", "distance"} で返す
+        """
+        query_norm = normalize_name(name_jp)
+        if not query_norm:
+            return []
+
+        grams = _trigrams(query_norm)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for pos in self.trigrams.get(gram, ()):
+                shared[pos] = shared.get(pos, 0) + 1
+
+        min_shared = max(1, len(grams) - 3 * max_distance)
+        scored = []
+        for pos, count in shared.items():
+            if count < min_shared:
+                continue
+            name = self.norm_names[pos]
+            dist = edit_distance(query_norm, name, max_distance)
+            if dist > max_distance:
+                continue
+            score = 1.0 - dist / max(len(query_norm), len(name))
+            scored.append((dist, -count, pos, score))
+
+        scored.sort()
+        return [
+            {"entry": self.entries[pos], "score": score, "distance": dist}
+            for dist, _, pos, score in scored[:k]
+        ]
+
+    def search_by_name(self, name_jp: str, fuzzy: bool = False) -> Dict[str, Any]:
+        query_norm = normalize_name(name_jp)
+
+        exact = self.by_name.get(query_norm)
+        if exact:
+            return {"mode": "exact", "matches": [self.entries[p] for p in exact]}
+
+        if query_norm:
+            partial = self.substring_candidates(query_norm)
+            if partial:
+                return {"mode": "partial", "matches": [self.entries[p] for p in partial]}
 
-    exact_matches: List[Dict[str, Any]] = []
-    partial_matches: List[Dict[str, Any]] = []
+        if fuzzy:
+            hits = self.fuzzy_search(name_jp)
+            if hits:
+                return {
+                    "mode": "fuzzy",
+                    "matches": [h["entry"] for h in hits],
+                    "scores": [h["score"] for h in hits],
+                }
 
-    for entry in data:
-        entry_name = entry.get("name_jp", "")
-        entry_norm = normalize_name(entry_name)
+        return {"mode": "none", "matches": []}
 
-        if entry_norm == query_norm:
-            exact_matches.append(entry)
-        elif query_norm and query_norm in entry_norm:
-            partial_matches.append(entry)
 
-    if exact_matches:
-        return {"mode": "exact", "matches": exact_matches}
-    if partial_matches:
-        return {"mode": "partial", "matches": partial_matches}
+def _as_index(data: Union[PokemonIndex, List[Dict[str, Any]]]) -> PokemonIndex:
+    return data if isinstance(data, PokemonIndex) else PokemonIndex(data)
 
-    return {"mode": "none", "matches": []}
+
+def find_by_id(
+    poke_id: int, data: Union[PokemonIndex, List[Dict[str, Any]]]
+) -> Optional[Dict[str, Any]]:
+    return _as_index(data).find_by_id(poke_id)
+
+
+def search_by_name(
+    name_jp: str,
+    data: Union[PokemonIndex, List[Dict[str, Any]]],
+    fuzzy: bool = False,
+) -> Dict[str, Any]:
+    """
+    日本語名で検索する。
+    - まず「正規化して完全一致」を探す
+    - 見つからなければ「部分一致」を探して候補一覧を返す
+    - fuzzy=True なら、それでも無いときに打ち間違いを許して候補を探す（mode="fuzzy"）
+    data に PokemonIndex を渡すと、作り直さずに索引を引くだけで済む。
+    """
+    return _as_index(data).search_by_name(name_jp, fuzzy=fuzzy)
 
 
 # --------------------------
 # 4. LangChain / Gemini の準備
 # --------------------------
-load_dotenv()
-
-model = ChatOpenAI(
-    model="google/gemini-2.5-flash",          # OpenRouter 上の Gemini モデル
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
-
-prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "あなたはポケモン図鑑です。"
-            "与えられたデータだけを利用して回答してください。"
-            "与えられていない情報を推測で補ったり、新しい事実を作ったりしてはいけません。"
-        ),
-        (
-            "human",
-            "以下のポケモンデータだけを使って、図鑑風に説明してください。\n\n"
-            "{pokedex_entry}"
-        ),
-    ]
-)
-
-chain = prompt | model
+# langchain_core.prompts は重いので、チェーンを作るときまで import しない
+# （bm25_index などが hira_to_kata のためにこのモジュールを import しても遅くならない）
+prompts = lazy_import("langchain_core.prompts")
+
+MODEL_NAME = "google/gemini-2.5-flash"  # OpenRouter 上の Gemini モデル
+
+PROMPT_MESSAGES = [
+    (
+        "system",
+        "あなたはポケモン図鑑です。"
+        "与えられたデータだけを利用して回答してください。"
+        "与えられていない情報を推測で補ったり、新しい事実を作ったりしてはいけません。"
+    ),
+    (
+        "human",
+        "以下のポケモンデータだけを使って、図鑑風に説明してください。\n\n"
+        "{pokedex_entry}"
+    ),
+]
+prompt = Lazy(lambda: prompts.ChatPromptTemplate.from_messages(PROMPT_MESSAGES), "prompt")
+
+
+def build_chain(model=None):
+    """
+    プロンプト → モデルのチェーンを作る。
+    model を渡せばそれを使う（常駐サービスやテストで差し替える用）。
+    """
+    if model is None:
+        model = openrouter_clients.chat_model(MODEL_NAME)
+    return prompt.get() | model
 
 
 # --------------------------
 # 5. 出力整形
 # --------------------------
 def format_entry_for_prompt(entry: Dict[str, Any]) -> str:
-    """LLM に渡すために、1匹分のデータをテキストに整形"""
+    """
+    LLM に渡すために、1匹分のデータをテキストに整形。
+    CSV 由来のデータなど、高さ・重さを持たないエントリではその行を省く。
+    """
     types = ", ".join(entry.get("types", []))
-    return (
-        f"図鑑番号: {entry.get('id')}\n"
-        f"名前: {entry.get('name_jp')} ({entry.get('name_en')})\n"
-        f"タイプ: {types}\n"
-        f"高さ: {entry.get('height_m')} m\n"
-        f"重さ: {entry.get('weight_kg')} kg\n"
-        f"説明: {entry.get('description')}\n"
-    )
+    lines = [
+        f"図鑑番号: {entry.get('id')}\n",
+        f"名前: {entry.get('name_jp')} ({entry.get('name_en')})\n",
+        f"タイプ: {types}\n",
+    ]
+    if "height_m" in entry:
+        lines.append(f"高さ: {entry.get('height_m')} m\n")
+    if "weight_kg" in entry:
+        lines.append(f"重さ: {entry.get('weight_kg')} kg\n")
+    lines.append(f"説明: {entry.get('description')}\n")
+    return "".join(lines)
 
 
 # --------------------------
 # 6. メイン処理
 # --------------------------
 def main() -> None:
+    load_env()  # STREAM_OUTPUT などの設定も .env から読めるように
+    # チェーンは最初に説明を出すときに作る（プロンプトをすぐ出すため）
+    chain = Lazy(build_chain, "chain")
+    # --no-stream を付けると、応答が全部そろってから表示する従来の動き
+    stream = streaming_enabled()
+    # 同じエントリの説明はディスクキャッシュから返す（--no-cache で無効）
+    cache = LLMResponseCache() if cache_enabled() else None
+
     print("=== ポケモン図鑑（独自JSONナレッジ版 × Gemini） ===")
     print("※ この図鑑は pokemon_data.json に登録されているポケモンだけを参照します。")
     print("入力例:")
@@ -135,17 +298,26 @@ def main() -> None:
     print("  ・図鑑番号        : 25")
     print("空で Enter を押すと終了します。")
 
-    # JSON を読み込む（起動時に1回だけ）
+    # JSON を読み込み、索引を作る（起動時に1回だけ）
     try:
         data = load_pokemon_data()
     except FileNotFoundError:
         print("pokemon_data.json が見つかりません。先に作成してください。")
         return
 
+    if cache is not None:
+        # pokemon_data.json が書き換わったエントリの古い応答を捨てておく
+        removed = cache.invalidate_pokemon_data(data)
+        if removed:
+            print(f"（データが更新されたエントリのキャッシュを {removed} 件削除しました）")
+
+    first_prompt()
     while True:
         query = input("\nあなた > ").strip()
         if not query:
             print("終了します。")
+            if cache is not None:
+                print(cache.format_stats())
             break
 
         # 1) 数字だけなら「図鑑番号」とみなす
@@ -158,13 +330,18 @@ def main() -> None:
                 continue
 
             pokedex_entry_text = format_entry_for_prompt(entry)
-            res = chain.invoke({"pokedex_entry": pokedex_entry_text})
-            print("\n図鑑 >")
-            print(res.content)
+            print_response(
+                chain.get(),
+                {"pokedex_entry": pokedex_entry_text},
+                "\n図鑑 >\n",
+                stream=stream,
+                cache=cache,
+                entry=entry,
+            )
             continue
 
         # 2) それ以外は「名前検索」
-        result = search_by_name(query, data)
+        result = search_by_name(query, data, fuzzy=True)
         mode = result["mode"]
         matches: List[Dict[str, Any]] = result["matches"]
 
@@ -173,21 +350,27 @@ def main() -> None:
             print("その名前に該当するポケモンは、現在この図鑑データには登録されていません。")
             continue
 
-        if mode == "partial" and len(matches) > 1:
-            # あいまいすぎる場合は候補一覧を出す
+        if mode == "fuzzy" or (mode == "partial" and len(matches) > 1):
+            # あいまいすぎる場合や、打ち間違いらしい場合は候補一覧を出す
             print("\n図鑑 >")
             print("いくつかの候補が見つかりました。もう少し詳しく指定してください。")
-            for e in matches:
-                print(f"  - 図鑑番号 {e.get('id')}: {e.get('name_jp')}")
+            scores = result.get("scores")
+            for n, e in enumerate(matches):
+                score = f"（一致度 {scores[n]:.2f}）" if scores else ""
+                print(f"  - 図鑑番号 {e.get('id')}: {e.get('name_jp')}{score}")
             continue
 
         # exact または partial で1件だけ → 図鑑表示
         entry = matches[0]
         pokedex_entry_text = format_entry_for_prompt(entry)
-        res = chain.invoke({"pokedex_entry": pokedex_entry_text})
-
-        print("\n図鑑 >")
-        print(res.content)
+        print_response(
+            chain.get(),
+            {"pokedex_entry": pokedex_entry_text},
+            "\n図鑑 >\n",
+            stream=stream,
+            cache=cache,
+            entry=entry,
+        )
 
 
 if __name__ == "__main__":
@@ -1,11 +1,12 @@
 # pokemon_zukan_json.py
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-import os
 import json
 from typing import Any, Dict, List, Optional
 
+import openrouter_clients
+from llm_cache import LLMResponseCache, cache_enabled
+from stream_output import print_response, streaming_enabled
+
 
 # --------------------------
 # 1. JSON から独自図鑑データを読み込む
@@ -26,13 +27,7 @@ def find_pokemon_by_name(name_jp: str, data: List[Dict[str, Any]]) -> Optional[D
 # --------------------------
 # 2. LangChain / Gemini の準備
 # --------------------------
-load_dotenv()
-
-model = ChatOpenAI(
-    model="google/gemini-2.5-flash",          # OpenRouter 上の Gemini モデル
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
+model = openrouter_clients.chat_model("google/gemini-2.5-flash")  # OpenRouter 上の Gemini モデル
 
 # 「このデータだけを使って答えろ」と明示するプロンプト
 prompt = ChatPromptTemplate.from_messages(
@@ -71,6 +66,11 @@ def format_entry_for_prompt(entry: Dict[str, Any]) -> str:
 
 
 def main() -> None:
+    # --no-stream を付けると、応答が全部そろってから表示する従来の動き
+    stream = streaming_enabled()
+    # 同じエントリの説明はディスクキャッシュから返す（--no-cache で無効）
+    cache = LLMResponseCache() if cache_enabled() else None
+
     print("=== ポケモン図鑑（独自JSONナレッジ版 × Gemini） ===")
     print("※ この図鑑は pokemon_data.json に登録されているポケモンだけを参照します。")
     print("ポケモン名を入力してください（例: ピカチュウ, フシギダネ）")
@@ -83,10 +83,18 @@ def main() -> None:
         print("pokemon_data.json が見つかりません。先に作成してください。")
         return
 
+    if cache is not None:
+        # pokemon_data.json が書き換わったエントリの古い応答を捨てておく
+        removed = cache.invalidate_pokemon_data(data)
+        if removed:
+            print(f"（データが更新されたエントリのキャッシュを {removed} 件削除しました）")
+
     while True:
         name = input("\nあなた > ").strip()
         if not name:
             print("終了します。")
+            if cache is not None:
+                print(cache.format_stats())
             break
 
         entry = find_pokemon_by_name(name, data)
@@ -99,10 +107,14 @@ def main() -> None:
         # 見つかったら、そのデータだけを LLM に渡して説明してもらう
         pokedex_entry_text = format_entry_for_prompt(entry)
 
-        res = chain.invoke({"pokedex_entry": pokedex_entry_text})
-
-        print("\n図鑑 >")
-        print(res.content)
+        print_response(
+            chain,
+            {"pokedex_entry": pokedex_entry_text},
+            "\n図鑑 >\n",
+            stream=stream,
+            cache=cache,
+            entry=entry,
+        )
 
 
 if __name__ == "__main__":
@@ -1,18 +1,11 @@
 # pokemon_zukan_simple.py
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-import os
 
-# .env から OPENROUTER_API_KEY を読み込む
-load_dotenv()
+import openrouter_clients
+from stream_output import print_response, streaming_enabled
 
-# OpenRouter 経由の Gemini を使う
-model = ChatOpenAI(
-    model="google/gemini-2.5-flash",
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",  # OpenRouter の共通エンドポイント
-)
+# OpenRouter 経由の Gemini を使う（.env の OPENROUTER_API_KEY は openrouter_clients が読む）
+model = openrouter_clients.chat_model("google/gemini-2.5-flash")
 
 # ポケモン図鑑用のプロンプトテンプレート
 prompt = ChatPromptTemplate.from_messages(
@@ -36,6 +29,9 @@ chain = prompt | model
 
 
 def main() -> None:
+    # --no-stream を付けると、応答が全部そろってから表示する従来の動き
+    stream = streaming_enabled()
+
     print("=== ポケモン図鑑（Gemini 版 × LangChain × OpenRouter） ===")
     print("ポケモン名を入力してください（例: ピカチュウ, ヒトカゲ）")
     print("空で Enter を押すと終了します。")
@@ -46,11 +42,8 @@ def main() -> None:
             print("終了します。")
             break
 
-        # チェーンを実行して結果を取得
-        res = chain.invoke({"pokemon_name": pokemon_name})
-
-        print("\n図鑑 >")
-        print(res.content)
+        # チェーンを実行して、届いたトークンから順に表示
+        print_response(chain, {"pokemon_name": pokemon_name}, "\n図鑑 >\n", stream=stream)
 
 
 if __name__ == "__main__":
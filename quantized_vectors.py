@@ -0,0 +1,491 @@
+# quantized_vectors.py
+"""
+保存済みのベクトル（vector_file 形式の <stem>.npy）を量子化して、小さいコードで候補を絞ってから検索する。
+
+- int8 スカラー量子化: 次元ごとの最小値〜最大値を 256 段階に落とす（float32 の 1/4 の大きさ）
+- 符号ビット（任意）: 次元ごとの平均より大きいかどうかだけを 1bit で持つ（1/32）。
+  候補はハミング距離（XOR + popcount）で絞る
+- 絞った候補だけを、ディスク上の float32 行列（memmap）で正確なコサイン類似度に付け直す
+
+減るのはメモリ（と読むバイト数）で、検索が速くなるわけではない。int8 は内積の前に float32 へ
+戻す分だけ遅く、20000 件 × 512 次元では p50 が float32 の総当たり 2.7ms に対して int8 + 付け直しは 4.6ms。
+float32 の行列をメモリに載せきれないときに使う。
+
+ファイル（元の <stem>.npy / .meta.json / .texts.jsonl はそのまま残し、付け直しに使う）:
+- <stem>.q8.npy     : int8 の (件数, 次元数)
+- <stem>.bits.npy   : uint8 の (件数, バイト数)。符号ビットを 8 バイト単位に詰めたもの（binary=True のとき）
+- <stem>.quant.json : 量子化のパラメータ（次元ごとの下限・刻み幅・平均）と、元の <stem>.npy の
+                      大きさ・更新時刻（.npy が書き換わっていたら古いコードとして扱う）
+
+使い方:
+    python quantized_vectors.py embeddings                       # 量子化して保存し、float との recall@k を表示
+    python quantized_vectors.py pokemon_151_vectors -k 5
+    python quantized_vectors.py --synthetic 100000 --dims 1536   # 合成データで（保存はしない）
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import vector_file
+from numpy_store import NumpyVectorStore, _normalize_rows, cosine_to_distance
+
+QUANT_FORMAT_VERSION = 2
+MODES = ("int8", "binary")
+# 付け直す候補数 = k × この倍率（符号ビットは粗いので多めに取る）
+RESCORE_FACTOR = {"int8": 4, "binary": 16}
+# int8 → float32 の変換は、キャッシュに収まる大きさの作業領域でこの行数ずつ行う
+_SCORE_CHUNK = 1024
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:  # NumPy 2.0 より前
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[words.view(np.uint8)].reshape(*words.shape, -1).sum(axis=-1)
+
+
+def _paths(stem: str) -> Dict[str, str]:
+    return {
+        "codes": f"{stem}.q8.npy",
+        "bits": f"{stem}.bits.npy",
+        "params": f"{stem}.quant.json",
+    }
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """読み取り専用のストア（QuantizedVectorStore）を更新しようとした"""
+
+
+class StaleQuantizationError(ValueError):
+    """量子化コードを作ったあとで、元の <stem>.npy が書き換わっている"""
+
+
+def source_stat(stem: str) -> Dict[str, int]:
+    """元の <stem>.npy の大きさと更新時刻（ナノ秒）。量子化コードが古くないかの確認に使う"""
+    st = os.stat(f"{stem}.npy")
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _normalize(query: Any) -> np.ndarray:
+    query = np.asarray(query, dtype=np.float32)
+    return query / (np.linalg.norm(query) or 1.0)
+
+
+# --------------------------
+# 1. int8 スカラー量子化
+# --------------------------
+@dataclass
+class ScalarQuantizer:
+    """次元ごとに x ≈ lo + (code + 128) * scale で戻せる int8 量子化"""
+
+    lo: np.ndarray
+    scale: np.ndarray
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray) -> "ScalarQuantizer":
+        lo = matrix.min(axis=0).astype(np.float32)
+        hi = matrix.max(axis=0).astype(np.float32)
+        scale = (hi - lo) / 255.0
+        scale[scale == 0] = 1.0
+        return cls(lo, scale.astype(np.float32))
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        levels = np.rint((matrix - self.lo) / self.scale)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.lo + (codes.astype(np.float32) + 128.0) * self.scale
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        デコードせずに内積を求める: x·q = code·(q * scale) + q·(lo + 128 * scale)。
+        queries は (次元数,) か (クエリ数, 次元数)
+        """
+        weights = (queries * self.scale).astype(np.float32)
+        offset = (queries @ (self.lo + 128.0 * self.scale)).astype(np.float32)
+        out = np.empty((codes.shape[0],) + weights.shape[:-1], dtype=np.float32)
+        buffer = np.empty((min(_SCORE_CHUNK, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_CHUNK):
+            chunk = codes[start : start + _SCORE_CHUNK]
+            rows = buffer[: len(chunk)]
+            rows[...] = chunk
+            np.matmul(rows, weights.T, out=out[start : start + len(chunk)])
+        out += offset
+        return out
+
+
+# --------------------------
+# 2. 符号ビット
+# --------------------------
+def sign_bits(matrix: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """center より大きい次元を 1 にしたビット列を、1行が 8 バイトの倍数になるよう詰める"""
+    packed = np.packbits(np.atleast_2d(matrix) > center, axis=1)
+    pad = (-packed.shape[1]) % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed)
+
+
+def hamming(bits: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """各行と query_bits（1行分）のハミング距離。uint64 ずつ XOR して popcount する"""
+    words = bits.view(np.uint64)
+    query_words = query_bits.reshape(-1).view(np.uint64)
+    return _popcount(words ^ query_words).sum(axis=1, dtype=np.int32)
+
+
+# --------------------------
+# 3. 量子化インデックス（候補を絞る → ディスク上の float で付け直す）
+# --------------------------
+class QuantizedIndex:
+    """
+    codes（int8）と bits（符号ビット）はメモリに、full-precision の vectors は memmap のまま持つ。
+    付け直しで読むのは候補の行だけ。
+    """
+
+    def __init__(
+        self,
+        quantizer: ScalarQuantizer,
+        codes: np.ndarray,
+        vectors: np.ndarray,
+        bits: Optional[np.ndarray] = None,
+        center: Optional[np.ndarray] = None,
+    ) -> None:
+        self.quantizer = quantizer
+        self.codes = codes
+        self.vectors = vectors
+        self.bits = bits
+        self.center = center
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def dimensions(self) -> int:
+        return self.codes.shape[1]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, binary: bool = True) -> "QuantizedIndex":
+        """vectors（memmap でよい）から作る。量子化は行を正規化してから行う"""
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        quantizer = ScalarQuantizer.fit(matrix)
+        center = matrix.mean(axis=0).astype(np.float32) if binary else None
+        bits = sign_bits(matrix, center) if binary else None
+        return cls(quantizer, quantizer.encode(matrix), vectors, bits, center)
+
+    def nbytes(self) -> Dict[str, int]:
+        return {
+            "float32": int(self.vectors.shape[0] * self.vectors.shape[1] * 4),
+            "int8": int(self.codes.nbytes),
+            "binary": int(self.bits.nbytes) if self.bits is not None else 0,
+        }
+
+    def approximate(self, query: np.ndarray, mode: str = "int8") -> np.ndarray:
+        """コードだけで求めた近さ（大きいほど近い）"""
+        if mode == "binary":
+            if self.bits is None:
+                raise ValueError("符号ビットがありません（binary=True で作り直してください）")
+            return -hamming(self.bits, sign_bits(query, self.center)).astype(np.float32)
+        if mode != "int8":
+            raise ValueError(f"mode は {MODES} のどれかを指定してください")
+        return self.quantizer.scores(self.codes, query)
+
+    def rescore(self, query: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """positions の行だけディスクから読み、正確なコサイン類似度を返す"""
+        order = np.argsort(positions, kind="stable")  # memmap は前から順に読むほうが速い
+        rows = np.empty((len(positions), self.dimensions), dtype=np.float32)
+        rows[order] = self.vectors[positions[order]]
+        return _normalize_rows(rows) @ query
+
+    def search(
+        self,
+        query: Any,
+        k: int = 4,
+        mode: str = "int8",
+        rescore: bool = True,
+        candidates: Optional[int] = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        上位 k 件の (位置, スコア)。
+        rescore=True なら k × RESCORE_FACTOR[mode] 件（または candidates 件）を正確に付け直す。
+        rescore=False のスコアは近似値（binary ならハミング距離の符号反転）
+        """
+        query = _normalize(query)
+        approx = self.approximate(query, mode)
+        if mask is not None:
+            approx = np.where(mask, approx, -np.inf)
+
+        valid = int(np.count_nonzero(approx > -np.inf))
+        pool = min(valid, candidates or k * RESCORE_FACTOR[mode]) if rescore else min(valid, k)
+        if pool <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-approx, pool - 1)[:pool] if pool < len(approx) else np.arange(len(approx))
+
+        scores = self.rescore(query, top) if rescore else approx[top]
+        best = np.argsort(-scores, kind="stable")[:k]
+        return top[best], scores[best]
+
+    # --------------------------
+    # 保存・読み込み
+    # --------------------------
+    def save(self, stem: str) -> None:
+        """stem の .npy から作ったインデックスとして、コードと元ファイルの状態を保存する"""
+        paths = _paths(stem)
+        np.save(paths["codes"], self.codes)
+        if self.bits is not None:
+            np.save(paths["bits"], self.bits)
+        elif os.path.exists(paths["bits"]):
+            os.remove(paths["bits"])
+        params = {
+            "format_version": QUANT_FORMAT_VERSION,
+            "count": len(self),
+            "dimensions": self.dimensions,
+            "lo": self.quantizer.lo.tolist(),
+            "scale": self.quantizer.scale.tolist(),
+            "center": self.center.tolist() if self.center is not None else None,
+            "source": source_stat(stem),
+        }
+        with open(paths["params"], "w", encoding="utf-8") as f:
+            json.dump(params, f)
+
+    @classmethod
+    def load(cls, stem: str) -> "QuantizedIndex":
+        paths = _paths(stem)
+        with open(paths["params"], "r", encoding="utf-8") as f:
+            params = json.load(f)
+        if not _params_match_source(params, stem):
+            raise StaleQuantizationError(
+                f"{stem}.npy が量子化後に変わっています。quantize_file で作り直してください"
+            )
+        vectors = vector_file.load_vectors(stem, mmap=True).vectors
+
+        quantizer = ScalarQuantizer(
+            np.asarray(params["lo"], dtype=np.float32), np.asarray(params["scale"], dtype=np.float32)
+        )
+        center = params.get("center")
+        bits = np.load(paths["bits"]) if center is not None else None
+        return cls(
+            quantizer,
+            np.load(paths["codes"]),
+            vectors,
+            bits,
+            np.asarray(center, dtype=np.float32) if center is not None else None,
+        )
+
+
+def _params_match_source(params: Dict[str, Any], stem: str) -> bool:
+    return (
+        params.get("format_version") == QUANT_FORMAT_VERSION
+        and params.get("source") == source_stat(stem)
+    )
+
+
+def exists(stem: str) -> bool:
+    return os.path.exists(_paths(stem)["codes"]) and os.path.exists(_paths(stem)["params"])
+
+
+def is_current(stem: str) -> bool:
+    """量子化コードがあり、元の <stem>.npy から変わっていなければ True"""
+    if not exists(stem):
+        return False
+    with open(_paths(stem)["params"], "r", encoding="utf-8") as f:
+        return _params_match_source(json.load(f), stem)
+
+
+def quantize_file(stem: str, binary: bool = True) -> QuantizedIndex:
+    """vector_file で保存済みの stem を量子化して、コードを横に保存する"""
+    index = QuantizedIndex.build(vector_file.load_vectors(stem, mmap=True).vectors, binary=binary)
+    index.save(stem)
+    return index
+
+
+def format_sizes(index: QuantizedIndex) -> str:
+    sizes = index.nbytes()
+    text = f"float32 {sizes['float32'] / 1024:.1f} KB → int8 {sizes['int8'] / 1024:.1f} KB"
+    if sizes["binary"]:
+        text += f" / 符号ビット {sizes['binary'] / 1024:.1f} KB"
+    return text
+
+
+# --------------------------
+# 4. VectorStore として使う
+# --------------------------
+class QuantizedVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore と同じ呼び方（filter / get など）で、量子化コードで候補を絞ってから
+    ディスク上の float32 で付け直して返す読み取り専用ストア。
+    matrix はディスク上の memmap のままで、メモリに載せるのはコードだけ。
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index: QuantizedIndex,
+        mode: str = "int8",
+        candidates: Optional[int] = None,
+    ) -> None:
+        super().__init__(embedding)
+        if mode not in MODES:
+            raise ValueError(f"mode は {MODES} のどれかを指定してください")
+        self.index = index
+        self.mode = mode
+        self.candidates = candidates
+        self.matrix = index.vectors
+
+    @classmethod
+    def load(  # type: ignore[override]
+        cls, stem: str, embedding: Embeddings, mode: str = "int8", candidates: Optional[int] = None
+    ) -> "QuantizedVectorStore":
+        """量子化コードが無い・元の .npy より古いときは、その場で作り直して保存してから開く"""
+        index = QuantizedIndex.load(stem) if is_current(stem) else quantize_file(stem)
+        vf = vector_file.load_vectors(stem, mmap=True)
+        store = cls(embedding, index, mode, candidates)
+        store.ids = vf.ids
+        store.texts = vf.texts
+        store.metadatas = vf.metadatas
+        store._positions = {doc_id: pos for pos, doc_id in enumerate(store.ids)}
+        return store
+
+    # 更新系は埋め込みを呼ぶ前に止める
+    def _read_only(self, *args: Any, **kwargs: Any) -> Any:
+        raise ReadOnlyStoreError(
+            "QuantizedVectorStore は読み取り専用です。NumpyVectorStore で更新して保存し直してください"
+        )
+
+    add_texts = _read_only
+    add_embeddings = _read_only
+    delete = _read_only
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        if len(self.ids) == 0:
+            return []
+        positions, scores = self.index.search(
+            embedding, k, mode=self.mode, candidates=self.candidates, mask=self.filter_mask(filter)
+        )
+        # NumpyVectorStore と同じく Chroma の既定の距離（2 - 2 × コサイン類似度）で返す
+        return [(self._to_document(int(p)), cosine_to_distance(s)) for p, s in zip(positions, scores)]
+
+    def batch_similarity_search_by_vector(
+        self,
+        embeddings: Sequence[List[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        return [self.similarity_search_with_score_by_vector(e, k, filter) for e in embeddings]
+
+
+# --------------------------
+# 5. float との比較（recall@k）
+# --------------------------
+def make_queries(matrix: np.ndarray, n: int, noise: float = 1.0, seed: int = 0) -> np.ndarray:
+    """保存済みのベクトルにノイズを足したものをクエリにする（埋め込み API を呼ばずに試すため）"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(n, matrix.shape[0]), replace=False)
+    base = _normalize_rows(np.asarray(matrix[np.sort(rows)], dtype=np.float32))
+    jitter = rng.standard_normal(base.shape).astype(np.float32) * noise / np.sqrt(matrix.shape[1])
+    return _normalize_rows(base + jitter)
+
+
+def make_synthetic(count: int, dims: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """埋め込みっぽい合成データ（全体に共通のずれ + クラスタ + ノイズ）"""
+    rng = np.random.default_rng(seed)
+    offset = rng.standard_normal(dims).astype(np.float32) * 0.5
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    matrix = offset + centers[labels] + rng.standard_normal((count, dims)).astype(np.float32) * 0.8
+    return _normalize_rows(matrix)
+
+
+def evaluate(index: QuantizedIndex, queries: np.ndarray, k: int = 10) -> List[Dict[str, Any]]:
+    """float の総当たりを正解として、方式ごとの recall@k と1クエリあたりの時間を測る"""
+    exact = _normalize_rows(np.asarray(index.vectors, dtype=np.float32))
+    truth = []
+    float_times = []
+    for q in queries:
+        start = time.perf_counter()
+        scores = exact @ q
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        float_times.append(time.perf_counter() - start)
+        truth.append(set(top.tolist()))
+
+    sizes = index.nbytes()
+    results = [
+        {"method": "float32（総当たり）", "bytes": sizes["float32"], "recall": 1.0,
+         "p50_ms": statistics.median(float_times) * 1000}
+    ]
+    methods = [("int8", False), ("int8", True)]
+    if index.bits is not None:
+        methods += [("binary", False), ("binary", True)]
+    for mode, rescore in methods:
+        hits = 0
+        times = []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            positions, _ = index.search(q, k, mode=mode, rescore=rescore)
+            times.append(time.perf_counter() - start)
+            hits += len(expected & set(positions.tolist()))
+        label = mode + (f" + 付け直し（候補 {k * RESCORE_FACTOR[mode]}）" if rescore else "")
+        results.append({
+            "method": label,
+            "bytes": sizes[mode],
+            "recall": hits / max(1, len(queries) * k),
+            "p50_ms": statistics.median(times) * 1000,
+        })
+    return results
+
+
+def format_results(results: List[Dict[str, Any]], k: int) -> str:
+    lines = [f"{'方式':<28} {'サイズ':>10} {'recall@' + str(k):>10} {'p50':>10}"]
+    for r in results:
+        lines.append(
+            f"{r['method']:<28} {r['bytes'] / 1024:>8.1f}KB {r['recall']:>10.3f} {r['p50_ms']:>8.3f}ms"
+        )
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="保存済みベクトルの量子化と recall@k の確認")
+    parser.add_argument("stem", nargs="?", default="embeddings", help="vector_file で保存した stem")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200, help="評価に使うクエリ数")
+    parser.add_argument("--noise", type=float, default=1.0, help="クエリに足すノイズの大きさ")
+    parser.add_argument("--no-binary", action="store_true", help="符号ビットを作らない")
+    parser.add_argument("--synthetic", type=int, default=0, help="合成データの件数（指定すると stem は使わない）")
+    parser.add_argument("--dims", type=int, default=1536, help="合成データの次元数")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.synthetic:
+        index = QuantizedIndex.build(make_synthetic(args.synthetic, args.dims), binary=not args.no_binary)
+        print(f"合成データ: {args.synthetic} 件 / {args.dims} 次元")
+    else:
+        if not vector_file.exists(args.stem):
+            raise SystemExit(f"{args.stem}.npy などが見つかりません（python vector_file.py embeddings.json で作れます）")
+        index = quantize_file(args.stem, binary=not args.no_binary)
+        print(f"💾 {args.stem}.q8.npy などを保存しました（{len(index)} 件 / {index.dimensions} 次元）")
+    print(format_sizes(index))
+
+    k = min(args.k, len(index))
+    queries = make_queries(index.vectors, args.queries, noise=args.noise)
+    print(f"\nクエリ {len(queries)} 件（保存済みベクトル + ノイズ {args.noise}）での recall@{k}:")
+    print(format_results(evaluate(index, queries, k), k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+# query_service.py
+"""
+意味検索・名前検索・チャットを1つの常駐プロセスで返す asyncio の HTTP サービス。
+
+使い方:
+    python query_service.py                       # OpenRouter + 永続化済み Chroma
+    python query_service.py --stand-in            # 代替バックエンド（API キー不要）
+    python query_service.py --stand-in --latency 0.2
+
+エンドポイント（JSON で受け取り JSON で返す）:
+    GET  /health
+    POST /search   {"query": "...", "k": 5, "type1": "ground", "type2": "", "mode": "hybrid",
+                    "token_budget": 800}
+    GET  /pokemon?name=ピカチュウ  /  GET /pokemon?id=25
+    POST /pokemon  {"name": "ピカチュウ", "describe": true}
+    POST /chat     {"question": "..."}
+
+- 埋め込み・ベクトルストア・索引・LLM クライアントは起動時に1回だけ作り、全リクエストで使い回す
+- 検索のようにブロックする処理は asyncio.to_thread、LLM は ainvoke で呼ぶので、
+  遅いリクエストがあっても他のリクエストは待たされない
+- LLM の同時呼び出し数は --max-llm で制限する
+"""
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from langchain_core.vectorstores import VectorStore
+
+import main as chat_app
+import pokemon_search
+from bm25_index import BM25Index
+from context_packer import pack_documents
+from hybrid_search import DEFAULT_MODE, MODES, HybridRetriever
+from metadata_index import MetadataIndex
+from pokemon_search import PokemonIndex, format_entry_for_prompt, load_pokemon_data
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8151
+MAX_BODY_BYTES = 1 << 20  # 1MB より大きいリクエストは受け付けない
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --------------------------
+# 1. 共有する状態
+# --------------------------
+@dataclass
+class ServiceState:
+    """プロセス内で使い回すクライアント・ストア・索引"""
+
+    embeddings: Any
+    db: VectorStore
+    index: PokemonIndex
+    zukan_chain: Any  # pokemon_search のプロンプト | モデル
+    chat_chain: Any  # main.py のプロンプト | モデル
+    max_llm: int = 8
+    started: float = field(default_factory=time.time)
+    requests: int = 0
+    llm_slots: Optional[asyncio.Semaphore] = None
+    retriever: Optional[HybridRetriever] = None
+
+    def __post_init__(self) -> None:
+        if self.retriever is None:
+            # BM25 とメタデータ索引もストアから1回だけ作っておく（埋め込みは呼ばない）
+            self.retriever = HybridRetriever(
+                self.db,
+                BM25Index.from_store(self.db),
+                MetadataIndex.from_store(self.db, ("type1", "type2")),
+            )
+
+    def slots(self) -> asyncio.Semaphore:
+        # Semaphore はイベントループの中で作る
+        if self.llm_slots is None:
+            self.llm_slots = asyncio.Semaphore(self.max_llm)
+        return self.llm_slots
+
+
+def build_openrouter_state(max_llm: int = 8) -> ServiceState:
+    """
+    本番用: 永続化済みの Chroma と OpenRouter のチャットモデルを使う。
+    埋め込みのバックエンド・コレクション・射影は pokemon_chroma_151_query.py と同じ決め方
+    （EMBEDDING_BACKEND と、取り込み時に記録した次元のモード）
+    """
+    from langchain_chroma import Chroma
+
+    from embedding_cache import QueryEmbeddingLRU
+    from pokemon_chroma_store_151 import resolve_query_collection
+    from runtime import load_env
+
+    load_env()
+    collection = resolve_query_collection()
+    # 埋め込み・2つのチェーンは openrouter_clients の接続プールを共有する
+    emb = QueryEmbeddingLRU(collection.build_embeddings(), max_size=1024)
+    db = Chroma(
+        persist_directory=collection.persist_dir,
+        collection_name=collection.name,
+        embedding_function=emb,
+    )
+    return ServiceState(
+        embeddings=emb,
+        db=db,
+        index=load_pokemon_data(),
+        zukan_chain=pokemon_search.build_chain(),
+        chat_chain=chat_app.build_chain(),
+        max_llm=max_llm,
+    )
+
+
+def build_stand_in_state(latency: float = 0.0, max_llm: int = 8) -> ServiceState:
+    """テスト用: CSV をその場で代替埋め込みにかけ、NumPy ストアに載せる"""
+    from numpy_store import NumpyVectorStore
+    from pokemon_chroma_store_151 import iter_docs
+    from stand_in_backends import StandInChatModel, StandInEmbeddings
+
+    emb = StandInEmbeddings(latency=latency)
+    ids, texts, metadatas = zip(*iter_docs())
+    db = NumpyVectorStore.from_texts(list(texts), emb, metadatas=list(metadatas), ids=list(ids))
+    return ServiceState(
+        embeddings=emb,
+        db=db,
+        index=load_pokemon_data(),
+        zukan_chain=pokemon_search.build_chain(StandInChatModel(latency=latency)),
+        chat_chain=chat_app.build_chain(StandInChatModel(latency=latency)),
+        max_llm=max_llm,
+    )
+
+
+# --------------------------
+# 2. 各エンドポイントの処理
+# --------------------------
+def type_filter(type1: str, type2: str) -> Optional[Dict[str, Any]]:
+    """pokemon_chroma_151_query.py と同じ type1 / type2 の絞り込み条件"""
+    if type1 and type2:
+        return {"$and": [{"type1": type1}, {"type2": type2}]}
+    if type1:
+        return {"type1": type1}
+    if type2:
+        return {"type2": type2}
+    return None
+
+
+async def handle_search(state: ServiceState, body: Dict[str, Any]) -> Dict[str, Any]:
+    query = str(body.get("query", "")).strip()
+    if not query:
+        raise HttpError(400, "query が空です")
+    try:
+        k = int(body.get("k", 5))
+    except (TypeError, ValueError):
+        raise HttpError(400, "k は整数で指定してください")
+
+    mode = str(body.get("mode", DEFAULT_MODE))
+    if mode not in MODES:
+        raise HttpError(400, f"mode は {', '.join(MODES)} のどれかです")
+
+    where = type_filter(str(body.get("type1", "")).strip(), str(body.get("type2", "")).strip())
+    docs, info = await asyncio.to_thread(
+        state.retriever.search, query, k=k, filter=where, mode=mode
+    )
+    result = {
+        "query": query,
+        "route": info.route,
+        "embedded": info.embedded,
+        "results": [{**doc.metadata, "content": doc.page_content} for doc in docs],
+    }
+    if body.get("token_budget") is not None:
+        # そのままプロンプトに載せられるよう、上位から token_budget トークンまで詰めた文脈も返す
+        try:
+            budget = int(body["token_budget"])
+        except (TypeError, ValueError):
+            raise HttpError(400, "token_budget は整数で指定してください")
+        packed = pack_documents(docs, budget=budget)
+        result["context"] = packed.render()
+        result["context_tokens"] = packed.tokens_used
+        result["context_dropped"] = packed.dropped + packed.duplicates
+    return result
+
+
+async def describe_entry(state: ServiceState, entry: Dict[str, Any]) -> str:
+    async with state.slots():
+        message = await state.zukan_chain.ainvoke(
+            {"pokedex_entry": format_entry_for_prompt(entry)}
+        )
+    return message.content
+
+
+async def handle_pokemon(state: ServiceState, params: Dict[str, Any]) -> Dict[str, Any]:
+    describe = str(params.get("describe", "")).lower() in ("1", "true", "yes")
+
+    if params.get("id") not in (None, ""):
+        try:
+            poke_id = int(params["id"])
+        except (TypeError, ValueError):
+            raise HttpError(400, "id は整数で指定してください")
+        entry = state.index.find_by_id(poke_id)
+        result = {"mode": "id", "matches": [entry] if entry else []}
+    else:
+        name = str(params.get("name", "")).strip()
+        if not name:
+            raise HttpError(400, "name か id を指定してください")
+        fuzzy = str(params.get("fuzzy", "1")).lower() not in ("0", "false", "no")
+        result = dict(state.index.search_by_name(name, fuzzy=fuzzy))
+
+    # 1件に決まったときだけ図鑑テキストを生成する（候補が複数なら一覧だけ返す）
+    if describe and result["mode"] in ("id", "exact", "partial") and len(result["matches"]) == 1:
+        result["description"] = await describe_entry(state, result["matches"][0])
+    return result
+
+
+async def handle_chat(state: ServiceState, body: Dict[str, Any]) -> Dict[str, Any]:
+    question = str(body.get("question", "")).strip()
+    if not question:
+        raise HttpError(400, "question が空です")
+    async with state.slots():
+        message = await state.chat_chain.ainvoke({"question": question})
+    return {"question": question, "answer": message.content}
+
+
+async def handle_health(state: ServiceState) -> Dict[str, Any]:
+    return {
+        "status": "ok",
+        "pokemon": len(state.index.entries),
+        "uptime": round(time.time() - state.started, 1),
+        "requests": state.requests,
+    }
+
+
+async def route(state: ServiceState, method: str, target: str, body: bytes) -> Dict[str, Any]:
+    url = urlsplit(target)
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    payload: Dict[str, Any] = {}
+    if method == "POST":
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HttpError(400, "本文が JSON ではありません")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "本文は JSON オブジェクトで送ってください")
+
+    routes = {
+        ("GET", "/health"): lambda: handle_health(state),
+        ("POST", "/search"): lambda: handle_search(state, payload),
+        ("GET", "/pokemon"): lambda: handle_pokemon(state, query),
+        ("POST", "/pokemon"): lambda: handle_pokemon(state, payload),
+        ("POST", "/chat"): lambda: handle_chat(state, payload),
+    }
+    handler = routes.get((method, url.path))
+    if handler is None:
+        if any(path == url.path for _, path in routes):
+            raise HttpError(405, f"{method} {url.path} には対応していません")
+        raise HttpError(404, f"{url.path} はありません")
+    return await handler()
+
+
+# --------------------------
+# 3. 最小限の HTTP/1.1（keep-alive 対応）
+# --------------------------
+async def read_request(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """1リクエスト分を読む。接続が閉じられたら None"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("utf-8", errors="replace").split()
+    except ValueError:
+        raise HttpError(400, "リクエスト行が不正です")
+
+    headers: Dict[str, str] = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    headers[":version"] = version
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HttpError(400, "Content-Length が整数ではありません")
+    if length < 0:
+        raise HttpError(400, "Content-Length が負の値です")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "本文が大きすぎます")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def encode_response(status: int, payload: Dict[str, Any], keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+def wants_keep_alive(headers: Dict[str, str]) -> bool:
+    connection = headers.get("connection", "").lower()
+    if headers.get(":version") == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+async def serve_connection(
+    state: ServiceState, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = wants_keep_alive(headers)
+                state.requests += 1
+                status, payload = 200, await route(state, method, target, body)
+            except HttpError as e:
+                status, payload = e.status, {"error": e.message}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:  # 1件の失敗でサービス全体を止めない
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            writer.write(encode_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def start_server(
+    state: ServiceState, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> asyncio.AbstractServer:
+    return await asyncio.start_server(
+        lambda r, w: serve_connection(state, r, w), host, port, limit=MAX_BODY_BYTES
+    )
+
+
+# --------------------------
+# 4. メイン処理
+# --------------------------
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ポケモン検索・チャットの常駐 HTTP サービス")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-llm", type=int, default=8, help="LLM の同時呼び出し数の上限")
+    parser.add_argument(
+        "--stand-in",
+        action="store_true",
+        help="OpenRouter の代わりに代替の埋め込み / チャットモデルを使う（API キー不要）",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="代替バックエンドの疑似遅延（秒）")
+    return parser.parse_args()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    if args.stand_in:
+        state = build_stand_in_state(latency=args.latency, max_llm=args.max_llm)
+    else:
+        state = build_openrouter_state(max_llm=args.max_llm)
+    server = await start_server(state, args.host, args.port)
+    print(
+        f"🚀 http://{args.host}:{args.port} で待ち受け中 "
+        f"（準備 {time.perf_counter() - started:.2f} 秒 / Ctrl+C で終了）"
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        print("\n終了します。")
+
+
+if __name__ == "__main__":
+    main()
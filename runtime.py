@@ -0,0 +1,203 @@
+# runtime.py
+"""
+重い import とクライアント生成を、実際に使う時まで遅らせるための共通部品。
+
+    langchain_openai = lazy_import("langchain_openai")   # ここではまだ import しない
+    chain = Lazy(build_chain, "chain")                     # ここではまだ作らない
+    ...
+    first_prompt()                                         # 最初の入力待ちの直前に呼ぶ
+    chain.get().invoke(...)                                # 初めて使うときに import + 生成
+
+- lazy_import / Lazy は、かかった時間を記録しておく
+- STARTUP_REPORT=1 なら、first_prompt() の時点で起動時間のレポートを標準エラーに出す
+  （モジュールごとの import 時間・生成にかかった時間・最初のプロンプトまでの時間）
+
+使い方（コマンドライン）:
+    python runtime.py                       # 重い依存とスクリプトを、それぞれ新しいプロセスで import して計る
+    python runtime.py main pokemon_search   # 指定したモジュールだけ
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# このモジュールが import された時刻（各スクリプトの起動時刻の代わりに使う）
+STARTED = time.perf_counter()
+
+# モジュール名 → import にかかった秒数（lazy_import 経由で実際に読み込んだものだけ）
+IMPORT_TIMES: Dict[str, float] = {}
+# Lazy の名前 → 生成にかかった秒数
+INIT_TIMES: Dict[str, float] = {}
+
+_first_prompt: Optional[float] = None
+_env_loaded = False
+_lock = threading.Lock()
+
+
+def report_enabled() -> bool:
+    return os.getenv("STARTUP_REPORT", "") not in ("", "0")
+
+
+# --------------------------
+# 1. 遅延 import
+# --------------------------
+def timed_import(name: str) -> ModuleType:
+    """import して、初めて読み込んだときだけ時間を IMPORT_TIMES に記録する"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+class _LazyModule(ModuleType):
+    """属性に初めて触れたときに本物のモジュールを import する代理"""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = timed_import(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """`import name` の代わり。モジュールの属性を使うまで import しない"""
+    return _LazyModule(name)
+
+
+def load_env() -> None:
+    """.env を1回だけ読み込む（dotenv もここで初めて import する）"""
+    global _env_loaded
+    if not _env_loaded:
+        timed_import("dotenv").load_dotenv()
+        _env_loaded = True
+
+
+# --------------------------
+# 2. 遅延生成
+# --------------------------
+class Lazy(Generic[T]):
+    """
+    factory() の結果を、初めて get() されたときに1回だけ作って持っておく。
+    複数スレッドから同時に get() されても factory は1回しか呼ばない。
+    """
+
+    def __init__(self, factory: Callable[[], T], name: Optional[str] = None) -> None:
+        self.factory = factory
+        self.name = name or getattr(factory, "__name__", "lazy")
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> T:
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    INIT_TIMES[self.name] = time.perf_counter() - start
+                    self._ready = True
+        return self._value  # type: ignore[return-value]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+
+# --------------------------
+# 3. 起動時間レポート
+# --------------------------
+def first_prompt() -> None:
+    """最初の入力待ちの直前に呼ぶ。2回目以降は何もしない"""
+    global _first_prompt
+    with _lock:
+        if _first_prompt is not None:
+            return
+        _first_prompt = time.perf_counter() - STARTED
+    if report_enabled():
+        print(format_startup_report(), file=sys.stderr)
+
+
+def format_startup_report() -> str:
+    lines = ["=== 起動時間 ==="]
+    if _first_prompt is not None:
+        lines.append(f"最初のプロンプトまで: {_first_prompt * 1000:.0f} ms")
+    lines.append(f"経過: {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+    for title, times in (("遅延 import", IMPORT_TIMES), ("遅延生成", INIT_TIMES)):
+        if times:
+            lines.append(f"{title}:")
+            for name, seconds in sorted(times.items(), key=lambda kv: -kv[1]):
+                lines.append(f"  {name:<32} {seconds * 1000:8.1f} ms")
+        else:
+            lines.append(f"{title}: なし")
+    return "\n".join(lines)
+
+
+# 新しいプロセスで import を計るときの既定の対象（重い依存 → このリポジトリのスクリプト）
+DEFAULT_TARGETS = [
+    "dotenv",
+    "networkx",
+    "langchain_openai",
+    "langchain_chroma",
+    "langchain_community.vectorstores",
+    "main",
+    "pokemon_search",
+    "pokemon_chroma_151_query",
+    "graph_rag",
+    "query_service",
+]
+
+
+def measure_cold_import(name: str, repeat: int = 3) -> float:
+    """新しいプロセスで name を import する時間（秒）。repeat 回の最小値"""
+    code = (
+        "import time; s = time.perf_counter(); import importlib; "
+        f"importlib.import_module({name!r}); print(time.perf_counter() - s)"
+    )
+    env = dict(os.environ, EMBEDDING_BACKEND=os.getenv("EMBEDDING_BACKEND", "local"))
+    best = float("inf")
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, env=env, stdin=subprocess.DEVNULL
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{name} を import できません: {result.stderr.strip().splitlines()[-1:]}")
+        best = min(best, float(result.stdout.strip().splitlines()[-1]))
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    targets = (argv if argv is not None else sys.argv[1:]) or DEFAULT_TARGETS
+    print("=== import 時間（新しいプロセスで計測、3回の最小） ===")
+    for name in targets:
+        try:
+            print(f"{name:<36} {measure_cold_import(name) * 1000:8.1f} ms")
+        except RuntimeError as e:
+            print(f"{name:<36} {'-':>8}    {e}")
+
+
+if __name__ == "__main__":
+    main()
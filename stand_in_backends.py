@@ -0,0 +1,99 @@
+# stand_in_backends.py
+"""
+OpenRouter を呼ばずに動かすための、決定的な代替バックエンド（テスト・ベンチマーク用）。
+
+- StandInEmbeddings : テキストのハッシュから作る正規化済みベクトル
+- StandInChatModel  : プロンプトの先頭を使って決まった応答を返すチャットモデル
+
+どちらも latency（秒）を指定すると、その分だけ待ってからネットワーク越しの呼び出しを真似る。
+"""
+import hashlib
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StandInEmbeddings(Embeddings):
+    """同じテキストには常に同じベクトルを返す埋め込み（呼び出し回数も数える）"""
+
+    def __init__(self, dimensions: int = 64, latency: float = 0.0) -> None:
+        self.model = "stand-in-embedding"
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        values: List[float] = []
+        counter = 0
+        while len(values) < self.dimensions:
+            digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend((b - 127.5) / 127.5 for b in digest)
+            counter += 1
+        values = values[: self.dimensions]
+        norm = sum(v * v for v in values) ** 0.5 or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class StandInChatModel(BaseChatModel):
+    """最後のメッセージの先頭を引用して返すだけのチャットモデル"""
+
+    latency: float = 0.0  # 最初のトークンが返るまでの秒数
+    token_latency: float = 0.0  # ストリーミング時の1トークンごとの待ち時間
+    model_name: str = "stand-in-chat"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        last = messages[-1].content if messages else ""
+        text = last if isinstance(last, str) else str(last)
+        return f"[stand-in] {text[:60]}"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        answer = self._answer(messages)
+        usage = {"input_tokens": 0, "output_tokens": len(answer), "total_tokens": len(answer)}
+        message = AIMessage(content=answer, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        answer = self._answer(messages)
+        for i in range(0, len(answer), 4):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=answer[i : i + 4]))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
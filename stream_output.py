@@ -0,0 +1,113 @@
+# stream_output.py
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from llm_cache import describe_chain, entry_fingerprint, entry_key
+
+
+@dataclass
+class TurnTiming:
+    """1回の応答にかかった時間"""
+
+    first_token: Optional[float]  # 最初のトークンが届くまでの秒数
+    total: float  # 応答が最後まで届くまでの秒数
+    streamed: bool
+    cached: bool = False
+
+    def format(self) -> str:
+        if self.cached:
+            return f"（キャッシュから {self.total * 1000:.1f} ミリ秒）"
+        if self.streamed and self.first_token is not None:
+            return f"（最初のトークンまで {self.first_token:.2f} 秒 / 合計 {self.total:.2f} 秒）"
+        return f"（合計 {self.total:.2f} 秒）"
+
+
+def streaming_enabled(argv: Optional[list] = None) -> bool:
+    """
+    ストリーミング表示を使うかどうか。
+    --no-stream 引数、または環境変数 STREAM_OUTPUT=0 で従来の一括表示に戻せる。
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--no-stream", action="store_true")
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.no_stream:
+        return False
+    return os.getenv("STREAM_OUTPUT", "1") != "0"
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    # content がブロックのリストで返ってくるモデル向け
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+    )
+
+
+def print_response(
+    chain,
+    inputs: Dict[str, Any],
+    header: str,
+    stream: bool = True,
+    show_timing: bool = True,
+    cache=None,
+    entry: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, TurnTiming]:
+    """
+    chain の応答を表示して、(全文, 時間) を返す。
+
+    - stream=True なら chain.stream() で届いたトークンから順に表示する
+    - stream=False なら従来どおり chain.invoke() の結果をまとめて表示する
+    - cache（LLMResponseCache）を渡すと、同じプロンプトの応答はキャッシュから返す。
+      entry を渡すと、その図鑑エントリが変わったときに古い応答を使わない
+    """
+    started = time.perf_counter()
+    first_token: Optional[float] = None
+
+    if cache is not None:
+        model_name, prompt_text, params = describe_chain(chain, inputs)
+        entry_hash = entry_fingerprint(entry) if entry is not None else None
+        cached = cache.lookup(model_name, prompt_text, params, entry_hash=entry_hash)
+        if cached is not None:
+            print(header + cached)
+            timing = TurnTiming(0.0, time.perf_counter() - started, False, cached=True)
+            if show_timing:
+                print(timing.format())
+            return cached, timing
+
+    print(header, end="", flush=True)
+    if stream:
+        parts = []
+        for chunk in chain.stream(inputs):
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(text)
+            print(text, end="", flush=True)
+        print()
+        answer = "".join(parts)
+    else:
+        answer = _chunk_text(chain.invoke(inputs))
+        print(answer)
+
+    timing = TurnTiming(first_token, time.perf_counter() - started, stream)
+    if cache is not None and answer:
+        cache.store(
+            model_name,
+            prompt_text,
+            params,
+            answer,
+            entry_key=entry_key(entry) if entry is not None else None,
+            entry_hash=entry_hash,
+        )
+    if show_timing:
+        print(timing.format())
+    return answer, timing
@@ -0,0 +1,30 @@
+# tests/conftest.py
+# リポジトリ直下のスクリプトを、どこから pytest を実行しても import できるようにする
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Chroma の利用統計送信を止める（テストはネットワークを使わない）
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+
+@pytest.fixture
+def make_chroma(tmp_path):
+    """一時ディレクトリに永続化する Chroma を作る。埋め込みは StandInEmbeddings（呼び出し回数を数える）"""
+    from langchain_chroma import Chroma
+
+    from stand_in_backends import StandInEmbeddings
+
+    def make(name: str = "test", embedding=None):
+        return Chroma(
+            collection_name=name,
+            embedding_function=embedding or StandInEmbeddings(),
+            persist_directory=str(tmp_path / "chroma"),
+        )
+
+    return make
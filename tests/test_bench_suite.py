@@ -0,0 +1,41 @@
+# tests/test_bench_suite.py
+import json
+import os
+
+import pytest
+
+import bench_suite
+import graph_rag
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_summarize_percentiles():
+    m = bench_suite.summarize([0.001 * i for i in range(1, 101)], elapsed=2.0)
+    assert m["count"] == 100
+    assert m["throughput_per_s"] == 50.0
+    assert m["p50_ms"] == pytest.approx(50.5)
+    assert m["p99_ms"] == pytest.approx(99.01)
+    assert bench_suite.summarize([], elapsed=1.0)["p50_ms"] == 0.0
+
+
+def test_small_run_writes_a_comparable_report(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)  # 語彙は同梱の CSV から読む
+    sample_docs = graph_rag.documents
+    first = tmp_path / "first.json"
+    bench_suite.main(["--docs", "40", "--queries", "3", "--output", str(first)])
+
+    report = json.loads(first.read_text(encoding="utf-8"))
+    run = report["runs"]["40"]
+    assert set(run) == set(bench_suite.FLOWS)
+    metrics = dict(bench_suite.iter_metrics(run))
+    assert {"ingest", "search", "name.exact", "name.fuzzy", "prompt.graph_rag"} <= set(metrics)
+    assert metrics["search"]["count"] == 3
+    # 差し替えた graph_rag のデータは測り終わったら元に戻る
+    assert graph_rag.documents is sample_docs
+
+    bench_suite.main(
+        ["--docs", "40", "--queries", "3", "--flows", "name", "--output", str(tmp_path / "second.json"),
+         "--compare", str(first)]
+    )
+    assert "前回比" in capsys.readouterr().out
@@ -0,0 +1,52 @@
+# tests/test_chroma_sync.py
+from chroma_sync import HASH_KEY, content_hash, sync_collection
+from stand_in_backends import StandInEmbeddings
+
+DOCS = [
+    ("pokemon-1", "フシギダネ", {"type1": "grass"}),
+    ("pokemon-4", "ヒトカゲ", {"type1": "fire"}),
+    ("pokemon-7", "ゼニガメ", {"type1": "water"}),
+]
+
+
+def test_content_hash_depends_on_text_and_metadata():
+    base = content_hash("a", {"x": 1})
+    assert base == content_hash("a", {"x": 1})
+    assert base != content_hash("b", {"x": 1})
+    assert base != content_hash("a", {"x": 2})
+
+
+def test_resync_skips_unchanged_rows(make_chroma):
+    emb = StandInEmbeddings()
+    db = make_chroma(embedding=emb)
+
+    assert sync_collection(db, DOCS) == {"upserted": 3, "unchanged": 0, "deleted": 0}
+    embedded = emb.texts_embedded
+
+    assert sync_collection(db, DOCS) == {"upserted": 0, "unchanged": 3, "deleted": 0}
+    assert emb.texts_embedded == embedded
+
+
+def test_changed_rows_are_reembedded_and_missing_rows_deleted(make_chroma):
+    emb = StandInEmbeddings()
+    db = make_chroma(embedding=emb)
+    sync_collection(db, DOCS)
+    embedded = emb.texts_embedded
+
+    changed = [DOCS[0], ("pokemon-4", "リザード", {"type1": "fire"})]
+    stats = sync_collection(db, changed)
+
+    assert stats == {"upserted": 1, "unchanged": 1, "deleted": 1}
+    assert emb.texts_embedded == embedded + 1
+    result = db.get(include=["documents", "metadatas"])
+    stored = dict(zip(result["ids"], result["documents"]))
+    assert stored == {"pokemon-1": "フシギダネ", "pokemon-4": "リザード"}
+    assert all(HASH_KEY in meta for meta in result["metadatas"])
+
+
+def test_delete_missing_false_keeps_rows(make_chroma):
+    db = make_chroma()
+    sync_collection(db, DOCS)
+    stats = sync_collection(db, DOCS[:1], delete_missing=False)
+    assert stats["deleted"] == 0
+    assert len(db.get(include=[])["ids"]) == 3
@@ -0,0 +1,109 @@
+# tests/test_context_packer.py
+import random
+
+import pytest
+import tiktoken
+from langchain_core.documents import Document
+
+from context_packer import TokenCounter, pack_context, pack_documents
+
+
+@pytest.fixture
+def counter():
+    return TokenCounter(backend="estimate")
+
+
+class GluedEllipsisCounter(TokenCounter):
+    """「…」を後ろに付けると1トークン余計にかかる（tiktoken で切れ目が変わる場合のまね）"""
+
+    def count(self, text: str) -> int:
+        return super().count(text) + (1 if text.endswith("…") and len(text) > 1 else 0)
+
+
+def random_text(rng: random.Random) -> str:
+    words = ["ピカチュウは", "でんきを", "ためる。", "Pikachu stores electricity. ", "ほのおの", "しっぽ！", "\n"]
+    return "".join(rng.choice(words) for _ in range(rng.randrange(1, 40)))
+
+
+@pytest.mark.parametrize("budget", [1, 5, 40, 200])
+def test_packing_never_exceeds_the_budget(counter, budget):
+    rng = random.Random(budget)
+    docs = [(f"d{i}", random_text(rng), rng.random()) for i in range(30)]
+    packed = pack_context(docs, budget=budget, counter=counter, min_tokens=0)
+
+    assert packed.tokens_used <= budget
+    assert counter.count(packed.render()) <= budget
+    assert all(item.text for item in packed.items)
+    listed = [i.doc_id for i in packed.items] + packed.dropped + packed.duplicates
+    assert sorted(listed) == sorted(d for d, _, _ in docs)
+
+
+def test_highest_scores_first_and_duplicates_removed(counter):
+    docs = [
+        ("low", "ゼニガメは みずを はく。", 0.1),
+        ("high", "ピカチュウは でんきを ためる。ほっぺが あかい。", 0.9),
+        ("dup", "ほっぺが あかい。", 0.5),
+    ]
+    packed = pack_context(docs, budget=100, counter=counter)
+    assert [i.doc_id for i in packed.items] == ["high", "low"]
+    assert packed.duplicates == ["dup"]
+    assert "[high] ピカチュウは" in packed.render()
+
+
+def test_truncation_reserves_room_for_the_ellipsis():
+    counter = GluedEllipsisCounter(backend="estimate")
+    text = "ピカチュウはでんきをためるねずみポケモンでほっぺのでんきぶくろがとくちょう"
+    packed = pack_context([("d", text, 1.0)], budget=10, counter=counter, min_tokens=0)
+
+    item = packed.items[0]
+    assert item.trimmed and item.text.endswith("…")
+    assert counter.count(packed.render()) <= 10
+    assert text.startswith(item.text[:-1])
+
+
+@pytest.mark.parametrize("budget", [20, 60, 300])
+def test_rendered_template_and_separators_count_against_the_budget(counter, budget):
+    rng = random.Random(budget)
+    docs = [(f"pokemon-{i}", random_text(rng), rng.random()) for i in range(20)]
+    template, separator = "### {doc_id}\n{text}", "\n\n---\n\n"
+    packed = pack_context(docs, budget=budget, counter=counter, min_tokens=0, template=template, separator=separator)
+
+    rendered = packed.render()
+    assert rendered.count("---") == len(packed.items) - 1
+    assert counter.count(rendered) <= packed.tokens_used <= budget
+    first = packed.items[0]
+    assert first.tokens == counter.count(template.format(doc_id=first.doc_id, text=first.text))
+
+
+def test_tokens_used_reports_the_rendered_prompt(counter):
+    docs = [("a", "ピカチュウは でんきを ためる。", 1.0), ("b", "ゼニガメは みずを はく。", 0.5)]
+    packed = pack_context(docs, budget=100, counter=counter)
+    # 本文だけでなく [doc_id] と区切りの改行も数える
+    expected = counter.count("[a] ピカチュウは でんきを ためる。") + counter.count("\n") + counter.count(
+        "[b] ゼニガメは みずを はく。"
+    )
+    assert packed.tokens_used == expected
+    assert packed.tokens_used >= counter.count(packed.render())
+
+
+def test_documents_keep_their_rank(counter):
+    docs = [Document(id="a", page_content="いちばん。"), Document(id="b", page_content="にばん。")]
+    packed = pack_documents(docs, budget=100, counter=counter)
+    assert [i.doc_id for i in packed.items] == ["a", "b"]
+
+
+def test_tiktoken_load_failure_falls_back_to_the_estimate(monkeypatch):
+    def offline(name):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    counter = TokenCounter()
+    assert counter.name == "estimate"
+    assert "offline" in counter.fallback_reason
+    assert counter.count("ピカチュウ") == 5
+    assert counter.truncate("ピカチュウ", 2) == "ピカ"
+
+
+def test_estimate_backend_does_not_touch_tiktoken(monkeypatch):
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: pytest.fail("loaded tiktoken"))
+    assert TokenCounter(backend="estimate").fallback_reason is None
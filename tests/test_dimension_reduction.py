@@ -0,0 +1,117 @@
+# tests/test_dimension_reduction.py
+import numpy as np
+import pytest
+
+from dimension_reduction import (
+    PCAProjection,
+    ProjectedEmbeddings,
+    _normalize_rows,
+    default_dimensions,
+    dimension_mode,
+    dimension_suffix,
+    load_dimension_settings,
+    resolve_dimension_settings,
+    save_dimension_settings,
+    sync_projected,
+)
+from quantized_vectors import make_synthetic
+from stand_in_backends import StandInEmbeddings
+
+
+@pytest.mark.parametrize("count", [500, 20])  # 件数 > 次元数は固有値分解、それ以外は SVD
+def test_full_rank_projection_keeps_cosines(count):
+    matrix = make_synthetic(count, 32, clusters=8)
+    projection = PCAProjection.fit(matrix, 32)
+    projected = projection.transform(matrix)
+
+    if count > 32:
+        # 全次元なら回転なので、コサイン類似度は変わらない
+        np.testing.assert_allclose(projected @ projected.T, matrix @ matrix.T, atol=1e-4)
+    assert projection.dimensions == min(count, 32)
+    np.testing.assert_allclose(np.linalg.norm(projected, axis=1), 1.0, rtol=1e-5)
+    assert projection.explained.sum() == pytest.approx(1.0, abs=1e-4)
+    assert list(projection.explained) == sorted(projection.explained, reverse=True)
+
+
+def test_reduced_projection_keeps_nearest_neighbours():
+    matrix = make_synthetic(2000, 64, clusters=16)
+    projection = PCAProjection.fit(matrix, 24)
+    projected = projection.transform(matrix)
+    queries = _normalize_rows(matrix[:50] + 0.05)
+
+    full_top = np.argmax(matrix @ queries.T, axis=0)
+    reduced_top = np.argmax(projected @ projection.transform(queries).T, axis=0)
+    assert np.mean(full_top == reduced_top) >= 0.8
+
+
+def test_round_trip_through_the_file(tmp_path):
+    matrix = make_synthetic(100, 16)
+    projection = PCAProjection.fit(matrix, 8)
+    path = str(tmp_path / "c.pca.npz")
+    projection.save(path)
+
+    loaded = PCAProjection.load(path)
+    np.testing.assert_array_equal(loaded.components, projection.components)
+    np.testing.assert_array_equal(loaded.transform(matrix), projection.transform(matrix))
+    with pytest.raises(RuntimeError):
+        PCAProjection.load(str(tmp_path / "missing.pca.npz"))
+
+
+def test_fit_rejects_empty_input():
+    with pytest.raises(ValueError):
+        PCAProjection.fit([], 8)
+    with pytest.raises(ValueError):
+        PCAProjection.fit(np.zeros((0, 16)), 8)
+
+
+def test_settings_are_recorded_and_resolved(tmp_path, monkeypatch):
+    monkeypatch.delenv("EMBEDDING_DIM_MODE", raising=False)
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    persist = str(tmp_path / "chroma")
+    assert resolve_dimension_settings(persist, "c") == ("full", 256)
+
+    save_dimension_settings(persist, "c", "native", 128)
+    save_dimension_settings(persist, "c", "pca", 64)
+    assert load_dimension_settings(persist, "c") == {"mode": "pca", "dimensions": {"native": 128, "pca": 64}}
+
+    assert resolve_dimension_settings(persist, "c") == ("pca", 64)
+    assert resolve_dimension_settings(persist, "c", mode="native") == ("native", 128)
+    monkeypatch.setenv("EMBEDDING_DIM_MODE", "native")
+    assert resolve_dimension_settings(persist, "c") == ("native", 128)
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "32")
+    assert resolve_dimension_settings(persist, "c") == ("native", 32)
+    assert resolve_dimension_settings(persist, "other") == ("native", 32)
+
+
+def test_sync_projected_pages_without_embedding(make_chroma):
+    emb = StandInEmbeddings(dimensions=32)
+    source = make_chroma("source", emb)
+    source.add_texts([f"本文 {i}" for i in range(25)], [{"n": i} for i in range(25)], ids=[f"d{i}" for i in range(25)])
+    vectors = source.get(include=["embeddings"])["embeddings"]
+    projection = PCAProjection.fit(vectors, 8)
+
+    target = make_chroma("target", ProjectedEmbeddings(emb, projection))
+    target.add_texts(["古い"], ids=["gone"])
+    calls = emb.calls
+
+    assert sync_projected(source, target, projection, batch_size=7) == {"written": 25, "deleted": 1}
+    assert emb.calls == calls
+    stored = target.get(ids=["d3"], include=["embeddings", "documents", "metadatas"])
+    assert stored["documents"] == ["本文 3"] and stored["metadatas"] == [{"n": 3}]
+    np.testing.assert_allclose(stored["embeddings"][0], projection.transform([emb.embed_query("本文 3")])[0], atol=1e-5)
+    assert target.similarity_search("本文 3", k=1)[0].id == "d3"
+    assert len(target.get(include=[])["ids"]) == 25
+
+
+def test_ingest_and_query_read_the_same_environment(tmp_path, monkeypatch):
+    # .env は import の後で読まれるので、取り込み側も呼んだ時点の環境変数を見る
+    monkeypatch.delenv("EMBEDDING_DIM_MODE", raising=False)
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    assert (dimension_mode(), default_dimensions(), dimension_suffix()) == ("full", 256, "")
+
+    monkeypatch.setenv("EMBEDDING_DIM_MODE", "pca")
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "48")
+    assert (dimension_mode(), default_dimensions(), dimension_suffix()) == ("pca", 48, "_pca48")
+    assert resolve_dimension_settings(str(tmp_path), "c") == ("pca", 48)
+    with pytest.raises(RuntimeError):
+        dimension_mode("nope")
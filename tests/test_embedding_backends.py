@@ -0,0 +1,66 @@
+# tests/test_embedding_backends.py
+import numpy as np
+import pytest
+
+from embedding_backends import (
+    HashedNgramEmbeddings,
+    build_embeddings,
+    collection_suffix,
+    embedding_backend,
+)
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_vectors_are_deterministic_and_normalized():
+    texts = ["ピカチュウ でんき", "Bulbasaur seed", "", "、。"]
+    first = HashedNgramEmbeddings(dimensions=64).embed_array(texts)
+    second = HashedNgramEmbeddings(dimensions=64).embed_array(texts)
+
+    np.testing.assert_array_equal(first, second)
+    assert first.shape == (4, 64) and first.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(first[:2], axis=1), 1.0, rtol=1e-5)
+    assert not first[2:].any()  # 単語の無いテキストは 0 ベクトル
+
+
+def test_batching_does_not_change_the_result():
+    texts = [f"ポケモン {i} ばんめ" for i in range(25)]
+    whole = HashedNgramEmbeddings(dimensions=32).embed_array(texts)
+    small = HashedNgramEmbeddings(dimensions=32, batch_size=4).embed_array(texts)
+    np.testing.assert_array_equal(whole, small)
+    one = HashedNgramEmbeddings(dimensions=32).embed_query(texts[7])
+    assert one == pytest.approx(whole[7].tolist())
+
+
+def test_folded_variants_match_and_unrelated_text_does_not():
+    emb = HashedNgramEmbeddings(dimensions=256)
+    a, b, c = emb.embed_documents(["ぴかちゅう", "ピカチュウ", "ゼニガメ"])
+    assert cosine(a, b) == pytest.approx(1.0)
+    assert cosine(a, c) < 0.5
+
+
+def test_build_embeddings_local():
+    emb = build_embeddings("local", dimensions=48)
+    assert isinstance(emb, HashedNgramEmbeddings)
+    assert len(emb.embed_query("x")) == 48
+    assert collection_suffix("local") == "_local"
+    with pytest.raises(RuntimeError):
+        embedding_backend("nope")
+
+
+def test_settings_are_read_when_called(monkeypatch):
+    # .env は import の後（main の load_env()）で読まれるので、import 時の値に固定しない
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    monkeypatch.delenv("LOCAL_EMBEDDING_DIM", raising=False)
+    assert embedding_backend() == "openrouter"
+    assert collection_suffix() == ""
+
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_EMBEDDING_DIM", "40")
+    assert embedding_backend() == "local"
+    assert collection_suffix() == "_local"
+    assert embedding_backend("openrouter") == "openrouter"
+    emb = build_embeddings()
+    assert isinstance(emb, HashedNgramEmbeddings) and emb.dimensions == 40
@@ -0,0 +1,115 @@
+# tests/test_embedding_cache.py
+import pytest
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, QueryEmbeddingLRU
+from stand_in_backends import StandInEmbeddings
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "emb.sqlite3")
+
+
+def test_hits_skip_the_underlying_model(cache_path):
+    emb = StandInEmbeddings()
+    cached = CachedEmbeddings(emb, path=cache_path)
+
+    first = cached.embed_documents(["a", "b", "a"])
+    assert emb.texts_embedded == 2  # 重複は1回だけ埋め込む
+    second = cached.embed_documents(["b", "a"])
+
+    assert emb.texts_embedded == 2
+    assert second[0] == pytest.approx(first[1], abs=1e-6)
+    assert second[1] == pytest.approx(first[0], abs=1e-6)
+    assert cached.stats()["hits"] == 2
+    assert cached.stats()["misses"] == 3
+
+
+def test_vectors_survive_a_new_instance(cache_path):
+    vec = CachedEmbeddings(StandInEmbeddings(), path=cache_path).embed_query("ピカチュウ")
+    emb = StandInEmbeddings()
+    again = CachedEmbeddings(emb, path=cache_path).embed_query("ピカチュウ")
+    assert emb.calls == 0
+    assert again == pytest.approx(vec, abs=1e-6)
+
+
+def test_dimensions_are_part_of_the_key(cache_path):
+    CachedEmbeddings(StandInEmbeddings(dimensions=8), path=cache_path).embed_query("x")
+    emb = StandInEmbeddings(dimensions=16)
+    vec = CachedEmbeddings(emb, path=cache_path).embed_query("x")
+    assert emb.calls == 1
+    assert len(vec) == 16
+
+
+def test_least_recently_used_rows_are_evicted(cache_path):
+    # 1件 = 8次元 × 4バイト。3件を超えたら古いものから消える
+    cached = CachedEmbeddings(StandInEmbeddings(dimensions=8), path=cache_path, max_bytes=32 * 3)
+    cached.embed_documents(["a", "b", "c"])
+    cached.embed_query("a")  # a を最近使ったことにする
+    cached.embed_query("d")
+
+    assert cached.stats()["entries"] <= 3
+    misses = cached.misses
+    cached.embed_query("a")
+    assert cached.misses == misses  # a は残っている
+    cached.embed_query("b")
+    assert cached.misses == misses + 1  # b は消えている
+
+
+class RecordingEmbeddings(StandInEmbeddings):
+    def __init__(self) -> None:
+        super().__init__()
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+def test_query_lru_hits_on_normalized_text_but_embeds_the_original():
+    emb = RecordingEmbeddings()
+    lru = QueryEmbeddingLRU(emb, max_size=8)
+
+    first = lru.embed_query("  ＰＩＫＡ  chu ")
+    second = lru.embed_query("PIKA chu")
+
+    assert emb.queries == ["  ＰＩＫＡ  chu "]
+    assert second == first
+    assert lru.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_query_lru_returns_copies():
+    lru = QueryEmbeddingLRU(StandInEmbeddings(), max_size=8)
+    vec = lru.embed_query("a")
+    expected = list(vec)
+    vec[0] = 99.0
+    lru.embed_query("a")[1] = 99.0
+    assert lru.embed_query("a") == expected
+
+
+def test_query_lru_evicts_least_recently_used():
+    emb = StandInEmbeddings()
+    lru = QueryEmbeddingLRU(emb, max_size=2)
+    lru.embed_query("a")
+    lru.embed_query("b")
+    lru.embed_query("a")
+    lru.embed_query("c")  # b が捨てられる
+    calls = emb.calls
+    lru.embed_query("a")
+    assert emb.calls == calls
+    lru.embed_query("b")
+    assert emb.calls == calls + 1
+
+
+def test_query_lru_ttl_expires_entries(monkeypatch):
+    emb = StandInEmbeddings()
+    lru = QueryEmbeddingLRU(emb, max_size=8, ttl=10)
+    clock = [100.0]
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: clock[0])
+    lru.embed_query("a")
+    clock[0] += 5
+    lru.embed_query("a")
+    clock[0] += 20
+    lru.embed_query("a")
+    assert emb.calls == 2
@@ -0,0 +1,190 @@
+# tests/test_fetch_pokemon.py
+# ローカルの代替 PokeAPI サーバーに対して fetch_pokemon_151_with_image を動かす
+import csv
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import baseline_fetch_pokemon as baseline
+import fetch_pokemon_151_with_image as fetch
+
+
+class FakePokeApi:
+    """/pokemon/<id> と /pokemon-species/<id> を返す代替サーバー（ETag 付き）"""
+
+    def __init__(self) -> None:
+        self.failing: set = set()
+        self.requests = 0
+        self.not_modified = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                api.requests += 1
+                kind, poke_id = self.path.strip("/").split("/")[-2:]
+                poke_id = int(poke_id)
+                if poke_id in api.failing:
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{kind}-{poke_id}"'
+                if self.headers.get("If-None-Match") == etag:
+                    api.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = json.dumps(api.body(kind, poke_id)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def body(self, kind: str, poke_id: int) -> dict:
+        """ID ごとに、タイプ2つ・公式絵の有無・日本語の無い項目などを混ぜる"""
+        if kind == "pokemon":
+            types = [{"type": {"name": "grass"}}]
+            if poke_id % 3 == 0:
+                types.append({"type": {"name": "poison"}})
+            sprites = {"front_default": f"http://img/{poke_id}.png"}
+            if poke_id % 5 == 0:
+                sprites["other"] = {"official-artwork": {"front_default": f"http://art/{poke_id}.png"}}
+            return {
+                "name": f"mon{poke_id}",
+                "types": types,
+                "sprites": sprites,
+                "species": {"url": f"{self.base_url}/pokemon-species/{poke_id}"},
+            }
+        names = [{"language": {"name": "en"}, "name": f"Mon{poke_id}"}]
+        if poke_id % 13:
+            names.append({"language": {"name": "ja-Hrkt" if poke_id % 7 == 0 else "ja"}, "name": f"モン{poke_id}"})
+        flavors = [{"language": {"name": "en"}, "flavor_text": f"text {poke_id}"}]
+        if poke_id % 11:
+            flavors.append({"language": {"name": "ja"}, "flavor_text": f"せつめい\n{poke_id}\u3000です"})
+            flavors.append({"language": {"name": "ja-Hrkt"}, "flavor_text": "2つめ"})
+        return {"names": names, "flavor_text_entries": flavors}
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def api():
+    server = FakePokeApi()
+    yield server
+    server.close()
+
+
+def run(api, tmp_path, *extra):
+    fetch.main(
+        [
+            "--base-url", api.base_url,
+            "--rate", "10000",
+            "--burst", "100",
+            "--output", str(tmp_path / "out.csv"),
+            "--cache-dir", str(tmp_path / "cache"),
+            "--checkpoint", str(tmp_path / "checkpoint.jsonl"),
+            *extra,
+        ]
+    )
+
+
+def read_ids(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [int(row["id"]) for row in csv.DictReader(f)]
+
+
+def test_fetch_writes_all_rows(api, tmp_path):
+    run(api, tmp_path)
+    with open(tmp_path / "out.csv", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r["id"]) for r in rows] == list(range(1, 152))
+    assert rows[0]["name_jp"] == "モン1"
+    assert rows[0]["description"] == "せつめい 1 です"
+    assert not (tmp_path / "checkpoint.jsonl").exists()
+
+
+def test_csv_matches_the_baseline_script(api, tmp_path, monkeypatch):
+    # 前の実装を同じ代替サーバーに向け、待ち時間だけ無くして CSV を作る
+    expected = tmp_path / "baseline.csv"
+    monkeypatch.setattr(baseline, "OUTPUT_CSV", str(expected))
+    monkeypatch.setattr(
+        baseline,
+        "requests",
+        SimpleNamespace(get=lambda url: requests.get(url.replace("https://pokeapi.co/api/v2", api.base_url))),
+    )
+    monkeypatch.setattr(baseline, "time", SimpleNamespace(sleep=lambda seconds: None))
+    baseline.main()
+
+    run(api, tmp_path, "--workers", "8")
+    # 列の順番・行の順番・値（改行コードも含めて）がまったく同じ
+    assert (tmp_path / "out.csv").read_bytes() == expected.read_bytes()
+    with open(expected, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert (rows[2]["type2"], rows[4]["image_url"], rows[10]["description"], rows[12]["name_jp"]) == (
+        "poison", "http://art/5.png", "", ""
+    )
+
+
+def test_second_run_uses_etag(api, tmp_path):
+    run(api, tmp_path)
+    run(api, tmp_path, "--restart")
+    assert api.not_modified == 151 * 2
+
+
+def test_failure_keeps_previous_csv_and_resumes(api, tmp_path):
+    out = tmp_path / "out.csv"
+    out.write_text("id,name_jp\n1,old\n", encoding="utf-8")
+    api.failing = {7, 42}
+
+    with pytest.raises(SystemExit) as exc:
+        run(api, tmp_path)
+    assert exc.value.code == 1
+    assert out.read_text(encoding="utf-8") == "id,name_jp\n1,old\n"
+
+    # 再実行では失敗した2件だけを取り直す
+    api.failing = set()
+    api.requests = 0
+    run(api, tmp_path, "--no-cache")
+    assert api.requests == 4
+    assert read_ids(out) == list(range(1, 152))
+
+
+def test_checkpoint_recovers_from_truncated_line(tmp_path):
+    checkpoint = fetch.Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.append({"id": 1})
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"id": 2, "na')  # 書き込み途中で落ちた行
+    checkpoint.append({"id": 3})
+    assert sorted(checkpoint.load()) == [1, 3]
+
+
+def test_token_bucket_limits_rate():
+    bucket = fetch.TokenBucket(rate=200, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - start >= 10 / 200 * 0.9
+
+
+def test_token_bucket_allows_burst():
+    bucket = fetch.TokenBucket(rate=1, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,59 @@
+# tests/test_graph_csr.py
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from graph_csr import CompiledGraph
+from graph_rag import GraphConfig, build_knowledge_graph, documents, extract_subgraph_docs
+
+
+def random_graph(seed: int, nodes: int = 300, edges: int = 600, docs: int = 150) -> nx.DiGraph:
+    rng = random.Random(seed)
+    G = nx.DiGraph()
+    for i in range(nodes):
+        # 64 doc の境界をまたぐよう、doc は 150 個から選ぶ
+        G.add_node(f"n{i}", docs={f"d{rng.randrange(docs)}" for _ in range(rng.randrange(4))})
+    for _ in range(edges):
+        u, v = rng.randrange(nodes), rng.randrange(nodes)
+        G.add_edge(f"n{u}", f"n{v}")
+    return G
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("hops", [0, 1, 2, 3])
+def test_matches_the_networkx_walk(seed, hops):
+    G = random_graph(seed)
+    compiled = CompiledGraph.from_networkx(G)
+    all_docs = {f"d{i}": "" for i in range(150)}
+    starts = [f"n{i}" for i in random.Random(seed).sample(range(300), 3)] + ["missing"]
+    config = GraphConfig(query_related_nodes=starts, hops=hops)
+
+    expected = extract_subgraph_docs(G, config, all_docs)
+    assert extract_subgraph_docs(compiled, config, all_docs) == expected
+    assert compiled.related_doc_ids(starts, hops) == sorted(expected)
+
+
+def test_csr_layout_on_the_sample_graph():
+    G = build_knowledge_graph()
+    compiled = CompiledGraph.from_networkx(G)
+    assert len(compiled) == G.number_of_nodes()
+    assert compiled.num_edges == 2 * G.number_of_edges()  # 向きを無視して両方向に持つ
+
+    node = compiled.node_index["夜間救急の受付"]
+    neighbors = {compiled.nodes[i] for i in compiled.neighbors(np.array([node]))}
+    assert neighbors == set(G.predecessors("夜間救急の受付")) | set(G.successors("夜間救急の受付"))
+
+    config = GraphConfig(query_related_nodes=["旧システム"], hops=1)
+    assert extract_subgraph_docs(compiled, config) == {k: documents[k] for k in ("doc_1", "doc_2")}
+
+
+def test_unknown_start_nodes_and_isolated_nodes():
+    G = nx.DiGraph()
+    G.add_node("a", docs={"x"})
+    G.add_node("b")
+    compiled = CompiledGraph.from_networkx(G)
+    assert compiled.related_doc_ids(["missing"]) == []
+    assert compiled.related_doc_ids(["b"], hops=3) == []
+    assert compiled.related_doc_ids(["a", "b"]) == ["x"]
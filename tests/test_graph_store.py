@@ -0,0 +1,71 @@
+# tests/test_graph_store.py
+import json
+
+import pytest
+
+from graph_store import KnowledgeGraphStore, build_extraction_chain, ingest, parse_extraction
+from stand_in_backends import StandInChatModel
+
+
+class KeywordExtractor(StandInChatModel):
+    """本文の「A→B」を関係として返す抽出器。"失敗" を含む本文ではエラーにする"""
+
+    model_name: str = "keyword-extractor"
+    calls: int = 0
+
+    def _answer(self, messages):
+        self.calls += 1
+        text = messages[-1].content
+        if "失敗" in text:
+            raise RuntimeError("extraction failed")
+        relations = []
+        for part in text.split():
+            if "→" in part:
+                source, target = part.split("→")
+                relations.append({"source": source, "relation": "leads_to", "target": target})
+        return "```json\n" + json.dumps({"entities": [], "relations": relations}, ensure_ascii=False) + "\n```"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KnowledgeGraphStore(str(tmp_path / "graph.sqlite3"))
+
+
+def test_parse_extraction_tolerates_wrapping():
+    result = parse_extraction('結果です {"entities": ["A", " "], "relations": [{"source": "B", "target": "C"}, {"source": ""}]}')
+    assert result == {"entities": ["A", "B", "C"], "relations": [{"source": "B", "relation": "", "target": "C"}]}
+    with pytest.raises(ValueError):
+        parse_extraction("JSON なし")
+
+
+def test_ingest_skips_unchanged_and_reuses_cached_extractions(store):
+    model = KeywordExtractor()
+    chain = build_extraction_chain(model)
+    docs = {"d1": "旧システム→遅延", "d2": "新システム→短縮 自動入力→短縮"}
+
+    assert ingest(store, docs, chain, batch_size=1)["extracted"] == 2
+    G = store.load_graph()
+    assert set(G.edges) == {("旧システム", "遅延"), ("新システム", "短縮"), ("自動入力", "短縮")}
+    assert G.nodes["短縮"]["docs"] == {"d2"}
+
+    stats = ingest(store, docs, chain)
+    assert stats["unchanged"] == 2 and model.calls == 2
+
+    # 同じ本文を別の ID で入れても LLM は呼ばない
+    stats = ingest(store, {**docs, "d3": docs["d1"]}, chain)
+    assert stats["cached"] == 1 and model.calls == 2
+    assert store.load_graph().nodes["遅延"]["docs"] == {"d1", "d3"}
+
+
+def test_removed_and_failed_documents(store, tmp_path):
+    chain = build_extraction_chain(KeywordExtractor())
+    ingest(store, {"d1": "A→B", "d2": "B→C"}, chain)
+
+    stats = ingest(store, {"d2": "B→C", "d4": "失敗する本文"}, chain)
+    assert (stats["deleted"], stats["failed"]) == (1, 1)
+    assert set(store.load_graph().edges) == {("B", "C")}
+    assert store.count() == {"documents": 1, "nodes": 2, "edges": 1}
+
+    # ファイルから開き直しても同じグラフ
+    reopened = KnowledgeGraphStore(str(tmp_path / "graph.sqlite3"))
+    assert reopened.load_documents() == {"d2": "B→C"}
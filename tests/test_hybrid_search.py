@@ -0,0 +1,91 @@
+# tests/test_hybrid_search.py
+import pytest
+
+from bm25_index import BM25Index, char_ngrams
+from hybrid_search import HybridRetriever, reciprocal_rank_fusion
+from metadata_index import MetadataIndex
+from numpy_store import NumpyVectorStore
+from stand_in_backends import StandInEmbeddings
+
+DOCS = {
+    "p1": ("フシギダネ せなかに ふしぎな タネが うえてある", {"type1": "grass"}),
+    "p4": ("ヒトカゲ しっぽの ほのおは いのちの あかし", {"type1": "fire"}),
+    "p6": ("リザードン くちから しゃくねつの ほのおを はく", {"type1": "fire"}),
+    "p7": ("ゼニガメ こうらに こもって みを まもる", {"type1": "water"}),
+    "p25": ("ピカチュウ ほっぺの でんきぶくろに でんきを ためる", {"type1": "electric"}),
+}
+
+
+@pytest.fixture
+def retriever():
+    emb = StandInEmbeddings()
+    ids = list(DOCS)
+    texts = [t for t, _ in DOCS.values()]
+    metas = [m for _, m in DOCS.values()]
+    store = NumpyVectorStore.from_texts(texts, emb, metas, ids=ids)
+    bm25 = BM25Index()
+    bm25.add_many(ids, texts, metas)
+    return HybridRetriever(store, bm25, MetadataIndex.from_store(store, ("type1",)))
+
+
+def test_char_ngrams_fold_kana_and_stay_inside_words():
+    assert char_ngrams("ぴかちゅう") == char_ngrams("ピカチュウ")
+    assert char_ngrams("ＡＢ の") == ["ab", "ノ"]  # 1文字語はそのまま1トークン
+
+
+def test_bm25_ranks_and_updates():
+    bm25 = BM25Index()
+    bm25.add_many(list(DOCS), [t for t, _ in DOCS.values()])
+    assert bm25.search("ほのお", k=5)[0].doc_id in ("p4", "p6")
+    assert {h.doc_id for h in bm25.search("ほのお", k=5)} == {"p4", "p6"}
+    assert bm25.search("ほのお", allowed={"p6"})[0].doc_id == "p6"
+
+    bm25.add("p6", "リザードン そらを とぶ")
+    assert [h.doc_id for h in bm25.search("ほのお")] == ["p4"]
+    bm25.remove("p4")
+    assert bm25.search("ほのお") == []
+    assert len(bm25) == 4
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "b", "c", "d"]  # a と b は同点、先のリスト順
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    weighted = reciprocal_rank_fusion([["a"], ["b"]], weights=[1.0, 2.0])
+    assert weighted[0][0] == "b"
+
+
+def test_route_answers_exact_names_without_embedding(retriever):
+    emb = retriever.db.embeddings
+    calls = emb.calls
+    docs, info = retriever.search("ピカチュウ", k=3, mode="route")
+    assert (info.route, info.embedded) == ("lexical", False)
+    assert docs[0].id == "p25"
+    assert emb.calls == calls
+
+
+def test_default_mode_always_embeds(retriever):
+    # 名前そのままのクエリでも、既定（hybrid）はベクトル検索の結果も混ぜる。route は明示したときだけ
+    emb = retriever.db.embeddings
+    calls = emb.calls
+    docs, info = retriever.search("ピカチュウ", k=3)
+    assert (info.route, info.embedded) == ("hybrid", True)
+    assert docs[0].id == "p25"
+    assert emb.calls == calls + 1
+
+
+def test_route_falls_back_to_hybrid(retriever):
+    emb = retriever.db.embeddings
+    calls = emb.calls
+    docs, info = retriever.search("ほのお", k=3, mode="route")  # 2件が同じくらい当たる
+    assert (info.route, info.embedded) == ("hybrid", True)
+    assert {"p4", "p6"} <= {d.id for d in docs}
+    assert emb.calls == calls + 1
+
+
+def test_filters_apply_to_both_sides(retriever):
+    for mode in ("lexical", "hybrid", "vector"):
+        docs, _ = retriever.search("ほのお", k=5, filter={"type1": "fire"}, mode=mode)
+        assert docs and all(d.metadata["type1"] == "fire" for d in docs)
+    with pytest.raises(ValueError):
+        retriever.search("x", mode="nope")
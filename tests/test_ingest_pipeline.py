@@ -0,0 +1,75 @@
+# tests/test_ingest_pipeline.py
+from ingest_pipeline import IdSpool, Progress, batched, delete_missing_ids, run_pipeline
+from stand_in_backends import StandInEmbeddings
+
+
+def make_docs(n: int, tag: str = ""):
+    return [(f"doc-{i}", f"本文 {i}{tag}", {"n": i}) for i in range(n)]
+
+
+class RecordingDb:
+    """Chroma を包んで、get の呼ばれ方を記録する"""
+
+    def __init__(self, db) -> None:
+        self.db = db
+        self._collection = db._collection
+        self.gets = []
+
+    def get(self, **kwargs):
+        self.gets.append(kwargs)
+        return self.db.get(**kwargs)
+
+    def delete(self, ids):
+        return self.db.delete(ids=ids)
+
+
+def quiet() -> Progress:
+    return Progress(interval=1e9)
+
+
+def test_batched_keeps_order_and_remainder():
+    assert [len(b) for b in batched(range(10), 4)] == [4, 4, 2]
+
+
+def test_pipeline_embeds_only_changed_rows(make_chroma):
+    emb = StandInEmbeddings()
+    db = make_chroma(embedding=emb)
+    docs = make_docs(50)
+
+    stats = run_pipeline(docs, db, emb, batch_size=8, max_in_flight=2, progress=quiet())
+    assert stats == {"upserted": 50, "unchanged": 0, "deleted": 0}
+    assert emb.texts_embedded == 50
+
+    docs[3] = ("doc-3", "書き換えた本文", {"n": 3})
+    stats = run_pipeline(docs, db, emb, batch_size=8, max_in_flight=2, progress=quiet())
+    assert stats == {"upserted": 1, "unchanged": 49, "deleted": 0}
+    assert emb.texts_embedded == 51
+    assert db.get(ids=["doc-3"])["documents"] == ["書き換えた本文"]
+
+
+def test_missing_rows_are_swept_page_by_page(make_chroma):
+    emb = StandInEmbeddings()
+    db = make_chroma(embedding=emb)
+    run_pipeline(make_docs(30), db, emb, batch_size=8, progress=quiet())
+
+    recording = RecordingDb(db)
+    stats = run_pipeline(make_docs(20), recording, emb, batch_size=8, progress=quiet())
+
+    assert stats["deleted"] == 10
+    assert sorted(db.get(include=[])["ids"]) == sorted(f"doc-{i}" for i in range(20))
+    # ID 指定なしの get は、必ず limit 付き（全 ID を一度に読まない）
+    unbounded = [g for g in recording.gets if "ids" not in g and "limit" not in g]
+    assert unbounded == []
+
+
+def test_delete_missing_ids_with_small_pages(make_chroma):
+    db = make_chroma()
+    db.add_texts([f"t{i}" for i in range(23)], ids=[f"doc-{i}" for i in range(23)])
+    spool = IdSpool()
+    spool.add_many(f"doc-{i}" for i in range(0, 23, 2))
+
+    deleted = delete_missing_ids(db, spool, page_size=5)
+
+    assert deleted == 11
+    assert sorted(db.get(include=[])["ids"]) == sorted(f"doc-{i}" for i in range(0, 23, 2))
+    spool.close()
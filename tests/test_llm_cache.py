@@ -0,0 +1,79 @@
+# tests/test_llm_cache.py
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+
+import llm_cache
+from llm_cache import LLMResponseCache, entry_fingerprint, entry_key
+from stand_in_backends import StandInChatModel
+from stream_output import print_response
+
+PIKACHU = {"id": 25, "name_jp": "ピカチュウ"}
+BULBASAUR = {"id": 1, "name_jp": "フシギダネ"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(path=str(tmp_path / "llm.sqlite3"), max_entries=3, ttl=60)
+
+
+def test_lookup_hits_only_with_the_same_params(cache):
+    cache.store("m", "prompt", {"temperature": 0}, "answer")
+    assert cache.lookup("m", "prompt", {"temperature": 0}) == "answer"
+    assert cache.lookup("m", "prompt", {"temperature": 1}) is None
+    assert cache.lookup("other", "prompt", {"temperature": 0}) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_and_lru_eviction(cache, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: clock[0])
+    for name in ("a", "b", "c"):
+        cache.store("m", name, {}, name)
+        clock[0] += 1
+    cache.lookup("m", "a", {})  # a を最近使ったことにする
+    cache.store("m", "d", {}, "d")  # 4件目で一番使われていない b が消える
+
+    assert cache.lookup("m", "a", {}) == "a"
+    assert cache.lookup("m", "b", {}) is None
+
+    clock[0] += 120
+    assert cache.lookup("m", "d", {}) is None
+
+
+def test_entry_hash_mismatch_is_a_miss(cache):
+    cache.store("m", "p", {}, "old", entry_key=entry_key(PIKACHU), entry_hash=entry_fingerprint(PIKACHU))
+    changed = dict(PIKACHU, name_jp="ピカチュウ改")
+    assert cache.lookup("m", "p", {}, entry_hash=entry_fingerprint(changed)) is None
+    assert cache.lookup("m", "p", {}, entry_hash=entry_fingerprint(PIKACHU)) is None  # 行ごと消えた
+
+
+def test_invalidation_is_scoped_to_one_namespace(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "llm.sqlite3"))
+    for entry in (PIKACHU, BULBASAUR):
+        cache.store("m", f"zukan {entry['id']}", {}, "x", entry_key(entry), entry_fingerprint(entry))
+    cache.store("m", "other", {}, "y", entry_key(PIKACHU, "batch"), entry_fingerprint(PIKACHU))
+    cache.store("m", "free", {}, "z")
+
+    # フシギダネが消え、ピカチュウはそのまま
+    assert cache.invalidate_pokemon_data([PIKACHU]) == 1
+
+    assert cache.lookup("m", "zukan 25", {}) == "x"
+    assert cache.lookup("m", "zukan 1", {}) is None
+    # 別の名前空間と entry_key なしの応答は触らない
+    assert cache.lookup("m", "other", {}) == "y"
+    assert cache.lookup("m", "free", {}) == "z"
+
+
+def test_print_response_serves_the_second_call_from_cache(cache, capsys):
+    model = StandInChatModel()
+    chain = ChatPromptTemplate.from_messages([("human", "{q}")]) | model
+    first, timing = print_response(chain, {"q": "ピカチュウ"}, "", cache=cache, entry=PIKACHU)
+    assert not timing.cached
+
+    second, timing = print_response(chain, {"q": "ピカチュウ"}, "", cache=cache, entry=PIKACHU)
+    assert timing.cached and second == first
+
+    changed = dict(PIKACHU, description="更新")
+    _, timing = print_response(chain, {"q": "ピカチュウ"}, "", cache=cache, entry=changed)
+    assert not timing.cached
+    capsys.readouterr()
@@ -0,0 +1,56 @@
+# tests/test_metadata_index.py
+import pytest
+
+from metadata_index import MetadataIndex
+from numpy_store import NumpyVectorStore
+from stand_in_backends import StandInEmbeddings
+
+ROWS = {
+    "p1": {"type1": "grass", "type2": "poison"},
+    "p4": {"type1": "fire", "type2": ""},
+    "p6": {"type1": "fire", "type2": "flying"},
+    "p7": {"type1": "water", "type2": ""},
+}
+
+
+@pytest.fixture
+def index():
+    idx = MetadataIndex(("type1", "type2"))
+    idx.add_many(list(ROWS), list(ROWS.values()))
+    return idx
+
+
+def test_match_operators(index):
+    assert index.query({"type1": "fire"}) == ["p4", "p6"]
+    assert index.query({"type1": {"$in": ["water", "grass"]}}) == ["p1", "p7"]
+    assert index.query({"$and": [{"type1": "fire"}, {"type2": {"$eq": "flying"}}]}) == ["p6"]
+    assert index.query({"$or": [{"type1": "fire"}, {"type2": "fire"}]}) == ["p4", "p6"]
+    assert index.query(None) == ["p1", "p4", "p6", "p7"]
+    with pytest.raises(KeyError):
+        index.match({"name_jp": "x"})
+
+
+def test_updates_and_removals_follow_the_store(index):
+    index.add("p4", {"type1": "water", "type2": ""})
+    assert index.query({"type1": "fire"}) == ["p6"]
+    assert index.query({"type1": "water"}) == ["p4", "p7"]  # 登録順は変わらない
+
+    index.remove_many(["p6", "missing"])
+    assert index.query({"type1": "fire"}) == []
+    assert "fire" not in index.postings["type1"]
+    assert len(index) == 3
+
+
+def test_from_store_and_paging():
+    emb = StandInEmbeddings(dimensions=8)
+    ids = [f"p{i}" for i in range(45)]
+    metas = [{"type1": "fire" if i % 3 == 0 else "water", "type2": ""} for i in range(45)]
+    store = NumpyVectorStore.from_texts(ids, emb, metas, ids=ids)
+
+    index = MetadataIndex.from_store(store, ("type1", "type2"), page_size=7)
+    assert len(index) == 45
+
+    pages = list(index.iter_pages(store, {"type1": "fire"}, page_size=4))
+    assert [len(p) for p in pages] == [4, 4, 4, 3]
+    assert [doc_id for page in pages for doc_id, _ in page] == [f"p{i}" for i in range(0, 45, 3)]
+    assert all(meta["type1"] == "fire" for page in pages for _, meta in page)
@@ -0,0 +1,125 @@
+# tests/test_numpy_store.py
+import numpy as np
+import pytest
+
+from chroma_sync import sync_collection
+from numpy_store import NumpyVectorStore, export_snapshot, snapshot_is_current
+from stand_in_backends import StandInEmbeddings
+
+TYPES = [("fire", ""), ("water", ""), ("grass", "poison"), ("fire", "flying"), ("water", "ice")]
+
+
+@pytest.fixture
+def store():
+    emb = StandInEmbeddings(dimensions=16)
+    texts = [f"ポケモン {i}" for i in range(len(TYPES))]
+    metadatas = [{"type1": t1, "type2": t2} for t1, t2 in TYPES]
+    return NumpyVectorStore.from_texts(texts, emb, metadatas, ids=[f"p{i}" for i in range(len(TYPES))])
+
+
+def ids_of(store, where):
+    return [store.ids[i] for i in np.flatnonzero(store.filter_mask(where))]
+
+
+def test_filter_mask_operators(store):
+    assert ids_of(store, {"type1": "fire"}) == ["p0", "p3"]
+    assert ids_of(store, {"type1": {"$eq": "water"}}) == ["p1", "p4"]
+    assert ids_of(store, {"type1": {"$in": ["grass", "water"]}}) == ["p1", "p2", "p4"]
+    assert ids_of(store, {"$and": [{"type1": "fire"}, {"type2": "flying"}]}) == ["p3"]
+    assert ids_of(store, {"$or": [{"type2": "poison"}, {"type2": "ice"}]}) == ["p2", "p4"]
+    assert ids_of(store, {"type1": "dragon"}) == []
+    assert store.filter_mask(None) is None
+    with pytest.raises(ValueError):
+        store.filter_mask({"type1": {"$gt": 1}})
+
+
+def test_filter_mask_treats_empty_sub_filters_as_match_all(store):
+    assert ids_of(store, {"$and": [{}, {"type1": "fire"}]}) == ["p0", "p3"]
+    assert ids_of(store, {"$or": [{}, {"type1": "fire"}]}) == [f"p{i}" for i in range(5)]
+    assert ids_of(store, {"$and": [{"$or": [{}]}, {"type2": "ice"}]}) == ["p4"]
+
+
+def test_scores_are_distances_like_chroma(store):
+    query = store.embeddings.embed_query("ポケモン 2")
+    hits = store.similarity_search_with_score_by_vector(query, k=3)
+
+    assert hits[0][0].id == "p2"
+    assert hits[0][1] == pytest.approx(0.0, abs=1e-5)
+    distances = [d for _, d in hits]
+    assert distances == sorted(distances)
+    relevance = store.similarity_search_with_relevance_scores("ポケモン 2", k=1)
+    assert relevance[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    batch = store.batch_similarity_search_by_vector([query], k=3)[0]
+    assert [d.id for d, _ in batch] == [d.id for d, _ in hits]
+    assert [s for _, s in batch] == pytest.approx(distances, abs=1e-6)
+
+
+# 遠い文書では Chroma 自身の関連度も 0 を下回り、警告が出る（同じ式なので同じ値になる）
+@pytest.mark.filterwarnings("ignore:Relevance scores must be between")
+def test_distances_match_chroma_default_space(store, tmp_path):
+    from langchain_chroma import Chroma
+
+    # 取り込みスクリプトと同じく collection_metadata を指定しない（Chroma の既定は l2）
+    db = Chroma(
+        collection_name="default_space",
+        embedding_function=store.embeddings,
+        persist_directory=str(tmp_path / "chroma"),
+    )
+    db.add_texts(store.texts, store.metadatas, ids=store.ids)
+
+    ours = store.similarity_search_with_score("ポケモン 3", k=5, filter={"type1": "fire"})
+    theirs = db.similarity_search_with_score("ポケモン 3", k=5, filter={"type1": "fire"})
+    assert [d.id for d, _ in ours] == [d.id for d, _ in theirs]
+    assert [s for _, s in ours] == pytest.approx([s for _, s in theirs], abs=1e-4)
+
+    ours = store.similarity_search_with_relevance_scores("ポケモン 1", k=5)
+    theirs = db.similarity_search_with_relevance_scores("ポケモン 1", k=5)
+    assert [s for _, s in ours] == pytest.approx([s for _, s in theirs], abs=1e-4)
+
+
+def test_upsert_and_delete(store):
+    vec = store.embeddings.embed_query("新しい")
+    store.add_embeddings(["上書き"], [vec], [{"type1": "dragon"}], ids=["p1"])
+    assert len(store) == 5
+    assert store.get(ids=["p1"])["documents"] == ["上書き"]
+    assert ids_of(store, {"type1": "dragon"}) == ["p1"]
+
+    assert store.delete(["p0", "missing"])
+    assert store.ids == ["p1", "p2", "p3", "p4"]
+    assert store.get(where={"type1": "fire"}, limit=1)["ids"] == ["p3"]
+
+
+def test_snapshot_is_refreshed_after_chroma_changes(make_chroma, tmp_path):
+    persist_dir = str(tmp_path / "chroma")
+    db = make_chroma()
+    docs = [(f"d{i}", f"本文 {i}", {"n": i}) for i in range(6)]
+    sync_collection(db, docs)
+    stem = str(tmp_path / "snapshot")
+
+    export_snapshot(db, db.embeddings, stem, persist_dir)
+    assert snapshot_is_current(stem, persist_dir, lambda: db)
+
+    sync_collection(db, docs[:4])
+    assert not snapshot_is_current(stem, persist_dir, lambda: db)
+
+    export_snapshot(db, db.embeddings, stem, persist_dir)
+    assert snapshot_is_current(stem, persist_dir, lambda: db)
+    assert len(NumpyVectorStore.load(stem, db.embeddings)) == 4
+
+
+def test_snapshot_survives_writes_to_other_collections(make_chroma, tmp_path):
+    persist_dir = str(tmp_path / "chroma")
+    db = make_chroma()
+    sync_collection(db, [("d0", "本文", {})])
+    stem = str(tmp_path / "snapshot")
+    export_snapshot(db, db.embeddings, stem, persist_dir)
+
+    sync_collection(make_chroma("other"), [("x", "別のコレクション", {})])
+
+    opened = []
+    assert snapshot_is_current(stem, persist_dir, lambda: opened.append(1) or db)
+    assert opened == [1]
+    # 指紋が同じだったので SQLite の状態を記録し直し、次は Chroma を開かない
+    assert snapshot_is_current(stem, persist_dir, lambda: opened.append(1) or db)
+    assert opened == [1]
@@ -0,0 +1,55 @@
+# tests/test_openrouter_clients.py
+import pytest
+
+import openrouter_clients
+from openrouter_clients import PoolConfig
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    # クライアントは作るだけで通信はしないので、ダミーのキーで足りる
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    openrouter_clients.configure_pool(PoolConfig(max_connections=3, http2=False))
+    yield openrouter_clients
+    openrouter_clients.close()
+
+
+def test_same_params_share_one_client(clients):
+    a = clients.chat_model("m", temperature=0)
+    assert clients.chat_model("m", temperature=0) is a
+    assert clients.chat_model("m", temperature=1) is not a
+    assert clients.embeddings("e") is clients.embeddings("e")
+    assert clients.client_count() == 3
+
+
+def test_all_clients_share_one_connection_pool(clients):
+    chat = clients.chat_model("m")
+    emb = clients.embeddings("e", dimensions=64)
+    assert chat.http_client is emb.http_client
+    assert chat.http_async_client is emb.http_async_client
+    assert chat.openai_api_base == clients.OPENROUTER_BASE_URL
+    assert clients.pool_config().max_connections == 3
+
+
+def test_reconfiguring_rebuilds_clients(clients):
+    before = clients.chat_model("m")
+    clients.configure_pool(PoolConfig(max_connections=5, http2=False))
+    assert clients.client_count() == 0
+    after = clients.chat_model("m")
+    assert after is not before
+    assert after.http_client is not before.http_client
+
+
+def test_missing_key_is_a_runtime_error(clients, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY")
+    with pytest.raises(RuntimeError):
+        clients.chat_model("other")
+
+
+def test_pool_config_from_env(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_POOL_SIZE", "7")
+    monkeypatch.setenv("OPENROUTER_HTTP2", "0")
+    config = PoolConfig.from_env()
+    assert (config.max_connections, config.use_http2) == (7, False)
+    assert config.limits().max_keepalive_connections == 7
+    assert "HTTP/1.1" in config.describe()
@@ -0,0 +1,76 @@
+# tests/test_pokemon_search.py
+import pytest
+
+from pokemon_search import PokemonIndex, edit_distance, find_by_id, hira_to_kata, search_by_name
+
+ENTRIES = [
+    {"id": 25, "name_jp": "ピカチュウ"},
+    {"id": 26, "name_jp": "ライチュウ"},
+    {"id": 1, "name_jp": "フシギダネ"},
+    {"id": 2, "name_jp": "フシギソウ"},
+    {"id": 3, "name_jp": "フシギバナ"},
+    {"id": 25, "name_jp": "ピカチュウ（重複）"},
+]
+
+
+@pytest.fixture
+def index():
+    return PokemonIndex(ENTRIES)
+
+
+def linear_partial(query):
+    """索引を使わない素朴な部分一致（結果の比較用）"""
+    return [e for e in ENTRIES if hira_to_kata(query.strip()) in hira_to_kata(e["name_jp"])]
+
+
+def test_find_by_id_prefers_the_first_entry(index):
+    assert index.find_by_id(25) is ENTRIES[0]
+    assert index.find_by_id(999) is None
+    assert find_by_id(3, ENTRIES) is ENTRIES[4]
+
+
+def test_exact_match_normalizes_hiragana_and_spaces(index):
+    result = index.search_by_name("  ぴかちゅう ")
+    assert result == {"mode": "exact", "matches": [ENTRIES[0]]}
+
+
+@pytest.mark.parametrize("query", ["フシギ", "チュウ", "ギ", "ふしぎそ", "ュ"])
+def test_partial_match_agrees_with_a_linear_scan(index, query):
+    result = index.search_by_name(query)
+    assert result["mode"] == "partial"
+    assert result["matches"] == linear_partial(query)
+
+
+def test_no_match(index):
+    assert index.search_by_name("ミュウツー") == {"mode": "none", "matches": []}
+    assert index.search_by_name("") == {"mode": "none", "matches": []}
+    # リストを渡しても同じ結果
+    assert search_by_name("ライチュウ", ENTRIES)["matches"] == [ENTRIES[1]]
+
+
+def test_edit_distance_and_cutoff():
+    assert edit_distance("ピカチュウ", "ピカチュウ", 2) == 0
+    assert edit_distance("ピカチユウ", "ピカチュウ", 2) == 1
+    assert edit_distance("ライチュウ", "ピカチュウ", 2) == 2
+    # 上限を超えたら max_distance + 1 で打ち切る
+    assert edit_distance("フシギダネ", "ピカチュウ", 2) == 3
+    assert edit_distance("ア", "アイウエオ", 1) == 2
+
+
+def test_fuzzy_search_ranks_by_distance(index):
+    hits = index.fuzzy_search("ぴかちゆう")
+    assert hits[0]["entry"] is ENTRIES[0]
+    assert hits[0]["distance"] == 1
+    assert hits[0]["score"] == pytest.approx(0.8)
+    assert [h["distance"] for h in hits] == sorted(h["distance"] for h in hits)
+    assert index.fuzzy_search("ミュウツー") == []
+
+
+def test_fuzzy_is_only_a_fallback(index):
+    assert index.search_by_name("フシギダナ")["mode"] == "none"
+    result = index.search_by_name("フシギダナ", fuzzy=True)
+    assert result["mode"] == "fuzzy"
+    assert result["matches"][0] is ENTRIES[2]
+    assert len(result["scores"]) == len(result["matches"])
+    # 完全一致があればあいまい検索はしない
+    assert index.search_by_name("フシギダネ", fuzzy=True)["mode"] == "exact"
@@ -0,0 +1,128 @@
+# tests/test_quantized_vectors.py
+import json
+import os
+
+import numpy as np
+import pytest
+
+import vector_file
+from numpy_store import NumpyVectorStore
+from quantized_vectors import (
+    QuantizedIndex,
+    QuantizedVectorStore,
+    ReadOnlyStoreError,
+    ScalarQuantizer,
+    StaleQuantizationError,
+    evaluate,
+    is_current,
+    make_queries,
+    make_synthetic,
+    quantize_file,
+)
+from stand_in_backends import StandInEmbeddings
+
+
+@pytest.fixture(scope="module")
+def index():
+    return QuantizedIndex.build(make_synthetic(3000, 64, clusters=32), binary=True)
+
+
+def test_int8_scores_match_the_decoded_vectors():
+    matrix = make_synthetic(50, 16)
+    quantizer = ScalarQuantizer.fit(matrix)
+    codes = quantizer.encode(matrix)
+    query = make_queries(matrix, 1)[0]
+    np.testing.assert_allclose(quantizer.scores(codes, query), quantizer.decode(codes) @ query, atol=1e-4)
+    # 刻み幅の半分以内で元に戻る
+    assert np.abs(quantizer.decode(codes) - matrix).max() <= quantizer.scale.max() / 2 + 1e-6
+
+
+def test_recall_against_float(index):
+    queries = make_queries(index.vectors, 50, noise=1.0)
+    results = {r["method"]: r for r in evaluate(index, queries, k=10)}
+
+    rescored = [r for name, r in results.items() if name.startswith("int8 + ")][0]
+    assert rescored["recall"] >= 0.95
+    assert results["int8"]["recall"] >= 0.8
+    assert [r for name, r in results.items() if name.startswith("binary + ")][0]["recall"] >= 0.8
+    sizes = index.nbytes()
+    assert sizes["int8"] * 4 == sizes["float32"]
+    assert sizes["binary"] * 32 == sizes["float32"]
+
+
+def test_rescored_scores_are_exact_cosines(index):
+    query = make_queries(index.vectors, 1)[0]
+    positions, scores = index.search(query, k=5)
+    exact = index.vectors[positions] @ query / np.linalg.norm(index.vectors[positions], axis=1)
+    np.testing.assert_allclose(scores, exact, atol=1e-5)
+
+    mask = np.zeros(len(index), dtype=bool)
+    mask[:10] = True
+    positions, _ = index.search(query, k=20, mask=mask)
+    assert sorted(positions.tolist()) == list(range(10))
+
+
+@pytest.fixture
+def saved_store(tmp_path):
+    emb = StandInEmbeddings(dimensions=32)
+    texts = [f"ポケモン {i}" for i in range(40)]
+    metadatas = [{"n": i % 3} for i in range(40)]
+    store = NumpyVectorStore.from_texts(texts, emb, metadatas, ids=[f"p{i}" for i in range(40)])
+    stem = str(tmp_path / "vecs")
+    store.save(stem)
+    return stem, emb, store
+
+
+def test_store_matches_the_float_store(saved_store):
+    stem, emb, store = saved_store
+    quantized = QuantizedVectorStore.load(stem, emb)
+    ours = quantized.similarity_search_with_score("ポケモン 7", k=3, filter={"n": 1})
+    theirs = store.similarity_search_with_score("ポケモン 7", k=3, filter={"n": 1})
+    assert [d.id for d, _ in ours] == [d.id for d, _ in theirs]
+    assert [s for _, s in ours] == pytest.approx([s for _, s in theirs], abs=1e-5)
+
+
+def test_store_is_read_only_before_embedding(saved_store):
+    stem, emb, _ = saved_store
+    quantized = QuantizedVectorStore.load(stem, emb)
+    calls = emb.calls
+    with pytest.raises(ReadOnlyStoreError):
+        quantized.add_texts(["x"])
+    with pytest.raises(ReadOnlyStoreError):
+        quantized.add_embeddings(["x"], [[0.0] * 32])
+    with pytest.raises(ReadOnlyStoreError):
+        quantized.delete(["p0"])
+    assert emb.calls == calls
+
+
+def test_stale_codes_are_detected_and_rebuilt(saved_store):
+    stem, emb, store = saved_store
+    quantize_file(stem)
+    assert is_current(stem)
+
+    # 件数は同じまま、中身だけ書き換える
+    replaced = np.asarray(vector_file.load_vectors(stem).vectors)[::-1].copy()
+    vector_file.save_vectors(stem, replaced, store.texts[::-1], store.metadatas[::-1], store.ids[::-1])
+    os.utime(f"{stem}.npy", ns=(0, 1))
+    assert not is_current(stem)
+    with pytest.raises(StaleQuantizationError):
+        QuantizedIndex.load(stem)
+
+    # ストアとして開くと作り直す
+    quantized = QuantizedVectorStore.load(stem, emb)
+    assert is_current(stem)
+    assert quantized.similarity_search("ポケモン 3", k=1)[0].id == "p3"
+
+
+def test_codes_from_an_older_format_are_rebuilt(saved_store):
+    stem, emb, _ = saved_store
+    quantize_file(stem)
+    with open(f"{stem}.quant.json", encoding="utf-8") as f:
+        params = json.load(f)
+    params.pop("source")
+    params["format_version"] = 1
+    with open(f"{stem}.quant.json", "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    assert not is_current(stem)
+    QuantizedVectorStore.load(stem, emb)
+    assert is_current(stem)
@@ -0,0 +1,150 @@
+# tests/test_query_service.py
+import asyncio
+import json
+import os
+
+import pytest
+
+import query_service
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def state():
+    # CSV と pokemon_data.json はリポジトリ直下から読む
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT)
+        yield query_service.build_stand_in_state()
+
+
+def exchange(state, raw: bytes):
+    """--stand-in の状態でサービスを立て、生のリクエストを1つ送って (状態コード, JSON) を返す"""
+
+    async def run():
+        server = await query_service.start_server(state, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            await writer.wait_closed()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+
+    return asyncio.run(run())
+
+
+def call(state, method: str, target: str, payload=None):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    raw = (
+        f"{method} {target} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("latin-1") + body
+    return exchange(state, raw)
+
+
+def test_health(state):
+    status, payload = call(state, "GET", "/health")
+    assert status == 200
+    assert payload["status"] == "ok"
+    assert payload["pokemon"] == len(state.index)
+
+
+def test_search(state):
+    status, payload = call(state, "POST", "/search", {"query": "ピカチュウ", "k": 3, "token_budget": 200})
+    assert status == 200
+    assert 0 < len(payload["results"]) <= 3
+    assert payload["context_tokens"] <= 200
+    assert (payload["route"], payload["embedded"]) == ("hybrid", True)
+
+    status, payload = call(state, "POST", "/search", {"query": "たね", "k": 5, "type1": "grass"})
+    assert status == 200
+    assert payload["results"] and all(r["type1"] == "grass" for r in payload["results"])
+
+
+def test_pokemon_lookup_and_description(state):
+    status, payload = call(state, "GET", "/pokemon?id=25")
+    assert status == 200
+    assert [m["name_jp"] for m in payload["matches"]] == ["ピカチュウ"]
+
+    status, payload = call(state, "POST", "/pokemon", {"name": "ぴかちゅう", "describe": True})
+    assert status == 200
+    assert payload["mode"] == "exact"
+    assert payload["description"].startswith("[stand-in]")
+
+
+def test_chat(state):
+    status, payload = call(state, "POST", "/chat", {"question": "ピカチュウのタイプは？"})
+    assert status == 200
+    assert payload["question"] == "ピカチュウのタイプは？"
+    assert payload["answer"].startswith("[stand-in]")
+
+
+@pytest.mark.parametrize(
+    "method, target, payload, expected",
+    [
+        ("POST", "/search", {"query": ""}, 400),
+        ("POST", "/search", {"query": "x", "k": "many"}, 400),
+        ("POST", "/search", {"query": "x", "mode": "nope"}, 400),
+        ("GET", "/pokemon?id=abc", None, 400),
+        ("POST", "/chat", {}, 400),
+        ("GET", "/chat", None, 405),
+        ("GET", "/missing", None, 404),
+    ],
+)
+def test_error_statuses(state, method, target, payload, expected):
+    status, body = call(state, method, target, payload)
+    assert status == expected
+    assert body["error"]
+
+
+def test_malformed_requests(state):
+    bad_length = b"POST /chat HTTP/1.1\r\nContent-Length: ten\r\nConnection: close\r\n\r\n"
+    assert exchange(state, bad_length)[0] == 400
+
+    negative = b"POST /chat HTTP/1.1\r\nContent-Length: -5\r\nConnection: close\r\n\r\n"
+    assert exchange(state, negative)[0] == 400
+
+    not_json = b"POST /chat HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\n{x}"
+    assert exchange(state, not_json) == (400, {"error": "本文が JSON ではありません"})
+
+    too_big = b"POST /chat HTTP/1.1\r\nContent-Length: 99999999\r\nConnection: close\r\n\r\n"
+    assert exchange(state, too_big)[0] == 413
+
+
+def test_openrouter_state_opens_the_ingested_collection(tmp_path, monkeypatch):
+    # --embedding local --dim-mode pca --dimensions 8 で取り込んだのと同じ状態を作る
+    from langchain_chroma import Chroma
+
+    import pokemon_chroma_store_151 as store
+    from dimension_reduction import PCAProjection, ProjectedEmbeddings, projection_path, save_dimension_settings
+    from embedding_backends import HashedNgramEmbeddings
+
+    persist = str(tmp_path / "chroma")
+    texts = [f"ポケモン {i} ばんめ の せつめい" for i in range(20)]
+    base = HashedNgramEmbeddings()
+    projection = PCAProjection.fit(base.embed_documents(texts), 8)
+    os.makedirs(persist)
+    projection.save(projection_path(persist, "pokemon_151_local_pca8"))
+    Chroma(
+        persist_directory=persist,
+        collection_name="pokemon_151_local_pca8",
+        embedding_function=ProjectedEmbeddings(base, projection),
+    ).add_texts(texts, ids=[f"d{i}" for i in range(20)])
+    save_dimension_settings(persist, "pokemon_151_local", "pca", 8)
+
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    monkeypatch.delenv("EMBEDDING_DIM_MODE", raising=False)
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    monkeypatch.setattr(store, "PERSIST_DIR", persist)
+    monkeypatch.setattr(query_service.pokemon_search, "build_chain", lambda: None)
+    monkeypatch.setattr(query_service.chat_app, "build_chain", lambda: None)
+
+    state = query_service.build_openrouter_state()
+    assert state.db._collection.name == "pokemon_151_local_pca8"
+    assert len(state.embeddings.embed_query("ポケモン")) == 8
+    assert state.db.similarity_search(texts[7], k=1)[0].id == "d7"
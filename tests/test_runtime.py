@@ -0,0 +1,56 @@
+# tests/test_runtime.py
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import runtime
+from runtime import Lazy, lazy_import
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("networkx", "langchain_openai", "langchain_chroma", "langchain_core.prompts")
+
+
+def test_lazy_builds_once_across_threads():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    lazy = Lazy(factory, "test-lazy")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lazy.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert "test-lazy" in runtime.INIT_TIMES
+
+    lazy.reset()
+    assert not lazy.ready
+    assert lazy.get() is not results[0]
+    assert len(calls) == 2
+
+
+def test_lazy_import_waits_for_the_first_attribute():
+    module = lazy_import("json")
+    assert "not loaded" in repr(module)
+    assert module.dumps([1]) == "[1]"
+    assert "(loaded)" in repr(module)
+
+
+@pytest.mark.parametrize("script", ["main", "pokemon_search", "graph_rag", "query_service"])
+def test_scripts_import_without_heavy_dependencies(script):
+    code = f"import sys, {script}; print([m for m in {HEAVY!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,42 @@
+# tests/test_stream_output.py
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+
+from stand_in_backends import StandInChatModel
+from stream_output import TurnTiming, print_response, streaming_enabled
+
+
+@pytest.fixture
+def chain():
+    prompt = ChatPromptTemplate.from_messages([("human", "{question}")])
+    return prompt | StandInChatModel()
+
+
+def test_streaming_prints_the_same_answer_as_invoke(chain, capsys):
+    inputs = {"question": "ピカチュウについて教えて。でんきタイプのネズミポケモンです。"}
+    streamed, timing = print_response(chain, inputs, "A: ", stream=True, show_timing=False)
+    out = capsys.readouterr().out
+
+    assert streamed == "[stand-in] " + inputs["question"]
+    assert out == "A: " + streamed + "\n"
+    assert timing.streamed and timing.first_token is not None
+    assert timing.first_token <= timing.total
+
+    whole, timing = print_response(chain, inputs, "A: ", stream=False, show_timing=False)
+    assert whole == streamed
+    assert capsys.readouterr().out == out
+    assert not timing.streamed and timing.first_token is None
+
+
+def test_streaming_enabled(monkeypatch):
+    monkeypatch.delenv("STREAM_OUTPUT", raising=False)
+    assert streaming_enabled([])
+    assert not streaming_enabled(["--no-stream", "--other"])
+    monkeypatch.setenv("STREAM_OUTPUT", "0")
+    assert not streaming_enabled([])
+
+
+def test_timing_format():
+    assert "最初のトークンまで 0.50 秒" in TurnTiming(0.5, 1.25, True).format()
+    assert TurnTiming(None, 1.25, False).format() == "（合計 1.25 秒）"
+    assert "キャッシュから" in TurnTiming(0.0, 0.001, False, cached=True).format()
@@ -0,0 +1,70 @@
+# tests/test_vector_file.py
+import json
+
+import numpy as np
+import pytest
+
+import vector_file
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    stem = str(tmp_path / "vecs")
+    matrix = np.arange(12, dtype=np.float64).reshape(3, 4)
+    vector_file.save_vectors(
+        stem, matrix, ["a", "b", "c"], metadatas=[{"n": 1}, {}, {"n": 3}], ids=["x", "y", "z"], model="m"
+    )
+
+    vf = vector_file.load_vectors(stem)
+    assert isinstance(vf.vectors, np.memmap)
+    assert vf.vectors.dtype == np.float32
+    np.testing.assert_array_equal(vf.vectors, matrix)
+    assert (len(vf), vf.dimensions, vf.model) == (3, 4, "m")
+    assert vf.ids == ["x", "y", "z"]
+    assert vf.texts == ["a", "b", "c"]
+    assert vf.metadatas == [{"n": 1}, {}, {"n": 3}]
+    assert vector_file.exists(stem)
+
+
+def test_mismatched_text_count_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        vector_file.save_vectors(str(tmp_path / "v"), np.zeros((2, 3)), ["only one"])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_save_keeps_the_previous_files(tmp_path):
+    stem = str(tmp_path / "vecs")
+    vector_file.save_vectors(stem, np.eye(2), ["a", "b"], model="old")
+
+    with pytest.raises(ValueError):
+        vector_file.save_vectors(stem, np.ones((3, 2)), ["x", "y"], model="new")
+
+    vf = vector_file.load_vectors(stem)
+    assert (vf.model, vf.texts) == ("old", ["a", "b"])
+    np.testing.assert_array_equal(vf.vectors, np.eye(2))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["vecs.meta.json", "vecs.npy", "vecs.texts.jsonl"]
+
+
+def test_interrupted_swap_is_not_treated_as_a_snapshot(tmp_path, monkeypatch):
+    stem = str(tmp_path / "vecs")
+    vector_file.save_vectors(stem, np.eye(2), ["a", "b"])
+    real_replace = vector_file.os.replace
+
+    def crash_after_vectors(src, dst):
+        real_replace(src, dst)
+        if dst.endswith(".npy"):
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(vector_file.os, "replace", crash_after_vectors)
+    with pytest.raises(KeyboardInterrupt):
+        vector_file.save_vectors(stem, np.ones((3, 2)), ["x", "y", "z"])
+    # 新しい .npy と古いテキストの組み合わせは、ヘッダが無いので読まれない
+    assert not vector_file.exists(stem)
+
+
+def test_convert_json(tmp_path):
+    path = tmp_path / "embeddings.json"
+    path.write_text(json.dumps({"texts": ["a", "b"], "vectors": [[1, 0], [0, 1]]}), encoding="utf-8")
+    stem = vector_file.convert_json(str(path))
+    vf = vector_file.load_vectors(stem)
+    assert vf.texts == ["a", "b"]
+    np.testing.assert_array_equal(vf.vectors, np.eye(2))
@@ -0,0 +1,80 @@
+# tests/test_zukan_batch.py
+import json
+
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+import zukan_batch
+from llm_cache import entry_fingerprint
+from stand_in_backends import StandInChatModel
+
+ENTRIES = [{"id": i, "name_jp": f"ポケモン{i}", "types": ["ノーマル"], "description": "説明"} for i in range(1, 6)]
+
+
+def stand_in_chain():
+    return ChatPromptTemplate.from_messages([("human", "{pokedex_entry}")]) | StandInChatModel()
+
+
+def read_ids(lines):
+    """読めた行の図鑑番号（途中で切れた行は飛ばす）"""
+    ids = []
+    for line in lines:
+        try:
+            ids.append(json.loads(line)["id"])
+        except json.JSONDecodeError:
+            continue
+    return ids
+
+
+def test_output_size_labels_character_fallback():
+    with_usage = AIMessage(content="abc", usage_metadata={"input_tokens": 1, "output_tokens": 7, "total_tokens": 8})
+    assert zukan_batch.output_size(with_usage) == (7, True)
+    assert zukan_batch.output_size(AIMessage(content="ピカチュウ")) == (5, False)
+
+
+def test_resume_after_a_truncated_line(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(zukan_batch, "build_chain", stand_in_chain)
+    source = tmp_path / "data.json"
+    source.write_text(json.dumps(ENTRIES, ensure_ascii=False), encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+    # 1件目は書き終わり、2件目は改行の前で止まった状態
+    first = {"source": "data.json", "id": 1, "fingerprint": entry_fingerprint(ENTRIES[0]), "text": "x"}
+    output.write_text(json.dumps(first) + "\n" + '{"id": 2, "te', encoding="utf-8")
+
+    zukan_batch.main(["--input", str(source), "--output", str(output), "--max-concurrency", "2"])
+
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"id": 2, "te'  # 壊れた行はそのまま残り、次の行とくっつかない
+    assert sorted(read_ids(lines)) == [1, 2, 3, 4, 5]
+    assert {key[1] for key in zukan_batch.load_done_keys(str(output))} == {1, 2, 3, 4, 5}
+    out = capsys.readouterr().out
+    assert "生成済み 1 件 / 今回 4 件" in out
+    assert "トークン/秒" in out
+
+
+def test_other_inputs_and_edited_entries_are_regenerated(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(zukan_batch, "build_chain", stand_in_chain)
+    output = tmp_path / "out.jsonl"
+    source = tmp_path / "data.json"
+    source.write_text(json.dumps(ENTRIES, ensure_ascii=False), encoding="utf-8")
+    zukan_batch.main(["--input", str(source), "--output", str(output)])
+    capsys.readouterr()
+
+    zukan_batch.main(["--input", str(source), "--output", str(output)])
+    assert "生成するエントリはありません" in capsys.readouterr().out
+
+    # 同じ図鑑番号でも、別の入力ファイルなら生成済みとはみなさない
+    other = tmp_path / "other.json"
+    other.write_text(json.dumps(ENTRIES[:2], ensure_ascii=False), encoding="utf-8")
+    zukan_batch.main(["--input", str(other), "--output", str(output)])
+    assert "生成済み 0 件 / 今回 2 件" in capsys.readouterr().out
+
+    # 説明を書き換えたエントリだけ生成し直す
+    edited = [dict(e, description="新しい説明") if e["id"] == 3 else e for e in ENTRIES]
+    source.write_text(json.dumps(edited, ensure_ascii=False), encoding="utf-8")
+    zukan_batch.main(["--input", str(source), "--output", str(output)])
+    assert "生成済み 4 件 / 今回 1 件" in capsys.readouterr().out
+
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [(r["source"], r["id"]) for r in records[-1:]] == [("data.json", 3)]
+    assert records[-1]["fingerprint"] == entry_fingerprint(edited[2])
@@ -0,0 +1,181 @@
+# vector_file.py
+"""
+埋め込みベクトルをバイナリで保存・読み込みするためのユーティリティ。
+
+embeddings.json（インデント付き JSON）の代わりに、次の3ファイルで保存する。
+
+- <stem>.npy         : float32 の (件数, 次元数) 行列（np.memmap でそのまま開ける）
+- <stem>.meta.json   : ヘッダ（モデル名・次元数・件数など）
+- <stem>.texts.jsonl : 1行1件の ID / テキスト / メタデータ（必要になるまで読まない）
+
+使い方（既存の embeddings.json を変換）:
+    python vector_file.py embeddings.json
+"""
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def _paths(stem: str) -> Dict[str, str]:
+    return {
+        "vectors": f"{stem}.npy",
+        "meta": f"{stem}.meta.json",
+        "texts": f"{stem}.texts.jsonl",
+    }
+
+
+def save_vectors(
+    stem: str,
+    vectors: Any,
+    texts: Iterable[str],
+    metadatas: Optional[Iterable[Dict[str, Any]]] = None,
+    ids: Optional[Iterable[str]] = None,
+    model: str = "",
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    ベクトル行列とテキストを stem で始まる3ファイルに保存する。
+    どれも .tmp に書き終えてから置き換え、ヘッダは最後に置く。途中で止まっても、
+    ヘッダが無い（exists() が False）か、前回のファイルがそろったままになる
+    """
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("vectors は (件数, 次元数) の2次元配列にしてください")
+
+    paths = _paths(stem)
+    tmp = {name: f"{path}.tmp" for name, path in paths.items()}
+    try:
+        count = 0
+        meta_iter = iter(metadatas if metadatas is not None else [])
+        id_iter = iter(ids if ids is not None else [])
+        with open(tmp["texts"], "w", encoding="utf-8") as f:
+            for text in texts:
+                record = {
+                    "id": next(id_iter, str(count)),
+                    "text": text,
+                    "metadata": next(meta_iter, {}),
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+
+        if count != matrix.shape[0]:
+            raise ValueError(f"テキスト数 ({count}) とベクトル数 ({matrix.shape[0]}) が一致しません")
+
+        with open(tmp["vectors"], "wb") as f:
+            np.save(f, matrix)
+
+        header = {
+            "format_version": FORMAT_VERSION,
+            "model": model,
+            "dimensions": int(matrix.shape[1]),
+            "count": int(matrix.shape[0]),
+            "dtype": "float32",
+            **(extra or {}),
+        }
+        with open(tmp["meta"], "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+
+        # 入れ替えている間は前のヘッダを外しておき、中身の合わない組み合わせを読ませない
+        if os.path.exists(paths["meta"]):
+            os.remove(paths["meta"])
+        os.replace(tmp["vectors"], paths["vectors"])
+        os.replace(tmp["texts"], paths["texts"])
+        os.replace(tmp["meta"], paths["meta"])
+    finally:
+        for path in tmp.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@dataclass
+class VectorFile:
+    """読み込んだベクトルファイル。vectors は memmap なので開くだけならコピーは発生しない"""
+
+    stem: str
+    header: Dict[str, Any]
+    vectors: np.ndarray
+    _records: Optional[List[Dict[str, Any]]] = field(default=None, repr=False)
+
+    @property
+    def model(self) -> str:
+        return self.header.get("model", "")
+
+    @property
+    def dimensions(self) -> int:
+        return int(self.header["dimensions"])
+
+    def __len__(self) -> int:
+        return int(self.header["count"])
+
+    def _load_records(self) -> List[Dict[str, Any]]:
+        if self._records is None:
+            with open(_paths(self.stem)["texts"], "r", encoding="utf-8") as f:
+                self._records = [json.loads(line) for line in f]
+        return self._records
+
+    @property
+    def ids(self) -> List[str]:
+        return [r.get("id", str(i)) for i, r in enumerate(self._load_records())]
+
+    @property
+    def texts(self) -> List[str]:
+        return [r["text"] for r in self._load_records()]
+
+    @property
+    def metadatas(self) -> List[Dict[str, Any]]:
+        return [r.get("metadata", {}) for r in self._load_records()]
+
+
+def read_header(stem: str) -> Dict[str, Any]:
+    with open(_paths(stem)["meta"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_header(stem: str, fields: Dict[str, Any]) -> None:
+    """ヘッダの項目だけを書き換える（ベクトルとテキストはそのまま）"""
+    header = {**read_header(stem), **fields}
+    path = _paths(stem)["meta"]
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_vectors(stem: str, mmap: bool = True) -> VectorFile:
+    """stem で保存したベクトルを開く（mmap=True ならディスク上のまま参照する）"""
+    paths = _paths(stem)
+    header = read_header(stem)
+
+    vectors = np.load(paths["vectors"], mmap_mode="r" if mmap else None)
+    if vectors.shape != (header["count"], header["dimensions"]):
+        raise ValueError(f"{paths['vectors']} の形がヘッダと一致しません: {vectors.shape}")
+    return VectorFile(stem=stem, header=header, vectors=vectors)
+
+
+def exists(stem: str) -> bool:
+    return all(os.path.exists(p) for p in _paths(stem).values())
+
+
+def convert_json(json_path: str, stem: Optional[str] = None, model: str = "text-embedding-3-small") -> str:
+    """既存の {"texts": [...], "vectors": [...]} 形式の JSON をバイナリ形式に変換する"""
+    stem = stem or os.path.splitext(json_path)[0]
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    save_vectors(stem, np.asarray(data["vectors"], dtype=np.float32), data["texts"], model=model)
+    return stem
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("使い方: python vector_file.py <embeddings.json> [出力先の stem]")
+        sys.exit(1)
+
+    out = convert_json(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    vf = load_vectors(out)
+    print(f"{out}.npy に変換しました（{len(vf)} 件, {vf.dimensions} 次元）")
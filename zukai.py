@@ -4,17 +4,25 @@ import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from matplotlib import rcParams
 
+import vector_file
+
 # ★ 日本語フォントを指定（Mac想定）
 #   うまくいかなければ "Hiragino Kaku Gothic ProN" なども試してみてください
 rcParams["font.family"] = "Hiragino Sans"
 # マイナス記号の文字化け防止
 rcParams["axes.unicode_minus"] = False
 
-with open("embeddings.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+# バイナリ形式（embeddings.npy）があればそちらを memmap で開く
+if vector_file.exists("embeddings"):
+    vf = vector_file.load_vectors("embeddings")
+    texts = vf.texts
+    vectors = vf.vectors
+else:
+    with open("embeddings.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
 
-texts = data["texts"]
-vectors = np.array(data["vectors"])
+    texts = data["texts"]
+    vectors = np.array(data["vectors"])
 
 # PCAで2次元に圧縮
 pca = PCA(n_components=2)
@@ -0,0 +1,171 @@
+# zukan_batch.py
+"""
+図鑑テキストをまとめて事前生成するバッチ処理。
+
+使い方:
+    python zukan_batch.py                                   # pokemon_data.json から生成
+    python zukan_batch.py --input pokemon_151_with_image.csv --max-concurrency 8
+
+- chain.batch_as_completed で最大 --max-concurrency 件を同時に生成する
+- 1件終わるごとに JSONL に追記するので、途中で止めても次回は続きから再開できる
+- 各レコードには入力ファイル名（source）とエントリの内容ハッシュ（fingerprint）を残す。
+  再開時に飛ばすのは、同じ入力・同じ内容のエントリだけ（別の入力や、書き換えたエントリは生成し直す）。
+  同じ source / id のレコードが複数あるときは、後のものが新しい
+- 最後に件数/秒とトークン/秒を表示する（usage を返さない応答は文字/秒として別に数える）
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
+
+from llm_cache import entry_fingerprint
+from pokemon_search import build_chain, format_entry_for_prompt
+
+DEFAULT_OUTPUT = "zukan_generated.jsonl"
+
+
+def load_entries(path: str) -> List[Dict[str, Any]]:
+    """pokemon_data.json / pokemon_151_with_image.csv のどちらからでも図鑑エントリを読む"""
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8") as f:
+            return [
+                {
+                    "id": int(row["id"]),
+                    "name_jp": row["name_jp"],
+                    "name_en": row["name_en"],
+                    "types": [t for t in (row["type1"], row["type2"]) if t],
+                    "description": row["description"],
+                }
+                for row in csv.DictReader(f)
+            ]
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def done_key(source: str, entry: Dict[str, Any]) -> Tuple[str, Any, str]:
+    """生成済みかどうかの判定に使う (入力ファイル名, 図鑑番号, 内容ハッシュ)"""
+    return source, entry.get("id"), entry_fingerprint(entry)
+
+
+def load_done_keys(path: str) -> Set[Tuple[str, Any, str]]:
+    """出力済みの JSONL から、生成が終わっている (入力ファイル名, 図鑑番号, 内容ハッシュ) を集める"""
+    done: Set[Tuple[str, Any, str]] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                done.add((record["source"], record["id"], record["fingerprint"]))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                # 書き込み途中で止まった行・source / fingerprint の無い古い行は無視（次回生成し直す）
+                continue
+    return done
+
+
+def open_for_append(path: str) -> IO[str]:
+    """
+    JSONL を追記用に開く。前回の書き込みが改行の前で止まっていたら、
+    次のレコードがその行にくっつかないよう先に改行を足す。
+    """
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    f = open(path, "a", encoding="utf-8")
+    if needs_newline:
+        f.write("\n")
+    return f
+
+
+def output_size(message: Any) -> Tuple[int, bool]:
+    """
+    応答の大きさを (値, トークン数かどうか) で返す。
+    usage に出力トークン数があればそれを、無ければ文字数を返す（トークン数ではない）。
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return int(usage["output_tokens"]), True
+    return len(getattr(message, "content", "") or ""), False
+
+
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="図鑑テキストをまとめて生成して JSONL に保存")
+    parser.add_argument("--input", default="pokemon_data.json", help="pokemon_data.json または CSV")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="出力する JSONL のパス")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="同時に生成する件数")
+    parser.add_argument("--limit", type=int, default=None, help="生成する最大件数（お試し用）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None) -> None:
+    args = parse_args(argv)
+
+    entries = load_entries(args.input)
+    source = os.path.basename(args.input)
+    done = load_done_keys(args.output)
+    todo = [e for e in entries if done_key(source, e) not in done]
+    finished = len(entries) - len(todo)
+    if args.limit is not None:
+        todo = todo[: args.limit]
+
+    print(f"対象 {len(entries)} 件 / 生成済み {finished} 件 / 今回 {len(todo)} 件")
+    if not todo:
+        print("生成するエントリはありません。")
+        return
+
+    chain = build_chain()
+    inputs = [{"pokedex_entry": format_entry_for_prompt(e)} for e in todo]
+    model_name = getattr(chain.last, "model_name", "")
+
+    started = time.perf_counter()
+    ok = failed = tokens = chars = 0
+    with open_for_append(args.output) as f:
+        for i, res in chain.batch_as_completed(
+            inputs,
+            config={"max_concurrency": args.max_concurrency},
+            return_exceptions=True,
+        ):
+            entry = todo[i]
+            if isinstance(res, Exception):
+                failed += 1
+                print(f"Error on ID={entry.get('id')}: {res}")
+                continue
+
+            _, entry_id, fingerprint = done_key(source, entry)
+            record = {
+                "source": source,
+                "id": entry_id,
+                "fingerprint": fingerprint,
+                "name_jp": entry.get("name_jp"),
+                "model": model_name,
+                "text": res.content,
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+            ok += 1
+            size, is_tokens = output_size(res)
+            if is_tokens:
+                tokens += size
+            else:
+                chars += size
+            print(f"[{ok + failed}/{len(todo)}] #{entry.get('id')} {entry.get('name_jp')}")
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"\n🎉 完了: 成功 {ok} 件 / 失敗 {failed} 件 / {elapsed:.1f} 秒 "
+        f"（{ok / elapsed:.2f} 件/秒, {tokens / elapsed:.1f} トークン/秒）"
+    )
+    if chars:
+        print(f"※ usage を返さなかった応答は文字数で集計: {chars / elapsed:.1f} 文字/秒（トークン数ではありません）")
+    if failed:
+        print("失敗したエントリは、もう一度実行すると生成し直します。")
+
+
+if __name__ == "__main__":
+    main()